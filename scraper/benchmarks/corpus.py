@@ -0,0 +1,120 @@
+import argparse
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+# Real hall names first, then as many synthetic ones as requested
+REAL_HALLS = [
+    'Arrillaga Family Dining Commons', 'Branner Dining', 'EVGR Dining', 'Florence Moore Dining',
+    'Gerhard Casper Dining', 'Lakeside Dining', 'Ricker Dining', 'Stern Dining', 'Wilbur Dining'
+]
+
+WEEKDAY_MEALS = ['Breakfast', 'Lunch', 'Dinner']
+WEEKEND_MEALS = ['Brunch', 'Dinner']
+MEAL_TYPES = ['Breakfast', 'Lunch', 'Dinner', 'Brunch']
+
+# Ingredient strings in the shapes the menu site produces, including the
+# misspellings, joined words and nested lists that normalization deals with
+INGREDIENTS = [
+    'Water', 'Salt', 'Sugar', 'Canola Oil', 'Olive Oil', 'Oliveoil', 'Black Pepper', 'Garlic',
+    'Garlic Powder', 'Garlicpowder', 'Onion', 'Onion Powder', 'Green Onion', 'Red Onion',
+    'Tomato', 'Tomato Paste', 'Tomatoes', 'Bell Pepper', 'Red Pepper Flake', 'Jalapeño',
+    'Cilantro', 'Lime Juice', 'Lemon Juice', 'Cumin Seed', 'Cuminseed', 'Paprika', 'Oregano',
+    'Basil', 'Thyme', 'Rosemary Extract', 'Ginger', 'Soy Sauce', 'Soysauce', 'Sesame Oil',
+    'Rice Vinegar', 'Brown Rice', 'White Rice', 'Quinoa', 'Black Beans', 'Pinto Beans',
+    'Chickpeas', 'Tofu', 'Chicken', "Mindful Chick'N", 'Beef', 'Pork', 'Salmon', 'Shrimp',
+    'Eggs', 'Milk', 'Butter', 'Cheddar Cheese', 'Parmesan Cheese', 'Heavy Cream', 'Yogurt',
+    'Caulfilower', 'Broccoli', 'Carrot', 'Celery', 'Spinach', 'Kale', 'Zucchini', 'Mushrooms',
+    'Corn', 'Peas', 'Strawberry', 'Blueberries', 'Pineapple', 'Banana', 'Apple', 'Radishes',
+    'Natural Flavor', 'Natural Flavorings', 'Artificial Flavor', 'Xanthan Gum', 'Citric Acid',
+    'Vegetableoil', 'Palm Fruit Oil', 'Flaxseed', 'Mustard Seed', 'Tortilla', 'Curry Powder',
+    'Enriched Flour (Wheat Flour, Niacin, Reduced Iron, Thiamine Mononitrate, Riboflavin, Folic Acid)',
+    'Soy Sauce [Water, Wheat, Soybeans, Salt]',
+    'Mayonnaise (Soybean Oil, Eggs, Vinegar, Salt, Sugar, Lemon Juice Concentrate)',
+    'Chipotle Pepper In Adobo Sauce (Chipotle Peppers, Tomato Paste, Vinegar, Salt, Onions, Spices)',
+    'Whole Wheat Tortilla [Whole Wheat Flour, Water, Canola Oil, Baking Powder]',
+    'Please refer to dining hall chef or manager for ingredient and allergen information',
+]
+
+ALLERGENS = ['Soy', 'Wheat', 'Milk', 'Eggs', 'Fish', 'Shellfish', 'Peanuts', 'Tree Nuts', 'Sesame', 'Gluten']
+DIET_ICONS = ['gluten-free', 'vegan', 'vegetarian', 'halal', 'kosher']
+
+DISH_WORDS = [
+    'Roasted', 'Grilled', 'Braised', 'Spicy', 'Herb', 'Garlic', 'Lemon', 'Teriyaki', 'Chipotle',
+    'Curry', 'Pesto', 'Smoked', 'Crispy', 'Stir-Fried', 'Baked', 'Vegan', 'Seasonal',
+]
+DISH_BASES = [
+    'Chicken', 'Tofu', 'Salmon', 'Vegetables', 'Rice Bowl', 'Pasta', 'Tacos', 'Soup', 'Salad',
+    'Oatmeal', 'Pancakes', 'Scrambled Eggs', 'Burrito', 'Noodles', 'Quinoa', 'Potatoes', 'Beans',
+]
+
+def hall_names(count):
+    """
+    The first count hall names, padded with synthetic halls past the real ones
+    """
+    halls = REAL_HALLS[:count]
+    halls += [f'Synthetic Hall {i} Dining' for i in range(len(halls) + 1, count + 1)]
+    return halls
+
+def build_dish_pool(rng, size):
+    """
+    Dishes that recur across halls and days, as they do on the real menus
+    """
+    pool = []
+    for _ in range(size):
+        name = f"{rng.choice(DISH_WORDS)} {rng.choice(DISH_BASES)}"
+        if rng.random() < 0.2:
+            name += f" ({rng.choice(['V', 'VGN', 'GF', 'Contains Nuts'])})"
+        ingredients = ', '.join(rng.sample(INGREDIENTS, rng.randint(2, 12)))
+        allergens = rng.sample(ALLERGENS, rng.randint(0, 3)) + rng.sample(DIET_ICONS, rng.randint(0, 2))
+        pool.append([name, ingredients, ', '.join(allergens)])
+    return pool
+
+def generate_corpus(base_dir, days=7, halls=9, start_date='1/6/2025', dishes_per_menu=(8, 20), pool_size=400, seed=0):
+    """
+    Write synthetic menu CSV files in the same layout as save_info:
+    <date>/<meal>/<hall>_<date>_<meal>.csv, with unpadded m-d-Y dates.
+    Meals a hall doesn't serve that day get a header-only file, like an empty menu.
+    Returns the number of files and data rows written.
+    """
+    rng = random.Random(seed)
+    pool = build_dish_pool(rng, pool_size)
+    start = datetime.strptime(start_date, '%m/%d/%Y')
+    hall_list = hall_names(halls)
+
+    files = 0
+    rows = 0
+    for day in range(days):
+        date = start + timedelta(days=day)
+        date_str = f"{date.month}-{date.day}-{date.year}"
+        served_meals = WEEKEND_MEALS if date.weekday() >= 5 else WEEKDAY_MEALS
+
+        for meal in MEAL_TYPES:
+            meal_folder = os.path.join(base_dir, date_str, meal)
+            os.makedirs(meal_folder, exist_ok=True)
+
+            for hall in hall_list:
+                csv_path = os.path.join(meal_folder, f"{hall}_{date_str}_{meal}.csv")
+                with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
+                    writer = csv.writer(csv_file)
+                    writer.writerow(['Name', ' Ingredients', ' Allergens'])
+                    if meal in served_meals:
+                        menu = rng.sample(pool, min(len(pool), rng.randint(*dishes_per_menu)))
+                        writer.writerows(menu)
+                        rows += len(menu)
+                files += 1
+
+    return files, rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic menu CSV corpus")
+    parser.add_argument('output_dir', help="directory to write the date folders into")
+    parser.add_argument('--days', type=int, default=7, help="number of days of menus")
+    parser.add_argument('--halls', type=int, default=9, help="number of dining halls")
+    parser.add_argument('--start-date', default='1/6/2025', help="first date, in m/d/yyyy format")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    files, rows = generate_corpus(args.output_dir, args.days, args.halls, args.start_date, seed=args.seed)
+    print(f"Wrote {files} CSV files with {rows} dishes to {args.output_dir}")
@@ -0,0 +1,246 @@
+import argparse
+import base64
+import csv
+import html
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from corpus import WEEKDAY_MEALS, WEEKEND_MEALS, build_dish_pool
+from dining_info import dining_hall_alias, dining_hall_list, generate_date_array
+
+# Dropdowns in page order, with the control names the menu site posts them under
+DROPDOWNS = ['Day', 'Locations', 'MealType']
+CONTROL_NAMES = {id_name: f'ctl00$MainContent$lst{id_name}' for id_name in DROPDOWNS}
+
+# Dietary labels the site shows as icons rather than allergen text
+DIET_ICONS = {'gluten-free': 'GF', 'vegan': 'VGN', 'vegetarian': 'V', 'halal': 'H', 'kosher': 'K'}
+
+class GeneratedMenus:
+    """
+    Synthetic menus for the next 7 days. Every hall serves Breakfast, Lunch
+    and Dinner on weekdays and Brunch and Dinner on weekends. A menu's dishes
+    only depend on the seed and its (date, hall, meal), so every run sees the
+    same site.
+    """
+    def __init__(self, seed=0, dishes_per_menu=(8, 20), pool_size=400):
+        self.seed = seed
+        self.dishes_per_menu = dishes_per_menu
+        self.pool = build_dish_pool(random.Random(seed), pool_size)
+        self.dates = generate_date_array()
+        self.halls = dining_hall_list
+
+    def meals(self, date, hall):
+        return WEEKEND_MEALS if datetime.strptime(date, '%m/%d/%Y').weekday() >= 5 else WEEKDAY_MEALS
+
+    def items(self, date, hall, meal):
+        rng = random.Random(f"{self.seed}|{date}|{hall}|{meal}")
+        return rng.sample(self.pool, min(len(self.pool), rng.randint(*self.dishes_per_menu)))
+
+class RecordedMenus:
+    """
+    Menus replayed from a folder of scraped CSV files, in the scraper's
+    <date>/<meal>/<hall>_<date>_<meal>.csv layout, e.g. scraper/data or a
+    corpus.py folder. A meal is offered where its CSV file lists any dishes.
+    """
+    def __init__(self, data_dir):
+        halls = {alias: hall for hall, alias in dining_hall_alias.items()}
+        self.files = {}
+        for root, dirs, files in os.walk(data_dir):
+            for file in files:
+                if not file.endswith('.csv'):
+                    continue
+                alias, date, meal = os.path.splitext(file)[0].rsplit('_', 2)
+                if alias in halls:
+                    date = '/'.join(str(int(part)) for part in date.split('-'))
+                    self.files[(date, halls[alias], meal)] = os.path.join(root, file)
+
+        # Only menus with dishes count, since the scraper records meals that aren't offered as empty files
+        self.menus = {}
+        for key, path in self.files.items():
+            with open(path, 'r', newline='', encoding='utf-8') as csv_file:
+                rows = [row for row in list(csv.reader(csv_file))[1:] if row]
+            if rows:
+                self.menus[key] = rows
+
+        self.dates = sorted({date for date, hall, meal in self.menus}, key=lambda date: datetime.strptime(date, '%m/%d/%Y'))
+        self.halls = [hall for hall in dining_hall_list if any(key[1] == hall for key in self.menus)]
+
+    def meals(self, date, hall):
+        return [meal for meal in WEEKDAY_MEALS + WEEKEND_MEALS[:1] if (date, hall, meal) in self.menus]
+
+    def items(self, date, hall, meal):
+        return self.menus.get((date, hall, meal), [])
+
+def encode_state(state):
+    # The selections travel in __VIEWSTATE, as on the real site, so the server keeps no sessions
+    return base64.b64encode(json.dumps(state).encode('utf-8')).decode('ascii')
+
+def decode_state(value):
+    try:
+        return json.loads(base64.b64decode(value))
+    except ValueError:
+        return None
+
+def resolve_state(menus, state):
+    """
+    Fall back to the first option of any dropdown whose selection isn't offered,
+    the way the site resets its later dropdowns after a postback
+    """
+    state = dict(state or {})
+    if state.get('Day') not in menus.dates:
+        state['Day'] = menus.dates[0]
+    if state.get('Locations') not in menus.halls:
+        state['Locations'] = menus.halls[0]
+    meals = menus.meals(state['Day'], state['Locations'])
+    if state.get('MealType') not in meals:
+        state['MealType'] = meals[0] if meals else None
+    return state, meals
+
+def render_dropdown(id_name, options, selected):
+    option_html = ''.join(
+        f'<option{" selected" if option == selected else ""} value="{html.escape(option)}">{html.escape(option)}</option>'
+        for option in options
+    )
+    name = CONTROL_NAMES[id_name]
+    return f'<select name="{name}" id="MainContent_lst{id_name}" onchange="__doPostBack(&#39;{name}&#39;, &#39;&#39;)">{option_html}</select>'
+
+def render_item(name, ingredients, allergens):
+    allergens = [allergen for allergen in allergens.split(', ') if allergen]
+    icons = ''.join(
+        f'<img class="clsLabel_IconImage" src="images/{DIET_ICONS[allergen]}.png" alt="{allergen}">'
+        for allergen in allergens if allergen in DIET_ICONS
+    )
+    text = ', '.join(allergen for allergen in allergens if allergen not in DIET_ICONS)
+    return (
+        '<div class="clsMenuItem">'
+        f'<span class="clsLabel_Name">{html.escape(name)}</span>{icons}'
+        f'<div class="clsLabel_Ingredients">Ingredients: {html.escape(ingredients)}</div>'
+        f'<div class="clsLabel_Allergens">Allergens: {html.escape(text)}</div>'
+        '</div>'
+    )
+
+def render_page(menus, state):
+    """
+    A menu page with the site's form, dropdown ids and menu item markup
+    """
+    state, meals = resolve_state(menus, state)
+    items = menus.items(state['Day'], state['Locations'], state['MealType']) if state['MealType'] else []
+    hidden = {'__EVENTTARGET': '', '__EVENTARGUMENT': '', '__VIEWSTATE': encode_state(state), '__EVENTVALIDATION': ''}
+    return ''.join([
+        '<!DOCTYPE html><html><head><title>Dining Hall Menu</title></head><body>',
+        '<form method="post" action="./" id="form1">',
+        ''.join(f'<input type="hidden" name="{name}" id="{name}" value="{value}" />' for name, value in hidden.items()),
+        '<script>function __doPostBack(target, argument) { var form = document.forms["form1"];'
+        ' form.__EVENTTARGET.value = target; form.__EVENTARGUMENT.value = argument; form.submit(); }</script>',
+        render_dropdown('Day', menus.dates, state['Day']),
+        render_dropdown('Locations', menus.halls, state['Locations']),
+        render_dropdown('MealType', meals, state['MealType']),
+        '<div id="MainContent_divMenu">',
+        ''.join(render_item(*item) for item in items),
+        '</div></form></body></html>',
+    ])
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.respond(None)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        fields = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True))
+        state = decode_state(fields.get('__VIEWSTATE', '')) or {}
+        for id_name, name in CONTROL_NAMES.items():
+            if name in fields:
+                state[id_name] = fields[name]
+        self.respond(state)
+
+    def respond(self, state):
+        server = self.server
+        delay = server.latency + server.rng.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        with server.lock:
+            server.requests += 1
+            failed = server.rng.random() < server.error_rate
+            if failed:
+                server.errors += 1
+        if failed:
+            self.send_error(500, "Injected error")
+            return
+
+        body = render_page(server.menus, state).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the dining menu site. Every request waits latency
+    seconds plus up to jitter more, and fails with a 500 at error_rate.
+    """
+    daemon_threads = True
+
+    def __init__(self, menus, host='127.0.0.1', port=0, latency=0, jitter=0, error_rate=0, seed=0, verbose=False):
+        super().__init__((host, port), ReplayHandler)
+        self.menus = menus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/dininghallmenu/"
+
+def start_server(menus, **options):
+    """
+    Serve menus from a background thread and return the server; call shutdown() to stop it
+    """
+    server = ReplayServer(menus, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the dining menu site")
+    parser.add_argument('--data-dir', help="replay the menus in this folder of scraped CSV files instead of generating them")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8000, help="port to listen on")
+    parser.add_argument('--latency', type=float, default=0, help="seconds every response is delayed by")
+    parser.add_argument('--jitter', type=float, default=0, help="up to this many more seconds of random delay")
+    parser.add_argument('--error-rate', type=float, default=0, help="share of requests answered with a 500 error")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the generated menus and injected errors")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args()
+
+    menus = RecordedMenus(args.data_dir) if args.data_dir else GeneratedMenus(args.seed)
+    if not menus.dates:
+        raise SystemExit(f"No menus found in {args.data_dir}")
+    server = ReplayServer(menus, args.host, args.port, args.latency, args.jitter, args.error_rate, args.seed, args.verbose)
+    print(f"Serving {len(menus.dates)} days x {len(menus.halls)} halls at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(f"{server.requests} requests, {server.errors} injected errors")
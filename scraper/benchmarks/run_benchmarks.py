@@ -0,0 +1,236 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import create_filters
+import processing
+from corpus import generate_corpus
+from manifest import hash_content
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+        )
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def corpus_manifest(csv_files):
+    """
+    The manifest a scrape of the corpus would have left, with every CSV file's hash
+    """
+    menus = {}
+    for file_path in csv_files:
+        with open(file_path, 'r', encoding='utf-8') as csv_file:
+            menus[file_path] = {'hash': hash_content(csv_file.read()), 'path': file_path}
+    return {'last_changed': None, 'menus': menus}
+
+def time_runs(func, repeat, setup=None):
+    """
+    Time func repeat times, calling setup (untimed) before each run
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        # The pipeline stages print progress; keep it out of the timings
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+    return {
+        'runs': runs,
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'mean': statistics.mean(runs),
+    }
+
+def read_corpus(csv_files):
+    """
+    Raw ingredient lists and ingredient/allergen tokens from the corpus
+    """
+    ingredient_lists = []
+    tokens = []
+    for file_path in csv_files:
+        with open(file_path, 'r', newline='', encoding='utf-8') as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader, None)
+            for row in reader:
+                ingredient_list = processing.normalize_text(row[1])
+                allergen_list = processing.normalize_text(row[2])
+                ingredient_lists.append(ingredient_list)
+                tokens.extend(i.strip() for i in processing.split_ingredients(ingredient_list) if i.strip())
+                tokens.extend(a.strip() for a in allergen_list.split(',') if a.strip())
+    return ingredient_lists, tokens
+
+def clear_dish_caches(base_dir):
+    for date_folder in os.listdir(base_dir):
+        cache_path = os.path.join(base_dir, date_folder, processing.DISH_CACHE_FILENAME)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+def clear_normalization_caches():
+    processing.clean_ingredient.cache_clear()
+    processing.normalize_ingredient.cache_clear()
+    processing.normalize_dish.cache_clear()
+    # Drop the canonical table's memoized lookups too
+    processing.use_canonical_table({'version': processing.canonicalize.TABLE_VERSION, 'names': processing.get_canonical_table().names})
+
+def scrape_menus(base_url, shards):
+    from http_scraper import HttpMenuClient
+
+    client = HttpMenuClient(base_url)
+    for shard in shards:
+        client.scrape(*shard)
+
+def time_scrape(repeat, latency=0, seed=0):
+    """
+    Time scraping every menu of the week over HTTP from a local replay server
+    """
+    from dining_info import build_shards
+    from replay_server import GeneratedMenus, start_server
+
+    server = start_server(GeneratedMenus(seed), latency=latency, seed=seed)
+    try:
+        shards = build_shards(server.menus.dates)
+        return time_runs(lambda: scrape_menus(server.url, shards), repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def run_benchmarks(work_dir, days, halls, repeat, workers, seed=0, scrape_latency=None):
+    base_dir = os.path.join(work_dir, 'data')
+    output_dir = os.path.join(work_dir, 'output')
+    output_file = os.path.join(output_dir, 'combined_dishes.json')
+    state_path = os.path.join(work_dir, 'filter_state.json')
+    os.makedirs(output_dir, exist_ok=True)
+
+    files, rows = generate_corpus(base_dir, days=days, halls=halls, seed=seed)
+    csv_files = processing.find_csv_files(base_dir)
+    ingredient_lists, tokens = read_corpus(csv_files)
+
+    def remove_state():
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+    results = {}
+
+    results['split_ingredients'] = time_runs(
+        lambda: [processing.split_ingredients(ingredient_list) for ingredient_list in ingredient_lists], repeat
+    )
+
+    # Cold: every distinct string is normalized once. Warm: all of them are cache hits.
+    results['normalize_ingredient'] = time_runs(
+        lambda: [processing.normalize_ingredient(token) for token in tokens], repeat,
+        setup=clear_normalization_caches,
+    )
+    results['normalize_ingredient_warm'] = time_runs(
+        lambda: [processing.normalize_ingredient(token) for token in tokens], repeat
+    )
+
+    results['process_csv'] = time_runs(
+        lambda: [processing.process_csv(file_path) for file_path in csv_files], repeat,
+        setup=clear_normalization_caches,
+    )
+
+    # Full run with empty caches, then an incremental run with nothing changed
+    def cold_main_setup():
+        clear_dish_caches(base_dir)
+        clear_normalization_caches()
+
+    main_kwargs = {'force': True, 'workers': workers, 'base_dir': base_dir, 'output_file': output_file}
+    results['processing_main'] = time_runs(lambda: processing.main(**main_kwargs), repeat, setup=cold_main_setup)
+    results['processing_main_cached'] = time_runs(lambda: processing.main(**main_kwargs), repeat)
+
+    with open(output_file, 'r', encoding='utf-8') as jsonfile:
+        dishes = json.load(jsonfile)
+
+    # Menus are compared by their CSV hashes, as the pipeline does with the manifest's
+    digests = create_filters.menu_digests(corpus_manifest(csv_files))
+    results['create_filter_files'] = time_runs(
+        lambda: create_filters.create_filter_files(dishes, output_dir, state_path, digests), repeat, setup=remove_state
+    )
+    results['create_filter_files_incremental'] = time_runs(
+        lambda: create_filters.create_filter_files(dishes, output_dir, state_path, digests), repeat
+    )
+
+    if scrape_latency is not None:
+        results['http_scrape'] = time_scrape(repeat, scrape_latency, seed)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {
+            'days': days,
+            'halls': halls,
+            'seed': seed,
+            'files': files,
+            'rows': rows,
+            'dishes': len(dishes),
+            'ingredient_tokens': len(tokens),
+        },
+        'repeat': repeat,
+        'workers': workers,
+        'results': results,
+    }
+
+def print_report(report, baseline=None):
+    corpus = report['corpus']
+    print(f"Corpus: {corpus['days']} days x {corpus['halls']} halls, {corpus['files']} files, {corpus['rows']} rows")
+    for name, result in report['results'].items():
+        line = f"  {name:<34} min {result['min'] * 1000:10.2f} ms   median {result['median'] * 1000:10.2f} ms"
+        if baseline is not None and name in baseline['results']:
+            line += f"   x{result['min'] / baseline['results'][name]['min']:.2f} vs {baseline.get('commit')}"
+        print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the menu processing stages on a synthetic corpus")
+    parser.add_argument('--days', type=int, default=7, help="days of menu history to generate")
+    parser.add_argument('--halls', type=int, default=9, help="number of dining halls to generate")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--workers', type=int, default=1, help="processes for processing.main")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the corpus")
+    parser.add_argument('--output', help="results file (defaults to results/<commit>-<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--scrape', type=float, metavar='LATENCY', help="also time a full HTTP scrape of a local replay server answering after LATENCY seconds")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='stanfood-bench-')
+    try:
+        report = run_benchmarks(work_dir, args.days, args.halls, args.repeat, args.workers, args.seed, args.scrape)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+    print_report(report, baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{report['commit'] or 'unknown'}-{stamp}.json")
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {output}")
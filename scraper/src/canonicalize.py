@@ -0,0 +1,374 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+# Stored next to the menu CSV files and the manifest
+TABLE_FILENAME = 'canonical_ingredients.json'
+
+# Bump whenever canonical_key or the clustering rules change so saved tables are rebuilt
+TABLE_VERSION = 2
+
+SPECIAL_MESSAGE = "Please refer to dining hall chef or manager for ingredient and allergen information"
+
+# Hand-picked canonical spellings. Every table is seeded with these, so they
+# win over whatever spelling happens to be the most common on the menus.
+SEED_NAMES = {
+    "Mindful Chick'N" : "Chicken",
+    "Artificial Flavor" : "Artificial Flavors",
+    "Bell Pepper" : "Bell Peppers",
+    "Cumin Seed" : "Cumin Seeds",
+    "Flaxseed" : "Flax Seeds",
+    "Green Onion" : "Green Onions",
+    "Mustard Seed" : "Mustard Seeds",
+    "Natural Flavor" : "Natural Flavors",
+    "Natural Flavorings" : "Natural Flavors",
+    "Olive Canola Oil" : "Canola Olive Oil",
+    "Onion" : "Onions",
+    "Palm Fruit Oil" : "Palm Oil",
+    "Radishes" : "Radish",
+    "Red Pepper Flake" : "Red Pepper Flakes",
+    "Strawberry" : "Strawberries",
+    "Tomato" : "Tomatoes",
+    "Tortilla" : "Tortillas",
+    "Onions Powder" : "Onion Powder",
+    "Pineapple" : "Pineapples",
+    "Caulfilower" : "Cauliflower",
+}
+
+# Different foods grouped together in the filters only. The dishes keep
+# their own ingredient lists, so "Cheese Sauce" stays "Cheese Sauce" there.
+MERGED_NAMES = {
+    "Allergy Friendly Bbq Sauce" : "BBQ Sauce",
+    "Allergy-Friendly Bbq Sauce" : "BBQ Sauce",
+    "Buttermilk Sauce" : "Buttermilk",
+    "Carrot Extractives" : "Carrot",
+    "Canola/Olive Oil Blend" : "Canola/Olive Oil",
+    "Canola Or Soybean Oil" : "Canola or Soybean Oil",
+    "Cheese Sauce" : "Cheese",
+    "Chipotle Aioli Sauce" : "Chipotle Aioli",
+    "Chipotle Pepper In Adobo Sauce" : "Adobo Sauce",
+    "Curry Powder" : "Curry",
+    "Curry Sauce" : "Curry",
+    "Cumin Seeds" : "Cumin",
+    "Dehydrated Garlic" : "Garlic",
+    "Dehydrated Mashed Potato Pearls" : "Mashed Potato",
+    "Expeller Pressed Canola Oil" : "Canola Oil",
+    "Breaded Okra Fried In Canola Oil" : "Breaded Okra",
+    "Garlic Powder" : "Garlic",
+    "Guajillo Chili Powder" : "Guajillo Chili",
+    "Lemon Juice" : "Lemon",
+    "Lime Juice" : "Lime",
+    "Liquid Sugar" : "Sugar",
+    "Onion Powder" : "Onion",
+    "Overnight Oats" : "Oats",
+    "Pesto Sauce" : "Pesto",
+    "Rosemary Extract" : "Rosemary",
+    "Seasonal Assortment Of Fresh Vegetables" : "Fresh Vegetables",
+    "Tomato Paste" : "Tomato",
+    "Turmeric Extractives" : "Turmeric",
+    "Yeast Extract" : "Yeast",
+}
+
+# Words the menus sometimes run together, split when building keys
+JOINED_WORDS = {
+    'cuminseed': 'cumin seed',
+    'oliveoil': 'olive oil',
+    'vegetableoil': 'vegetable oil',
+    'soysauce': 'soy sauce',
+    'garlicpowder': 'garlic powder',
+    'onionpowder': 'onion powder',
+}
+
+# In the filters, "Garlic Powder" is listed under "Garlic", but only if plain
+# "Garlic" is a known ingredient; "Baking Powder" stays as it is
+SUFFIX_WORDS = {'powder', 'juice', 'extract', 'extractives'}
+
+# Shorter words are too easily one typo away from a different ingredient
+MIN_NEAR_DUPLICATE_LENGTH = 5
+
+def singular(word):
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'xes', 'oes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+def split_name(name):
+    """
+    Split a name into its head and any parenthetical sub-ingredient list
+    """
+    head = re.split(r'[\(\[]', name, maxsplit=1)[0]
+    return head.rstrip(), name[len(head):].strip()
+
+def canonical_key(name):
+    """
+    Case-, accent-, punctuation- and plural-insensitive key of a name's head
+    """
+    text = unicodedata.normalize('NFKD', split_name(name)[0]).encode('ASCII', 'ignore').decode('ASCII').lower()
+    words = []
+    for word in re.findall(r'[a-z0-9]+', text):
+        words.extend(JOINED_WORDS.get(word, word).split())
+    return ' '.join(singular(word) for word in words)
+
+def suffix_stem(key):
+    """
+    The key without a trailing Powder/Juice/Extract word, or None
+    """
+    words = key.split(' ')
+    if len(words) > 1 and words[-1] in SUFFIX_WORDS:
+        return ' '.join(words[:-1])
+    return None
+
+def deletion_variants(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+def is_near_duplicate(a, b):
+    """
+    Whether two keys differ by a single inserted, deleted or transposed
+    character inside one of their words. Substitutions don't count: they turn
+    Nitrite into Nitrate. Neither do edits to a word's first letter, which
+    turn Goat Milk into Oat Milk, or to words shorter than MIN_NEAR_DUPLICATE_LENGTH.
+    """
+    words_a, words_b = a.split(' '), b.split(' ')
+    if a == b or len(words_a) != len(words_b):
+        return False
+    differing = [(word_a, word_b) for word_a, word_b in zip(words_a, words_b) if word_a != word_b]
+    if len(differing) != 1:
+        return False
+    a, b = differing[0]
+    if min(len(a), len(b)) < MIN_NEAR_DUPLICATE_LENGTH or a[0] != b[0]:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+    if abs(len(a) - len(b)) != 1:
+        return False
+    shorter, longer = sorted((a, b), key=len)
+    return shorter in deletion_variants(longer)
+
+class BlockingIndex:
+    """
+    Finds near-duplicate keys without comparing all pairs. Keys one edit
+    apart always share a one-character deletion, so each key is filed under
+    itself and its deletions and only keys sharing a block are compared.
+    """
+    def __init__(self, keys=()):
+        self.blocks = defaultdict(set)
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        if len(key) < MIN_NEAR_DUPLICATE_LENGTH:
+            return
+        self.blocks[key].add(key)
+        for variant in deletion_variants(key):
+            self.blocks[variant].add(key)
+
+    def candidates(self, key):
+        found = set(self.blocks.get(key, ()))
+        for variant in deletion_variants(key):
+            found.update(self.blocks.get(variant, ()))
+        found.discard(key)
+        return found
+
+    def near_duplicates(self, key):
+        return sorted(other for other in self.candidates(key) if is_near_duplicate(key, other))
+
+class DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+def resolve_seed(name):
+    """
+    Follow SEED_NAMES to a spelling that isn't replaced any further
+    """
+    seen = set()
+    while name in SEED_NAMES and name not in seen:
+        seen.add(name)
+        name = SEED_NAMES[name]
+    return name
+
+def build_table(name_counts):
+    """
+    Cluster ingredient names and map every key to its cluster's canonical name.
+    name_counts maps cleaned ingredient names, as they appear on the menus, to
+    how often they appear.
+    """
+    surface_counts = defaultdict(Counter)
+    for name, count in name_counts.items():
+        if name == SPECIAL_MESSAGE:
+            continue
+        head = split_name(name)[0]
+        key = canonical_key(head)
+        if key:
+            surface_counts[key][head] += count
+
+    clusters = DisjointSet()
+    seed_displays = {}
+    for old in SEED_NAMES:
+        new = resolve_seed(old)
+        old_key, new_key = canonical_key(old), canonical_key(new)
+        for key in (old_key, new_key):
+            surface_counts.setdefault(key, Counter())
+        seed_displays.setdefault(new_key, new)
+        clusters.union(old_key, new_key)
+
+    # Run-together words get their split spelling, e.g. Oliveoil -> Olive Oil
+    for split in JOINED_WORDS.values():
+        key = canonical_key(split)
+        surface_counts.setdefault(key, Counter())
+        seed_displays.setdefault(key, resolve_seed(split.title()))
+
+    # Only spellings of the same name are merged. Powder/Juice/Extract forms
+    # are different foods and only join their base in the filters, see filter_name.
+    keys = sorted(surface_counts)
+    index = BlockingIndex(keys)
+    for key in keys:
+        clusters.find(key)
+        for other in index.near_duplicates(key):
+            clusters.union(key, other)
+
+    members = defaultdict(list)
+    for key in keys:
+        members[clusters.find(key)].append(key)
+
+    names = {}
+    for cluster in members.values():
+        totals = {key: sum(surface_counts[key].values()) for key in cluster}
+        seeded = [key for key in cluster if key in seed_displays]
+        if seeded:
+            # The most common seeded spelling, so seeds outvote the raw menus
+            display = seed_displays[min(seeded, key=lambda key: (-totals[key], key))]
+        else:
+            surfaces = Counter()
+            for key in cluster:
+                surfaces.update(surface_counts[key])
+            display = min(surfaces, key=lambda surface: (-surfaces[surface], len(surface), surface))
+        for key in cluster:
+            names[key] = display
+
+    return {'version': TABLE_VERSION, 'names': dict(sorted(names.items()))}
+
+class CanonicalTable:
+    """
+    Maps ingredient names to canonical names using a table from build_table.
+    Names whose key isn't in the table are still matched by a near-duplicate
+    key, so new spellings of known ingredients resolve without rebuilding it.
+    """
+    def __init__(self, data):
+        self.names = data['names']
+        self.digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self._index = None
+        self._resolved = {}
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = BlockingIndex(self.names)
+        return self._index
+
+    def lookup_key(self, key):
+        if key in self.names:
+            return self.names[key]
+        matches = self.index.near_duplicates(key)
+        return self.names[matches[0]] if matches else None
+
+    def canonical_name(self, name):
+        """
+        The canonical name, keeping any parenthetical sub-ingredient list
+        """
+        if name not in self._resolved:
+            head, tail = split_name(name)
+            display = self.lookup_key(canonical_key(head)) if name != SPECIAL_MESSAGE else None
+            if display is None:
+                self._resolved[name] = name
+            else:
+                self._resolved[name] = f"{display} {tail}" if tail else display
+        return self._resolved[name]
+
+    def filter_name(self, name):
+        """
+        The name a canonical ingredient is listed under in the filters:
+        MERGED_NAMES, or the plain ingredient for a Powder/Juice/Extract form
+        of a known one. The plain ingredient's own name is kept, so "Apple"
+        never turns into "Apple Juice".
+        """
+        if name in MERGED_NAMES:
+            return MERGED_NAMES[name]
+        stem = suffix_stem(canonical_key(name))
+        if stem in self.names:
+            return self.names[stem]
+        return name
+
+def get_table_path(base_dir=None):
+    """
+    The table is kept with the menu CSV files, in scraper/data by default
+    """
+    base_dir = base_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    return os.path.join(base_dir, TABLE_FILENAME)
+
+def seed_table():
+    return build_table({})
+
+def load_table(path):
+    """
+    Load a saved table, or None if it is missing or was built by older rules
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != TABLE_VERSION:
+        return None
+    return data
+
+def save_table(data, path):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+    os.replace(temp_path, path)
+
+if __name__ == '__main__':
+    from processing import collect_ingredient_names, find_csv_files, get_csv_directory
+
+    parser = argparse.ArgumentParser(description="Rebuild the canonical ingredient table from the scraped menus")
+    parser.add_argument('--data-dir', default=get_csv_directory(), help="folder holding the menu CSV files")
+    parser.add_argument('--lookup', action='append', default=[], help="print the canonical name of an ingredient instead")
+    args = parser.parse_args()
+
+    table_path = get_table_path(args.data_dir)
+    if args.lookup:
+        table = CanonicalTable(load_table(table_path) or seed_table())
+        for name in args.lookup:
+            canonical = table.canonical_name(name)
+            print(f"{name} -> {canonical} (filters: {table.filter_name(canonical)})")
+    else:
+        name_counts = collect_ingredient_names(find_csv_files(args.data_dir))
+        data = build_table(name_counts)
+        save_table(data, table_path)
+        merged = sum(1 for key, name in data['names'].items() if canonical_key(name) != key)
+        print(f"{len(name_counts)} distinct names, {len(data['names'])} keys, {merged} merged into another key")
+        print(f"Canonical ingredient table saved to {table_path}")
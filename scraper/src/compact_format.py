@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import time
+
+# Version of the compact layout, stored in the file
+COMPACT_FORMAT_VERSION = 1
+
+# Fields stored as a single id into a string table
+SCALAR_FIELDS = ['name', 'location', 'meal_time', 'date']
+
+# Fields stored as a list of ids into a string table
+LIST_FIELDS = ['ingredients', 'allergens']
+
+# String table each field's ids point into
+FIELD_TABLES = {
+    'name': 'names',
+    'location': 'locations',
+    'meal_time': 'meal_times',
+    'date': 'dates',
+    'ingredients': 'ingredients',
+    'allergens': 'allergens',
+}
+
+def encode_dishes(dishes):
+    """
+    Encode dishes, any iterable of them, into string tables plus one integer column per field.
+
+    List fields are stored as a flat column of ids with an offsets column,
+    so dish i's ingredients are values[offsets[i]:offsets[i + 1]].
+    """
+    tables = {table: [] for table in FIELD_TABLES.values()}
+    table_ids = {table: {} for table in FIELD_TABLES.values()}
+
+    def string_id(table, value):
+        ids = table_ids[table]
+        if value not in ids:
+            ids[value] = len(tables[table])
+            tables[table].append(value)
+        return ids[value]
+
+    columns = {field: [] for field in SCALAR_FIELDS}
+    for field in LIST_FIELDS:
+        columns[field] = {'offsets': [0], 'values': []}
+
+    for dish in dishes:
+        for field in SCALAR_FIELDS:
+            columns[field].append(string_id(FIELD_TABLES[field], dish[field]))
+        for field in LIST_FIELDS:
+            column = columns[field]
+            column['values'].extend(string_id(FIELD_TABLES[field], value) for value in dish[field])
+            column['offsets'].append(len(column['values']))
+
+    return {
+        'version': COMPACT_FORMAT_VERSION,
+        'count': len(columns['name']),
+        'tables': tables,
+        'columns': columns,
+    }
+
+def decode_dishes(data):
+    """
+    Expand the compact format back into the combined_dishes.json record shape
+    """
+    if data.get('version') != COMPACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact format version: {data.get('version')}")
+
+    tables = data['tables']
+    columns = data['columns']
+
+    # Resolve every column up front, then zip them into records
+    scalars = {
+        field: [tables[FIELD_TABLES[field]][i] for i in columns[field]]
+        for field in SCALAR_FIELDS
+    }
+    lists = {}
+    for field in LIST_FIELDS:
+        table = tables[FIELD_TABLES[field]]
+        offsets = columns[field]['offsets']
+        values = [table[i] for i in columns[field]['values']]
+        lists[field] = [values[offsets[i]:offsets[i + 1]] for i in range(data['count'])]
+
+    return [
+        {
+            "name": scalars['name'][i],
+            "ingredients": lists['ingredients'][i],
+            "allergens": lists['allergens'][i],
+            "meal_time": scalars['meal_time'][i],
+            "date": scalars['date'][i],
+            "location": scalars['location'][i]
+        }
+        for i in range(data['count'])
+    ]
+
+def compact_file(combined_file):
+    """
+    The compact encoding is written next to combined_dishes.json
+    """
+    return os.path.splitext(combined_file)[0] + '.compact.json'
+
+def save_compact_json(data, filename):
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as jsonfile:
+        json.dump(data, jsonfile, separators=(',', ':'))
+    os.replace(temp_filename, filename)
+
+def save_compact_dishes(dishes, filename):
+    save_compact_json(encode_dishes(dishes), filename)
+
+def load_compact_dishes(filename):
+    with open(filename, 'r', encoding='utf-8') as jsonfile:
+        return decode_dishes(json.load(jsonfile))
+
+def compare_formats(combined_file, compact_file, repeat=5):
+    """
+    Compare the size and parse time of the combined and compact files
+    """
+    def best_time(load):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            load()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def read_json(filename):
+        with open(filename, 'r', encoding='utf-8') as jsonfile:
+            return json.load(jsonfile)
+
+    return {
+        'combined': {
+            'bytes': os.path.getsize(combined_file),
+            'parse_seconds': best_time(lambda: read_json(combined_file)),
+        },
+        'compact': {
+            'bytes': os.path.getsize(compact_file),
+            'parse_seconds': best_time(lambda: read_json(compact_file)),
+            'parse_and_expand_seconds': best_time(lambda: load_compact_dishes(compact_file)),
+        },
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare combined_dishes.json with its compact encoding")
+    parser.add_argument('combined_file', help="path to combined_dishes.json")
+    parser.add_argument('--compact-file', help="compact file to compare against (written next to the combined file if omitted)")
+    args = parser.parse_args()
+
+    with open(args.combined_file, 'r', encoding='utf-8') as jsonfile:
+        dishes = json.load(jsonfile)
+
+    compact_file = args.compact_file or os.path.splitext(args.combined_file)[0] + '.compact.json'
+    if not args.compact_file:
+        save_compact_dishes(dishes, compact_file)
+
+    if load_compact_dishes(compact_file) != dishes:
+        raise SystemExit(f"{compact_file} does not expand back to {args.combined_file}")
+
+    results = compare_formats(args.combined_file, compact_file)
+    combined, compact = results['combined'], results['compact']
+    print(f"combined: {combined['bytes']:>10} bytes, parsed in {combined['parse_seconds'] * 1000:.1f} ms")
+    print(f"compact:  {compact['bytes']:>10} bytes, parsed in {compact['parse_seconds'] * 1000:.1f} ms "
+          f"({compact['parse_and_expand_seconds'] * 1000:.1f} ms including expansion)")
+    print(f"size ratio: {compact['bytes'] / combined['bytes']:.2f}")
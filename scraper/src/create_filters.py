@@ -1,42 +1,20 @@
+import argparse
+import hashlib
 import json
 import os
 from collections import Counter
+from functools import lru_cache
+from itertools import groupby
 import re
 
-# Configuration for name replacements
-NAME_REPLACEMENTS = {
-    "Allergy Friendly Bbq Sauce" : "BBQ Sauce",
-    "Allergy-Friendly Bbq Sauce" : "BBQ Sauce",
-    "Buttermilk Sauce" : "Buttermilk",
-    "Carrot Extractives" : "Carrot",
-    "Carrot" : "Carrot",
-    "Canola/Olive Oil Blend" : "Canola/Olive Oil",
-    "Canola Or Soybean Oil" : "Canola or Soybean Oil",
-    "Cheese Sauce" : "Cheese",
-    "Chipotle Aioli Sauce" : "Chipotle Aioli",
-    "Chipotle Pepper In Adobo Sauce" : "Adobo Sauce",
-    "Curry Powder" : "Curry",
-    "Curry Sauce" : "Curry",
-    "Cumin Seeds" : "Cumin",
-    "Dehydrated Garlic" : "Garlic",
-    "Dehydrated Mashed Potato Pearls" : "Mashed Potato",
-    "Expeller Pressed Canola Oil" : "Canola Oil",
-    "Breaded Okra Fried In Canola Oil" : "Breaded Okra",
-    "Garlic Powder" : "Garlic",
-    "Guajillo Chili Powder" : "Guajillo Chili",
-    "Lemon Juice" : "Lemon",
-    "Lime Juice" : "Lime",
-    "Liquid Sugar" : "Sugar",
-    "Onion Powder" : "Onion",
-    "Overnight Oats" : "Oats",
-    "Pesto Sauce" : "Pesto",
-    "Please refer to dining hall chef or manager for ingredient and allergen information" : "SPECIAL",
-    "Rosemary Extract" : "Rosemary",
-    "Seasonal Assortment Of Fresh Vegetables" : "Fresh Vegetables",
-    "Tomato Paste" : "Tomato",
-    "Turmeric Extractives" : "Turmeric",
-    "Yeast Extract" : "Yeast",
-}
+import canonicalize
+from canonicalize import MERGED_NAMES, SPECIAL_MESSAGE
+from compact_format import compact_file, load_compact_dishes
+from dish_store import iter_stored_dishes, store_file
+from dish_stream import iter_dish_array
+from manifest import MANIFEST_PATH, changed_since, load_manifest
+import metrics
+from name_search import SEARCH_FACETS, SEARCH_INDEX_FILENAME, build_search_index
 
 # Configuration for exclusions
 EXCLUSIONS = {
@@ -70,98 +48,443 @@ EXCLUSIONS = {
     'dates': []
 }
 
+EXCLUDED_INGREDIENTS = frozenset(EXCLUSIONS['ingredients'])
+
+# Filters written to the app, one file each
+FILTER_NAMES = ['allergens', 'dates', 'dishes', 'ingredients', 'locations', 'meal_times']
+
+# Bump whenever count_dish changes so saved partial counts are discarded
+FILTER_STATE_VERSION = 1
+
 def get_data_directory():
     current_dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.abspath(os.path.join(current_dir, '..', '..', 'stanfood_app', 'assets', 'data'))
 
-def load_combined_dishes():
-    data_dir = get_data_directory()
-    json_path = os.path.join(data_dir, 'combined_dishes.json')
-    with open(json_path, 'r') as file:
-        return json.load(file)
+def get_combined_file(json_path=None):
+    """
+    The most recently written of combined_dishes.json, its compact encoding and
+    the dish store, so a file left over from an earlier --format is never read.
+    Processing closes combined_dishes.json last, so it wins when they were
+    written together. None if none of them exists.
+    """
+    json_path = json_path or os.path.join(get_data_directory(), 'combined_dishes.json')
+    written = [path for path in (json_path, compact_file(json_path), store_file(json_path)) if os.path.exists(path)]
+    return max(written, key=os.path.getmtime, default=None)
+
+def iter_combined_dishes(json_path=None, combined_file=None):
+    # Read combined_dishes.json one dish at a time, or expand the compact file or
+    # the dish store when processing last wrote those. combined_file, from
+    # get_combined_file, pins which one is read.
+    json_path = json_path or os.path.join(get_data_directory(), 'combined_dishes.json')
+    combined_file = combined_file or get_combined_file(json_path)
+    if combined_file == store_file(json_path):
+        return iter_stored_dishes(combined_file)
+    if combined_file == compact_file(json_path):
+        return iter(load_compact_dishes(combined_file))
+    return iter_dish_array(json_path)
+
+def dump_json(data, output_path, **options):
+    """
+    Write data as JSON through a temporary file, so readers never see a partial file
+    """
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        # json.dumps encodes in one go with the C encoder, which json.dump never uses
+        file.write(json.dumps(data, **options))
+    os.replace(temp_path, output_path)
+
+def save_filter_json(data, filename, data_dir=None):
+    data_dir = data_dir or get_data_directory()
+    dump_json(data, os.path.join(data_dir, filename), indent=2)
+    metrics.increment('filter_entries', len(data), key=filename)
 
-def save_filter_json(data, filename):
+def get_filter_state_path():
+    # Partial counts are kept with the scraped data rather than shipped with the app
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(current_dir, '..', 'data', '.filter_state.json'))
+
+def filters_up_to_date():
+    """
+    Check whether every filter file is newer than the combined dishes file they are read from
+    """
     data_dir = get_data_directory()
-    output_path = os.path.join(data_dir, filename)
-    with open(output_path, 'w') as file:
-        json.dump(data, file, indent=2)
+    combined_file = get_combined_file(os.path.join(data_dir, 'combined_dishes.json'))
+    if combined_file is None:
+        return False
 
-def clean_and_replace_name(name):
+    combined_mtime = os.path.getmtime(combined_file)
+    for filter_name in FILTER_NAMES:
+        filter_path = os.path.join(data_dir, f'{filter_name}_filter.json')
+        if not os.path.exists(filter_path) or os.path.getmtime(filter_path) < combined_mtime:
+            return False
+
+    for filename in ('dish_index.json', SEARCH_INDEX_FILENAME):
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path) or os.path.getmtime(path) < combined_mtime:
+            return False
+    return True
+
+@lru_cache(maxsize=None)
+def strip_parenthetical(name):
     # Remove everything after the first opening parenthesis or bracket
     cleaned = re.split(r'[\(\[]', name)[0]
     # Remove leading/trailing whitespace and commas
-    cleaned = cleaned.strip().strip(',')
-    # Apply replacements
-    return NAME_REPLACEMENTS.get(cleaned, cleaned)
-
-def create_filter_files(dishes):
-    allergens = Counter()
-    dates = Counter()
-    dish_names = Counter()
-    ingredients = Counter()
-    locations = Counter()
-    meal_times = Counter()
-
-    unique_locations = set()
-    unique_meal_times = set()
-    
-    # Count occurrences
-    for dish in dishes:
-        if dish['name']:  # Only process the dish if it has a non-empty name
-            clean_name = clean_and_replace_name(dish['name'])
-            dish_names[clean_name] += 1
-            
-            allergens.update(dish['allergens'])
-            
-            if dish['date']:
-                dates[dish['date']] += 1
-            
-            for ing in dish['ingredients']:
-                clean_ing = clean_and_replace_name(ing)
-                if clean_ing:
-                    ingredients[clean_ing] += 1
-            
-            if dish['location']:
-                locations[dish['location']] += 1
-                unique_locations.add(dish['location'])
-            
-            if dish['meal_time']:
-                meal_times[dish['meal_time']] += 1
-                unique_meal_times.add(dish['meal_time'])
-        else:
-            if dish['location']:
-                unique_locations.add(dish['location'])
-            if dish['meal_time']:
-                unique_meal_times.add(dish['meal_time'])
+    return cleaned.strip().strip(',')
 
+_canonical_table = None
 
+def get_canonical_table():
+    # The table processing canonicalized the ingredients with, to tell which plain ingredients are known
+    global _canonical_table
+    if _canonical_table is None:
+        data = canonicalize.load_table(canonicalize.get_table_path()) or canonicalize.seed_table()
+        _canonical_table = canonicalize.CanonicalTable(data)
+    return _canonical_table
+
+@lru_cache(maxsize=None)
+def clean_and_replace_name(name):
+    # Dish names are grouped with the same merged names as ingredients
+    cleaned = strip_parenthetical(name)
+    return MERGED_NAMES.get(cleaned, cleaned)
+
+@lru_cache(maxsize=None)
+def clean_ingredient_name(name):
+    # Ingredients were already canonicalized during processing; only the
+    # filters group them further. Excluded names are left alone so they stay excluded.
+    if name == SPECIAL_MESSAGE:
+        return 'SPECIAL'
+    cleaned = strip_parenthetical(name)
+    if cleaned in EXCLUDED_INGREDIENTS:
+        return cleaned
+    return get_canonical_table().filter_name(cleaned)
+
+def new_filter_counts():
+    """
+    Create empty counters for every filter
+    """
+    return {
+        'allergens': Counter(),
+        'dates': Counter(),
+        'dishes': Counter(),
+        'ingredients': Counter(),
+        'locations': Counter(),
+        'meal_times': Counter(),
+        'unique_locations': set(),
+        'unique_meal_times': set(),
+    }
+
+def count_dish(counts, dish):
+    """
+    Add a single dish to the filter counters
+    """
+    if dish['name']:  # Only process the dish if it has a non-empty name
+        clean_name = clean_and_replace_name(dish['name'])
+        counts['dishes'][clean_name] += 1
+        
+        counts['allergens'].update(dish['allergens'])
+        
+        if dish['date']:
+            counts['dates'][dish['date']] += 1
+        
+        for ing in dish['ingredients']:
+            clean_ing = clean_ingredient_name(ing)
+            if clean_ing:
+                counts['ingredients'][clean_ing] += 1
+        
+        if dish['location']:
+            counts['locations'][dish['location']] += 1
+            counts['unique_locations'].add(dish['location'])
+        
+        if dish['meal_time']:
+            counts['meal_times'][dish['meal_time']] += 1
+            counts['unique_meal_times'].add(dish['meal_time'])
+    else:
+        if dish['location']:
+            counts['unique_locations'].add(dish['location'])
+        if dish['meal_time']:
+            counts['unique_meal_times'].add(dish['meal_time'])
+
+def save_filter_files(counts, data_dir=None):
+    """
+    Write one filter file per counter
+    """
     # Include all locations and meal types with 0 if no data
-    for location in unique_locations:
-        if location not in locations:
-            locations[location] = 0
+    for location in counts['unique_locations']:
+        if location not in counts['locations']:
+            counts['locations'][location] = 0
     
-    for meal_time in unique_meal_times:
-        if meal_time not in meal_times:
-            meal_times[meal_time] = 0
-
-    filters = {
-        'allergens': allergens,
-        'dates': dates,
-        'dishes': dish_names,
-        'ingredients': ingredients,
-        'locations': locations,
-        'meal_times': meal_times
-    }
+    for meal_time in counts['unique_meal_times']:
+        if meal_time not in counts['meal_times']:
+            counts['meal_times'][meal_time] = 0
 
-    for filter_name, counter in filters.items():
+    search_entries = {}
+    for filter_name in FILTER_NAMES:
+        excluded = set(EXCLUSIONS.get(filter_name, []))
         filter_data = [
             {"name": item, "count": count}
-            for item, count in sorted(counter.items())
-            if item and item not in EXCLUSIONS.get(filter_name, [])
+            for item, count in sorted(counts[filter_name].items())
+            if item and item not in excluded
         ]
-        save_filter_json(filter_data, f'{filter_name}_filter.json')
+        save_filter_json(filter_data, f'{filter_name}_filter.json', data_dir)
+        if filter_name in SEARCH_FACETS:
+            search_entries[filter_name] = [(entry['name'], entry['count']) for entry in filter_data]
+
+    # The typeahead searches the same names the filter screens list
+    save_search_index(build_search_index(search_entries), data_dir)
+
+def save_search_index(index, data_dir=None):
+    data_dir = data_dir or get_data_directory()
+    dump_json(index, os.path.join(data_dir, SEARCH_INDEX_FILENAME), separators=(',', ':'))
+
+def group_key(dish):
+    """
+    Identify the menu (source CSV file) a dish came from
+    """
+    return f"{dish['date']}|{dish['location']}|{dish['meal_time']}"
+
+def config_digest():
+    """
+    Hash the configuration that partial counts depend on
+    """
+    config = json.dumps([FILTER_STATE_VERSION, MERGED_NAMES, get_canonical_table().digest], sort_keys=True)
+    return hashlib.sha1(config.encode('utf-8')).hexdigest()
+
+def new_filter_state():
+    """
+    Create an empty state: partial counts per menu plus their running totals.
+    For unique locations and meal times the totals count how many menus list them.
+    """
+    return {
+        'config': config_digest(),
+        'groups': {},
+        'totals': {name: {} for name in new_filter_counts()},
+    }
+
+def load_filter_state(state_path=None):
+    try:
+        with open(state_path or get_filter_state_path(), 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return new_filter_state()
+
+    if state.get('config') != config_digest():
+        return new_filter_state()
+    return state
+
+def save_filter_state(state, state_path=None):
+    state_path = state_path or get_filter_state_path()
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    dump_json(state, state_path)
+
+def partial_counts(dishes):
+    """
+    Count a single menu's dishes into a mergeable, JSON-friendly form
+    """
+    counts = new_filter_counts()
+    for dish in dishes:
+        count_dish(counts, dish)
+    return {
+        name: dict(value) if isinstance(value, Counter) else {item: 1 for item in value}
+        for name, value in counts.items()
+    }
+
+def merge_partial(totals, partial, sign):
+    """
+    Add (sign=1) or subtract (sign=-1) a menu's partial counts from the totals
+    """
+    for name, items in partial.items():
+        total = totals[name]
+        for item, count in items.items():
+            remaining = total.get(item, 0) + sign * count
+            if remaining:
+                total[item] = remaining
+            else:
+                total.pop(item, None)
+
+def menu_digests(manifest):
+    """
+    {group key: content hash} of the menus in the manifest. A menu's dishes
+    only change with its CSV file or the config_digest settings, so this tells
+    which menus to recount without hashing their dishes.
+    """
+    # Imported here, since processing is only needed to read the CSV file names
+    from processing import parse_filename
+
+    digests = {}
+    for entry in manifest['menus'].values():
+        location, date, meal_time = parse_filename(os.path.basename(entry['path']))
+        if date is not None:
+            digests[group_key({'date': date, 'location': location, 'meal_time': meal_time})] = entry['hash']
+    return digests
+
+def combined_digests(json_path=None, manifest_path=MANIFEST_PATH):
+    """
+    menu_digests for the combined dishes, or None if a menu changed after they
+    were written, since the manifest then describes newer CSV files than they came from
+    """
+    combined_file = get_combined_file(json_path)
+    if combined_file is None or changed_since(manifest_path, os.path.getmtime(combined_file)):
+        return None
+    return menu_digests(load_manifest(manifest_path))
+
+def update_filter_group(state, key, dishes, digest=None):
+    """
+    Replace a menu's partial counts if its dishes changed, and return whether they did.
+    digest identifies the menu's contents, e.g. its hash from menu_digests;
+    without one the dishes themselves are hashed.
+    """
+    if digest is None:
+        digest = hashlib.sha1(json.dumps(dishes, sort_keys=True).encode('utf-8')).hexdigest()
+    group = state['groups'].get(key)
+    if group is not None and group['digest'] == digest:
+        return False
+
+    if group is not None:
+        merge_partial(state['totals'], group['partial'], -1)
+
+    partial = partial_counts(dishes)
+    merge_partial(state['totals'], partial, 1)
+    state['groups'][key] = {'digest': digest, 'partial': partial}
+    return True
+
+def remove_filter_groups(state, keep_keys):
+    """
+    Subtract the partial counts of menus that are no longer present
+    """
+    removed = [key for key in state['groups'] if key not in keep_keys]
+    for key in removed:
+        merge_partial(state['totals'], state['groups'].pop(key)['partial'], -1)
+    return removed
+
+def filter_state_counts(state):
+    """
+    Turn the running totals back into filter counters
+    """
+    counts = new_filter_counts()
+    for name, items in state['totals'].items():
+        if isinstance(counts[name], Counter):
+            counts[name].update(items)
+        else:
+            counts[name].update(items.keys())
+    return counts
+
+def iter_dish_groups(dishes):
+    """
+    Split dishes into their menus, yielding (key, dishes) for one menu at a time.
+    A menu's dishes have to be adjacent, as processing writes them.
+    """
+    for key, group in groupby(dishes, key=group_key):
+        yield key, list(group)
+
+class DishIndexBuilder:
+    """
+    Builds the inverted index from every filter value to the sorted ids of the
+    dishes that match it, where a dish's id is its position in combined_dishes.json.
+    Dishes are added one at a time in file order.
+    """
+    def __init__(self):
+        self.facets = {filter_name: {} for filter_name in FILTER_NAMES}
+        self.named = []
+        self.count = 0
+
+    def add_value(self, filter_name, value, dish_id):
+        ids = self.facets[filter_name].setdefault(value, [])
+        # Dishes are visited in order, so each list stays sorted without duplicates
+        if not ids or ids[-1] != dish_id:
+            ids.append(dish_id)
+
+    def add(self, dish):
+        dish_id = self.count
+        self.count += 1
+        if not dish['name']:  # Placeholders only mark empty menus
+            return
+        self.named.append(dish_id)
+
+        self.add_value('dishes', clean_and_replace_name(dish['name']), dish_id)
+        for allergen in dish['allergens']:
+            self.add_value('allergens', allergen, dish_id)
+        for ing in dish['ingredients']:
+            clean_ing = clean_ingredient_name(ing)
+            if clean_ing:
+                self.add_value('ingredients', clean_ing, dish_id)
+        for filter_name, field in (('dates', 'date'), ('locations', 'location'), ('meal_times', 'meal_time')):
+            if dish[field]:
+                self.add_value(filter_name, dish[field], dish_id)
+
+    def result(self):
+        return {
+            'version': 1,
+            'count': self.count,
+            'dishes': self.named,
+            'facets': self.facets,
+        }
+
+def build_dish_index(dishes):
+    """
+    Build the inverted index for an iterable of dishes
+    """
+    builder = DishIndexBuilder()
+    for dish in dishes:
+        builder.add(dish)
+    return builder.result()
+
+def file_digest(path):
+    """
+    Hash of a file's contents, the way menu_server versions combined_dishes.json
+    """
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()[:16]
+
+def write_dish_index(index, data_dir=None, combined_file=None):
+    """
+    Write the dish index. With the combined file its dishes were read from,
+    the index records that file's digest, so readers can tell it still matches.
+    """
+    data_dir = data_dir or get_data_directory()
+    if combined_file is not None:
+        index = dict(index, source=file_digest(combined_file))
+    dump_json(index, os.path.join(data_dir, 'dish_index.json'), separators=(',', ':'))
+
+def save_dish_index(dishes, data_dir=None, combined_file=None):
+    write_dish_index(build_dish_index(dishes), data_dir, combined_file)
+
+def create_filter_files(dishes, data_dir=None, state_path=None, digests=None, combined_file=None):
+    """
+    Update the filter files and dish index from an iterable of dishes,
+    holding only one menu's dishes at a time. With digests from menu_digests,
+    menus are compared by those instead of by hashing their dishes. The dishes
+    are read from combined_file, if given, see write_dish_index.
+    """
+    digests = digests or {}
+    state = load_filter_state(state_path)
+    index = DishIndexBuilder()
+    keys = set()
+    changed = []
+
+    # Only menus that were added, changed or removed are recounted
+    for key, group in iter_dish_groups(dishes):
+        if key in keys:
+            raise ValueError(f"The dishes of menu {key} are not adjacent")
+        keys.add(key)
+        if update_filter_group(state, key, group, digests.get(key)):
+            changed.append(key)
+        for dish in group:
+            index.add(dish)
+    removed = remove_filter_groups(state, keys)
+    print(f"Recounted {len(changed)} changed menu(s), removed {len(removed)}, kept {len(keys) - len(changed)}")
+
+    save_filter_files(filter_state_counts(state), data_dir)
+    if changed or removed:
+        save_filter_state(state, state_path)
+    write_dish_index(index.result(), data_dir, combined_file)
 
 if __name__ == '__main__':
-    combined_dishes = load_combined_dishes()
-    create_filter_files(combined_dishes)
-    print(f"Filter JSON files have been created successfully in {get_data_directory()}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create the filter JSON files from the combined dishes")
+    parser.add_argument('--force', action='store_true', help="recreate the filter files even if they are up to date")
+    args = parser.parse_args()
+
+    if not args.force and filters_up_to_date():
+        print("Filter JSON files are already up to date")
+    else:
+        create_filter_files(iter_combined_dishes(), digests=combined_digests(), combined_file=get_combined_file())
+        print(f"Filter JSON files have been created successfully in {get_data_directory()}")
\ No newline at end of file
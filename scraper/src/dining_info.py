@@ -1,9 +1,11 @@
 from datetime import datetime, timedelta
 from pytz import timezone
-from selenium.webdriver.common.by import By 
 
 import os
 import csv
+import io
+
+from manifest import hash_content, menu_changed, prune_date, record_menu
 
 dining_hall_list = [
     'Arrillaga', 'Branner', 'EVGR', 'FlorenceMoore', 
@@ -27,20 +29,22 @@ meal_type_list = ['Breakfast', 'Lunch', 'Dinner', 'Brunch']
 # Timezone for accurate timing
 pst_timezone = timezone('America/Los_Angeles')
 
-def generate_date_array():
+def generate_date_array(now=None):
     """
-    Generate an array of dates for the next 7 days in m/d/yyyy format
+    Generate an array of dates for the next 7 days in m/d/yyyy format,
+    starting from now (a Unix timestamp) if given
     """
-    pst_now = datetime.now(pst_timezone)
+    pst_now = datetime.now(pst_timezone) if now is None else datetime.fromtimestamp(now, pst_timezone)
     return [(pst_now + timedelta(days=i)).strftime('%m/%d/%Y').lstrip("0").replace("/0", "/") for i in range(7)]
 
 dates_list = generate_date_array()
 
-def cleanup_old_data():
+def cleanup_old_data(manifest=None, now=None):
     """
-    Remove directories for dates older than the current date
+    Remove directories for dates older than the current date, or than now
+    (a Unix timestamp) if given
     """
-    pst_now = datetime.now(pst_timezone).date()
+    pst_now = (datetime.now(pst_timezone) if now is None else datetime.fromtimestamp(now, pst_timezone)).date()
 
     data_directory = os.path.join('..', 'data')
 
@@ -52,6 +56,10 @@ def cleanup_old_data():
     deleted_any = False  # Flag to check if any directories were deleted
 
     for date_folder in os.listdir(data_directory):
+        # Skip files kept alongside the date folders, such as the manifest
+        if not os.path.isdir(os.path.join(data_directory, date_folder)):
+            continue
+
         try:
             # Convert folder name to datetime object
             folder_date = datetime.strptime(date_folder, '%m-%d-%Y').date()
@@ -71,6 +79,9 @@ def cleanup_old_data():
                     os.rmdir(folder_path)
                     print(f"Deleted directory: {folder_path}")
                     deleted_any = True
+
+                    if manifest is not None:
+                        prune_date(manifest, date_folder.replace('-', '/'))
         except ValueError:
             print(f"Skipping invalid folder name: {date_folder}")
             continue
@@ -103,58 +114,138 @@ def add_icons_to_allergens(allergens, icons):
             allergens.append("kosher")
     return allergens
 
-def extract_food_info(item):
+def build_food_info(name, ingredients_text, allergens_text, icon_srcs):
     """
-    Extract food details from a menu item element
+    Build the food details dictionary from the raw label text and icon sources
     """
-    name = item.find_element(By.CLASS_NAME, 'clsLabel_Name').text
-    ingredients = item.find_element(By.CLASS_NAME, 'clsLabel_Ingredients').text.replace("Ingredients: ", "")
-    allergens = item.find_element(By.CLASS_NAME, 'clsLabel_Allergens').text.replace("Allergens: ", "").split(", ")
-    icons = item.find_elements(By.CLASS_NAME, 'clsLabel_IconImage')
-    icon_srcs = [parse_food_icon(icon.get_attribute('src')) for icon in icons]
-
-    allergens_with_icons = add_icons_to_allergens(allergens, icon_srcs)
+    ingredients = ingredients_text.replace("Ingredients: ", "")
+    allergens = allergens_text.replace("Allergens: ", "").split(", ")
+    icons = [parse_food_icon(src) for src in icon_srcs]
 
     food_info = {
         'name': name,
         'ingredients': ingredients,
-        'allergens': allergens_with_icons,
+        'allergens': add_icons_to_allergens(allergens, icons),
     }
 
     return food_info
 
-def save_info(driver, selected_date, selected_dining_hall, selected_meal_type):
+# Script that reads every menu item's labels and icon sources in one WebDriver call.
+# Label text is normalized the way WebDriver's element text is: spaces collapsed,
+# every line trimmed, blank lines dropped and non-breaking spaces made plain.
+# A missing label throws, as find_element would, so the menu is retried.
+EXTRACT_MENU_ITEMS_SCRIPT = r"""
+return Array.from(document.querySelectorAll('div[class^="clsMenuItem"]')).map(function (item) {
+    function labelText(className) {
+        var label = item.getElementsByClassName(className)[0];
+        if (!label) {
+            throw new Error('Menu item has no ' + className + ' label');
+        }
+        return label.innerText.split('\n').map(function (line) {
+            return line.replace(/[ \f\t\v\u2028\u2029]+/g, ' ').replace(/^[^\S\xa0]+|[^\S\xa0]+$/g, '');
+        }).filter(function (line) {
+            return line;
+        }).join('\n').replace(/\xa0/g, ' ');
+    }
+    return {
+        name: labelText('clsLabel_Name'),
+        ingredients: labelText('clsLabel_Ingredients'),
+        allergens: labelText('clsLabel_Allergens'),
+        icons: Array.from(item.getElementsByClassName('clsLabel_IconImage')).map(function (icon) {
+            return icon.src;
+        })
+    };
+});
+"""
+
+def extract_menu_items(driver):
     """
-    Save menu information to a CSV file based on date, hall, and meal
+    Extract food details for every menu item on the page in a single round-trip
     """
-    food_items = driver.find_elements(By.XPATH, '//div[starts-with(@class, "clsMenuItem")]')
-    food_info_list = []
-    for item in food_items:
-        food_info_list.append(extract_food_info(item))
-    
-    # In case further processing required
+    items = driver.execute_script(EXTRACT_MENU_ITEMS_SCRIPT) or []
+    return [
+        build_food_info(item['name'], item['ingredients'], item['allergens'], item['icons'])
+        for item in items
+    ]
+
+def build_shards(dates=None):
+    """
+    Build the ordered list of (date, hall, meal) combinations to scrape,
+    for the next 7 days unless other dates are given
+    """
+    return [
+        (date, hall, meal)
+        for date in dates or dates_list
+        for hall in dining_hall_list
+        for meal in meal_type_list
+    ]
+
+def menu_csv_path(selected_date, selected_dining_hall, selected_meal_type):
+    """
+    Build the CSV path for a date, hall, and meal
+    """
+    date_folder = os.path.join('..', 'data', selected_date.replace('/', '-'))
+    meal_folder = os.path.join(date_folder, selected_meal_type)
+    csv_filename = f"{dining_hall_alias[selected_dining_hall]}_{selected_date.replace('/', '-')}_{selected_meal_type}.csv"
+    return os.path.join(meal_folder, csv_filename)
+
+def menu_csv_row(food_info):
+    """
+    Format food details as a CSV row
+    """
+    allergens_formatted = ', '.join(food_info['allergens']).lstrip(', ').strip()
+    return [food_info['name'], food_info['ingredients'], allergens_formatted]
+
+def write_menu_csv(selected_date, selected_dining_hall, selected_meal_type, food_info_list, manifest=None):
+    """
+    Write the extracted menu items to a CSV file based on date, hall, and meal.
+    With a manifest, menus whose contents haven't changed are left untouched.
+    """
+    # Prepare the directory structure and route file
+    csv_path = menu_csv_path(selected_date, selected_dining_hall, selected_meal_type)
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+
+    # Returned for in-process consumers such as the pipeline
     menu_info = {
         'diningHall': dining_hall_alias[selected_dining_hall],
         'day': selected_date,
         'meal': selected_meal_type,
         'foodInfo': food_info_list,
+        'csvPath': csv_path,
     }
 
-    # Prepare the directory structure
-    date_folder = os.path.join('..', 'data', selected_date.replace('/', '-'))
-    meal_folder = os.path.join(date_folder, selected_meal_type)
-    os.makedirs(meal_folder, exist_ok=True)
-
-    # Create CSV filename and route file
-    csv_filename = f"{dining_hall_alias[selected_dining_hall]}_{selected_date.replace('/', '-')}_{selected_meal_type}.csv"
-    csv_path = os.path.join(meal_folder, csv_filename)
-    
-    # Save data to the CSV file
-    with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['Name', ' Ingredients', ' Allergens'])
-        for food_info in food_info_list:
-            allergens_formatted = ', '.join(food_info['allergens']).lstrip(', ').strip()
-            writer.writerow([food_info['name'], food_info['ingredients'], allergens_formatted])
-    
-    print(f"Saved data to {csv_path}")
\ No newline at end of file
+    # Render the CSV contents
+    csv_buffer = io.StringIO(newline='')
+    writer = csv.writer(csv_buffer)
+    writer.writerow(['Name', ' Ingredients', ' Allergens'])
+    for food_info in food_info_list:
+        writer.writerow(menu_csv_row(food_info))
+    content = csv_buffer.getvalue()
+
+    # Skip the write if the menu is the same as last time, but still record when it was fetched
+    content_hash = hash_content(content)
+    changed = manifest is None or menu_changed(manifest, selected_date, selected_dining_hall, selected_meal_type, csv_path, content_hash)
+    if not changed:
+        record_menu(manifest, selected_date, selected_dining_hall, selected_meal_type, csv_path, content_hash, changed=False)
+        print(f"Menu unchanged, kept {csv_path}")
+        return menu_info
+
+    # Save data to the CSV file through a temporary file, so a crash never leaves a partial menu behind
+    temp_path = f"{csv_path}.tmp"
+    with open(temp_path, 'w', newline='', encoding='utf-8') as csv_file:
+        csv_file.write(content)
+    os.replace(temp_path, csv_path)
+
+    # Only recorded once the file is in place, so a failed write is retried as changed
+    if manifest is not None:
+        record_menu(manifest, selected_date, selected_dining_hall, selected_meal_type, csv_path, content_hash, changed=True)
+
+    print(f"Saved data to {csv_path}")
+    return menu_info
+
+def save_info(driver, selected_date, selected_dining_hall, selected_meal_type, manifest=None):
+    """
+    Save menu information to a CSV file based on date, hall, and meal
+    """
+    food_info_list = extract_menu_items(driver)
+    return write_menu_csv(selected_date, selected_dining_hall, selected_meal_type, food_info_list, manifest)
\ No newline at end of file
@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+
+from create_filters import get_data_directory, iter_combined_dishes
+
+def ids_to_bits(ids, count):
+    """
+    Pack a sorted list of dish ids into an integer bitset
+    """
+    bitmap = bytearray((count + 7) // 8)
+    for dish_id in ids:
+        bitmap[dish_id >> 3] |= 1 << (dish_id & 7)
+    return int.from_bytes(bitmap, 'little')
+
+def bits_to_ids(bits):
+    """
+    Unpack an integer bitset into a sorted list of dish ids
+    """
+    ids = []
+    bitmap = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(bitmap):
+        while byte:
+            low_bit = byte & -byte
+            ids.append(byte_index * 8 + low_bit.bit_length() - 1)
+            byte ^= low_bit
+    return ids
+
+class DishIndex:
+    """
+    AND/OR/NOT queries over the inverted index written by create_filters.py.
+
+    Each term is a (filter_name, value) pair, e.g. ('allergens', 'Vegan') or
+    ('locations', 'Wilbur Dining'). Id lists are turned into bitsets the first
+    time they are used, so a query costs a few big-integer operations no
+    matter how many dishes match.
+    """
+    def __init__(self, data):
+        self.count = data['count']
+        self.facets = data['facets']
+        self.all_dishes = ids_to_bits(data['dishes'], self.count)
+        self._bits = {}
+
+    def bits(self, filter_name, value):
+        """
+        Bitset of the dishes matching a single term
+        """
+        key = (filter_name, value)
+        if key not in self._bits:
+            ids = self.facets.get(filter_name, {}).get(value, [])
+            self._bits[key] = ids_to_bits(ids, self.count)
+        return self._bits[key]
+
+    def query(self, all_of=(), any_of=(), none_of=()):
+        """
+        Bitset of the dishes matching every term in all_of, at least one term
+        in any_of (if given), and none of the terms in none_of
+        """
+        result = self.all_dishes
+        for filter_name, value in all_of:
+            result &= self.bits(filter_name, value)
+        if any_of:
+            matches_any = 0
+            for filter_name, value in any_of:
+                matches_any |= self.bits(filter_name, value)
+            result &= matches_any
+        for filter_name, value in none_of:
+            result &= ~self.bits(filter_name, value)
+        return result
+
+    def query_ids(self, all_of=(), any_of=(), none_of=()):
+        """
+        Sorted ids of the matching dishes, i.e. their positions in combined_dishes.json
+        """
+        return bits_to_ids(self.query(all_of, any_of, none_of))
+
+def load_dish_index(path=None):
+    path = path or os.path.join(get_data_directory(), 'dish_index.json')
+    with open(path, 'r') as file:
+        return DishIndex(json.load(file))
+
+def parse_term(term):
+    filter_name, _, value = term.partition(':')
+    return filter_name, value
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Query the dish index, e.g. --all allergens:Vegan --all 'locations:Wilbur Dining' --none allergens:Peanuts"
+    )
+    parser.add_argument('--all', action='append', default=[], type=parse_term, help="filter:value every dish must match")
+    parser.add_argument('--any', action='append', default=[], type=parse_term, help="filter:value of which a dish must match at least one")
+    parser.add_argument('--none', action='append', default=[], type=parse_term, help="filter:value no dish may match")
+    args = parser.parse_args()
+
+    # Stream the dishes rather than loading them all to print the matches
+    matches = set(load_dish_index().query_ids(args.all, args.any, args.none))
+    for dish_id, dish in enumerate(iter_combined_dishes()):
+        if dish_id in matches:
+            print(f"{dish['date']}  {dish['location']}  {dish['meal_time']}  {dish['name']}")
@@ -0,0 +1,106 @@
+import argparse
+import hashlib
+import json
+import os
+
+# Version of the store layout, stored in the file
+DISH_STORE_VERSION = 1
+
+# Fields that describe the dish itself; the rest say where and when it was served
+DISH_FIELDS = ['name', 'ingredients', 'allergens']
+OCCURRENCE_FIELDS = ['date', 'location', 'meal_time']
+
+def store_file(combined_file):
+    """
+    The store is written next to combined_dishes.json
+    """
+    return os.path.splitext(combined_file)[0] + '.store.json'
+
+def dish_hash(name, ingredients, allergens):
+    """
+    Content address of a dish, the same wherever and whenever it is served
+    """
+    content = json.dumps([name, ingredients, allergens], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+class DishStoreBuilder:
+    """
+    Builds the content-addressed form of combined_dishes.json one dish at a
+    time. Each distinct dish is kept once, under its hash, and every time it
+    is served is a (hash, date, location, meal_time) occurrence.
+    """
+    def __init__(self):
+        self.dishes = {}
+        self.occurrences = []
+
+    def add(self, dish):
+        key = dish_hash(dish['name'], dish['ingredients'], dish['allergens'])
+        if key not in self.dishes:
+            self.dishes[key] = [dish[field] for field in DISH_FIELDS]
+        self.occurrences.append([key] + [dish[field] for field in OCCURRENCE_FIELDS])
+
+    def result(self):
+        return {
+            'version': DISH_STORE_VERSION,
+            'dishes': self.dishes,
+            'occurrences': self.occurrences,
+        }
+
+def encode_dish_store(dishes):
+    builder = DishStoreBuilder()
+    for dish in dishes:
+        builder.add(dish)
+    return builder.result()
+
+def expand_dishes(data):
+    """
+    Yield the dishes of a store in the combined_dishes.json record shape, in
+    their original order, so dish ids and the filter counts are unchanged
+    """
+    if data.get('version') != DISH_STORE_VERSION:
+        raise ValueError(f"Unsupported dish store version: {data.get('version')}")
+
+    dishes = data['dishes']
+    for key, date, location, meal_time in data['occurrences']:
+        name, ingredients, allergens = dishes[key]
+        # Fresh lists, so changing one occurrence doesn't change the others
+        yield {
+            "name": name,
+            "ingredients": list(ingredients),
+            "allergens": list(allergens),
+            "meal_time": meal_time,
+            "date": date,
+            "location": location
+        }
+
+def save_dish_store(data, filename):
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as jsonfile:
+        json.dump(data, jsonfile, separators=(',', ':'))
+    os.replace(temp_filename, filename)
+
+def load_dish_store(filename):
+    with open(filename, 'r', encoding='utf-8') as jsonfile:
+        return json.load(jsonfile)
+
+def iter_stored_dishes(filename):
+    return expand_dishes(load_dish_store(filename))
+
+if __name__ == '__main__':
+    from dish_stream import iter_dish_array, write_dish_array
+
+    parser = argparse.ArgumentParser(description="Convert between combined_dishes.json and its content-addressed store")
+    parser.add_argument('combined_file', help="path to combined_dishes.json")
+    parser.add_argument('--expand', action='store_true', help="rewrite combined_file from the store next to it instead")
+    args = parser.parse_args()
+
+    store_path = store_file(args.combined_file)
+    if args.expand:
+        count = write_dish_array(iter_stored_dishes(store_path), args.combined_file)
+        print(f"Expanded {count} dishes from {store_path} into {args.combined_file}")
+    else:
+        data = encode_dish_store(iter_dish_array(args.combined_file))
+        save_dish_store(data, store_path)
+        print(f"{len(data['occurrences'])} dishes served, {len(data['dishes'])} distinct")
+        print(f"combined: {os.path.getsize(args.combined_file):>10} bytes")
+        print(f"store:    {os.path.getsize(store_path):>10} bytes")
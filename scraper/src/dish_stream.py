@@ -0,0 +1,105 @@
+import json
+import os
+import re
+
+# Bytes read at a time when parsing a dish array
+READ_CHUNK_SIZE = 1 << 16
+
+WHITESPACE = re.compile(r'\s*')
+
+class DishArrayWriter:
+    """
+    Writes dishes one at a time as a JSON array, producing exactly the bytes
+    json.dump(dishes, file, indent=2) would, without holding the list in memory.
+    The file is written under a temporary name and only replaces the
+    destination once closed, so readers never see a partial array.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.temp_filename = f"{filename}.tmp"
+        self.file = open(self.temp_filename, 'w', encoding='utf-8')
+        self.count = 0
+
+    def write(self, dish):
+        self.file.write('[\n  ' if self.count == 0 else ',\n  ')
+        self.file.write(json.dumps(dish, indent=2).replace('\n', '\n  '))
+        self.count += 1
+
+    def close(self):
+        self.file.write('\n]' if self.count else '[]')
+        self.file.close()
+        os.replace(self.temp_filename, self.filename)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.temp_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+def write_dish_array(dishes, filename):
+    """
+    Stream dishes to filename as a JSON array and return how many were written
+    """
+    with DishArrayWriter(filename) as writer:
+        for dish in dishes:
+            writer.write(dish)
+    return writer.count
+
+def iter_dish_array(filename, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield the elements of a JSON array file one at a time, reading it in
+    chunks so only the current element is held in memory
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, 'r', encoding='utf-8') as file:
+        buffer = ''
+        pos = 0
+        eof = False
+        # What comes next: the opening bracket, the first element or the closing
+        # bracket, a comma or the closing bracket, or an element after a comma
+        expected = 'open'
+
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            element, end = None, None
+            if pos < len(buffer):
+                char = buffer[pos]
+                if expected == 'open':
+                    if char != '[':
+                        raise ValueError(f"{filename} does not contain a JSON array")
+                    expected = 'first'
+                    pos += 1
+                    continue
+                if char == ']' and expected in ('first', 'separator'):
+                    return
+                if expected == 'separator':
+                    if char != ',':
+                        raise ValueError(f"{filename} is missing a comma between array elements")
+                    expected = 'element'
+                    pos += 1
+                    continue
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    pass
+
+            # An element that runs to the end of the buffer may have been cut off, so read more first
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise ValueError(f"{filename} is not a complete JSON array")
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield element
+            pos = end
+            expected = 'separator'
@@ -0,0 +1,311 @@
+import argparse
+import http.client
+import http.cookiejar
+import re
+import sys
+import urllib.parse
+import urllib.request
+from html.parser import HTMLParser
+
+from dining_info import *
+from manifest import DEFAULT_MAX_AGE_HOURS, is_fresh, load_manifest, save_manifest
+import metrics
+
+# Stanford Dining Menu page
+url = 'https://rdeapps.stanford.edu/dininghallmenu/'
+
+# Errors a failed or cut-off request can raise, including a malformed response
+FETCH_ERRORS = (OSError, ValueError, http.client.HTTPException)
+
+# Elements that never have a closing tag
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+
+class MenuPageParser(HTMLParser):
+    """
+    Collect the form fields, dropdowns and menu items from a menu page
+    """
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.hidden_fields = {}
+        self.dropdowns = {}
+        self.items = []
+
+        self._dropdown = None
+        self._option = None
+        self._item = None
+        self._item_depth = 0
+        self._label = None
+        self._label_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+
+        if tag == 'form' and self.action is None:
+            self.action = attrs.get('action') or ''
+        elif tag == 'input' and (attrs.get('type') or '').lower() == 'hidden' and attrs.get('name'):
+            self.hidden_fields[attrs['name']] = attrs.get('value') or ''
+        elif tag == 'select' and attrs.get('id'):
+            self._dropdown = {'name': attrs.get('name') or attrs['id'], 'options': [], 'selected': None}
+            self.dropdowns[attrs['id']] = self._dropdown
+        elif tag == 'option' and self._dropdown is not None:
+            self._option = attrs.get('value')
+            if self._option is not None:
+                self._dropdown['options'].append(self._option)
+                if 'selected' in attrs:
+                    self._dropdown['selected'] = self._option
+
+        # Menu items are the divs whose class starts with clsMenuItem
+        if tag == 'div':
+            if self._item is not None:
+                self._item_depth += 1
+            elif (attrs.get('class') or '').startswith('clsMenuItem'):
+                # Labels stay None until found, so a missing one can be told from an empty one
+                self._item = {'name': None, 'ingredients': None, 'allergens': None, 'icons': []}
+                self._item_depth = 1
+
+        if self._item is None:
+            return
+
+        if tag == 'img' and 'clsLabel_IconImage' in classes:
+            self._item['icons'].append(attrs.get('src') or '')
+        elif self._label is not None:
+            if tag == 'br':
+                self._item[self._label] += '\n'
+            elif tag not in VOID_TAGS:
+                self._label_depth += 1
+        elif tag not in VOID_TAGS:
+            for label in ('name', 'ingredients', 'allergens'):
+                if f'clsLabel_{label.capitalize()}' in classes:
+                    self._label = label
+                    self._label_depth = 1
+                    self._item[label] = self._item[label] or ''
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self._dropdown = None
+        elif tag == 'option':
+            self._option = None
+
+        if self._item is None:
+            return
+
+        # Void elements never opened a level, even when written as <br/> or closed as </br>
+        if self._label is not None and tag not in VOID_TAGS:
+            self._label_depth -= 1
+            if self._label_depth == 0:
+                self._label = None
+
+        if tag == 'div':
+            self._item_depth -= 1
+            if self._item_depth == 0:
+                self.items.append(self._item)
+                self._item = None
+                self._label = None
+
+    def handle_data(self, data):
+        if self._label is not None:
+            # Line breaks in the source render as spaces, only <br> starts a new line
+            self._item[self._label] += re.sub(r'[ \t\r\n\f]+', ' ', data)
+
+def clean_text(text):
+    """
+    Normalize label text the way WebDriver's element text is: spaces collapsed,
+    every line trimmed, blank lines dropped and non-breaking spaces made plain
+    """
+    lines = [re.sub(r'^[^\S\xa0]+|[^\S\xa0]+$', '', re.sub(r'[ \f\t\v\u2028\u2029]+', ' ', line)) for line in text.split('\n')]
+    return '\n'.join(line for line in lines if line).replace('\xa0', ' ')
+
+def parse_menu_page(html, page_url=url):
+    """
+    Parse a menu page into its form state and the food details it lists
+    """
+    parser = MenuPageParser()
+    parser.feed(html)
+    parser.close()
+
+    # Browsers fall back to the first option when none is marked selected
+    for dropdown in parser.dropdowns.values():
+        if dropdown['selected'] is None and dropdown['options']:
+            dropdown['selected'] = dropdown['options'][0]
+
+    # A menu item without one of its labels means the page didn't load as expected
+    for item in parser.items:
+        for label in ('name', 'ingredients', 'allergens'):
+            if item[label] is None:
+                raise ValueError(f"Menu item has no clsLabel_{label.capitalize()} label")
+
+    food_info_list = [
+        build_food_info(
+            clean_text(item['name']),
+            clean_text(item['ingredients']),
+            clean_text(item['allergens']),
+            [urllib.parse.urljoin(page_url, src) for src in item['icons']],
+        )
+        for item in parser.items
+    ]
+
+    return {
+        'url': page_url,
+        'action': urllib.parse.urljoin(page_url, parser.action or ''),
+        'hidden_fields': parser.hidden_fields,
+        'dropdowns': parser.dropdowns,
+        'foodInfo': food_info_list,
+    }
+
+def build_postback(page, id_name, value):
+    """
+    Build the form fields that the page would post when a dropdown changes
+    """
+    dropdown = page['dropdowns'][f'MainContent_lst{id_name}']
+
+    # Carry __VIEWSTATE, __EVENTVALIDATION and the other hidden fields forward
+    fields = dict(page['hidden_fields'])
+    for other in page['dropdowns'].values():
+        if other['selected'] is not None:
+            fields[other['name']] = other['selected']
+
+    fields[dropdown['name']] = value
+    fields['__EVENTTARGET'] = dropdown['name']
+    fields['__EVENTARGUMENT'] = ''
+    return fields
+
+def urllib_transport():
+    """
+    Create a transport that keeps the ASP.NET session cookie between requests
+    """
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def transport(request_url, data=None):
+        body = urllib.parse.urlencode(data).encode('utf-8') if data is not None else None
+        with opener.open(request_url, body, timeout=30) as response:
+            charset = response.headers.get_content_charset() or 'utf-8'
+            return response.geturl(), response.read().decode(charset, 'replace')
+
+    return transport
+
+class HttpMenuClient:
+    """
+    Scrape the menu page by replaying its form postbacks over HTTP.
+
+    The transport is a callable taking a URL and optional form fields and
+    returning the final URL and page HTML, so saved pages can be served
+    in place of the live site.
+    """
+    def __init__(self, base_url=url, transport=None):
+        self.base_url = base_url
+        self.transport = transport or urllib_transport()
+        self.page = None
+        self.postbacks = 0
+
+    def load(self, request_url, data=None):
+        if data is not None:
+            self.postbacks += 1
+        page_url, html = self.transport(request_url, data)
+        self.page = parse_menu_page(html, page_url)
+        return self.page
+
+    def open(self):
+        """
+        Load the initial menu page
+        """
+        return self.load(self.base_url)
+
+    def selected(self, id_name):
+        """
+        Retrieve the currently selected value from the dropdown
+        """
+        return self.page['dropdowns'][f'MainContent_lst{id_name}']['selected']
+
+    def select(self, id_name, value):
+        """
+        Select a dropdown value, posting back only if the selection changes
+        """
+        if self.selected(id_name) == value:
+            return self.page
+
+        if value not in self.page['dropdowns'][f'MainContent_lst{id_name}']['options']:
+            raise ValueError(f"{value} is not an option in MainContent_lst{id_name}")
+
+        return self.load(self.page['action'], build_postback(self.page, id_name, value))
+
+    def offers(self, id_name, value):
+        """
+        Whether the current page lists value as an option of the dropdown
+        """
+        return value in self.page['dropdowns'][f'MainContent_lst{id_name}']['options']
+
+    def scrape(self, date, hall, meal):
+        """
+        Select a (date, hall, meal) combination and return its food details.
+        Returns None, without further postbacks, if the page doesn't offer the
+        hall or meal, and raises ValueError if it doesn't offer the date.
+        """
+        if self.page is None:
+            self.open()
+
+        key = f"{date}|{hall}|{meal}"
+        postbacks = self.postbacks
+        try:
+            # The options can change with every postback, so check each against the current page
+            for id_name, value in [('Day', date), ('Locations', hall), ('MealType', meal)]:
+                if not self.offers(id_name, value):
+                    # A date missing from the page is a failed load rather than a day without menus, so it is retried
+                    if id_name == 'Day':
+                        raise ValueError(f"{date} is not an option in MainContent_lstDay")
+                    metrics.increment('menus_not_offered', key=key)
+                    return None
+                self.select(id_name, value)
+        finally:
+            metrics.increment('postbacks', self.postbacks - postbacks, key=key)
+
+        metrics.increment('menu_items', len(self.page['foodInfo']), key=key)
+        return self.page['foodInfo']
+
+def main(base_url=url, max_age_hours=DEFAULT_MAX_AGE_HOURS):
+    manifest = load_manifest()
+
+    # Cleanup old data
+    cleanup_old_data(manifest)
+
+    client = HttpMenuClient(base_url)
+    client.open()
+
+    failed = []
+    for date, hall, meal in build_shards():
+        # Skip menus that were fetched recently enough
+        if is_fresh(manifest, date, hall, meal, dates_list[0], max_age_hours):
+            continue
+
+        try:
+            food_info_list = client.scrape(date, hall, meal)
+        except FETCH_ERRORS as e:
+            print(f"Error scraping {date}, {dining_hall_alias[hall]}, {meal}: {e}")
+            failed.append((date, hall, meal))
+            continue
+
+        # Record menus the site doesn't offer as empty, so processing still emits their placeholders
+        if food_info_list is None:
+            print(f"No {meal} menu for: {date}, {dining_hall_alias[hall]}")
+            write_menu_csv(date, hall, meal, [], manifest)
+            continue
+
+        print(f"Fetching data for: {client.selected('Day')}, {dining_hall_alias[client.selected('Locations')]}, {client.selected('MealType')}")
+        write_menu_csv(client.selected('Day'), client.selected('Locations'), client.selected('MealType'), food_info_list, manifest)
+
+    save_manifest(manifest)
+
+    if failed:
+        print(f"Failed to scrape {len(failed)} menu(s)")
+        sys.exit(1)
+
+    print("Menu scraping completed successfully")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Stanford dining hall menus without a browser")
+    parser.add_argument('--base-url', default=url, help="menu page to scrape")
+    parser.add_argument('--max-age', type=float, default=DEFAULT_MAX_AGE_HOURS, help="refetch menus after today once they are older than this many hours")
+    args = parser.parse_args()
+
+    main(base_url=args.base_url, max_age_hours=args.max_age)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Manifest of every scraped menu, kept next to the CSV files
+MANIFEST_PATH = os.path.join('..', 'data', 'manifest.json')
+
+# Menus finished by a scrape that hasn't completed yet
+JOURNAL_PATH = os.path.join('..', 'data', 'scrape_journal.jsonl')
+
+# Menus after today are only refetched once they are older than this
+DEFAULT_MAX_AGE_HOURS = 12
+
+# Worker browsers record menus from several threads at once
+_manifest_lock = threading.Lock()
+
+def manifest_key(date, hall, meal):
+    """
+    Build the manifest key for a (date, hall, meal) combination
+    """
+    return f"{date}|{hall}|{meal}"
+
+def hash_content(content):
+    """
+    Hash the contents of a menu CSV file
+    """
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Load the manifest, or start a new one if it doesn't exist yet
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {'last_changed': None, 'menus': {}}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """
+    Save the manifest, replacing the previous copy in one step
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with _manifest_lock:
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+
+def is_fresh(manifest, date, hall, meal, today, max_age_hours=DEFAULT_MAX_AGE_HOURS, now=None):
+    """
+    Check whether a menu was fetched recently enough to skip it this run.
+    Today's menus are always refetched.
+    """
+    if date == today:
+        return False
+
+    entry = manifest['menus'].get(manifest_key(date, hall, meal))
+    if entry is None or not os.path.exists(entry['path']):
+        return False
+
+    now = time.time() if now is None else now
+    return now - entry['fetched_at'] < max_age_hours * 3600
+
+def _entry_changed(entry, path, content_hash):
+    return entry is None or entry['hash'] != content_hash or not os.path.exists(path)
+
+def menu_changed(manifest, date, hall, meal, path, content_hash):
+    """
+    Return whether a fetched menu differs from the recorded one, without recording it
+    """
+    with _manifest_lock:
+        return _entry_changed(manifest['menus'].get(manifest_key(date, hall, meal)), path, content_hash)
+
+def record_menu(manifest, date, hall, meal, path, content_hash, now=None, changed=None):
+    """
+    Record a fetched menu and return whether its contents changed. Call it
+    once the menu's file is written, so a failed write is never recorded, and
+    pass the menu_changed result from before the write as changed.
+    """
+    now = time.time() if now is None else now
+    key = manifest_key(date, hall, meal)
+
+    with _manifest_lock:
+        entry = manifest['menus'].get(key)
+        if changed is None:
+            changed = _entry_changed(entry, path, content_hash)
+        manifest['menus'][key] = {
+            'hash': content_hash,
+            'path': path,
+            'fetched_at': now,
+            'changed_at': now if changed else entry['changed_at'],
+        }
+        if changed:
+            manifest['last_changed'] = now
+
+    return changed
+
+def prune_date(manifest, date, now=None):
+    """
+    Drop the entries of a date whose data folder was removed
+    """
+    now = time.time() if now is None else now
+    prefix = f"{date}|"
+
+    with _manifest_lock:
+        removed = [key for key in manifest['menus'] if key.startswith(prefix)]
+        for key in removed:
+            del manifest['menus'][key]
+        if removed:
+            manifest['last_changed'] = now
+
+    return len(removed)
+
+def changed_since(manifest_path, timestamp):
+    """
+    Check whether any menu changed after the given time. Without a
+    manifest there is no way to tell, so assume something did.
+    """
+    if not os.path.exists(manifest_path):
+        return True
+
+    last_changed = load_manifest(manifest_path).get('last_changed')
+    return last_changed is None or last_changed > timestamp
+
+class ScrapeJournal:
+    """
+    Append-only log of the menus finished so far in a scrape, one JSON line
+    each, written to disk as soon as a menu is saved. The manifest is only
+    saved at the end of a run, so if the run dies partway the next one
+    replays the journal into the manifest and skips the menus it lists.
+    The journal is removed once a run finishes every menu.
+
+    Lines from an earlier day are ignored, since today's menus are always refetched.
+    """
+    def __init__(self, day, path=JOURNAL_PATH):
+        self.day = day
+        self.path = path
+        self.done = set()
+        self.file = None
+        self.lock = threading.Lock()
+
+    def resume(self, manifest):
+        """
+        Replay the journal of an unfinished run into the manifest and return how many menus it lists
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                lines = file.readlines()
+        except OSError:
+            return 0
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:  # The last line of a run that died while writing it
+                continue
+            if record['day'] != self.day:
+                continue
+            entry = record['entry']
+            with _manifest_lock:
+                manifest['menus'][record['key']] = entry
+                if entry['changed_at'] == entry['fetched_at'] and (manifest['last_changed'] or 0) < entry['changed_at']:
+                    manifest['last_changed'] = entry['changed_at']
+            self.done.add(record['key'])
+        return len(self.done)
+
+    def is_done(self, date, hall, meal):
+        return manifest_key(date, hall, meal) in self.done
+
+    def record(self, manifest, date, hall, meal):
+        """
+        Log a menu whose CSV file has been written, along with its manifest entry
+        """
+        key = manifest_key(date, hall, meal)
+        with _manifest_lock:
+            entry = dict(manifest['menus'][key])
+        line = json.dumps({'day': self.day, 'key': key, 'entry': entry}, sort_keys=True)
+
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(line + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.done.add(key)
+
+    def close(self, finished):
+        """
+        Close the journal, removing it if the run finished every menu
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if finished and os.path.exists(self.path):
+                os.remove(self.path)
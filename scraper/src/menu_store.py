@@ -0,0 +1,348 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import metrics
+
+# Kept next to the date folders, so it outlives the CSV files cleanup_old_data removes
+STORE_FILENAME = 'menu_history.sqlite'
+
+# Bump whenever the schema changes; older databases are rebuilt from scratch
+SCHEMA_VERSION = 1
+
+# Menus written per transaction
+BATCH_SIZE = 500
+
+# Name tables, one row per distinct name
+NAME_TABLES = ('locations', 'meals', 'dishes', 'ingredients', 'allergens')
+
+# The date and location of a menu are copied onto its servings and ingredient
+# and allergen rows, so a frequency query over a date range is answered from
+# one index instead of walking every menu in the history
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS meals (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS dishes (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS ingredients (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS allergens (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+
+CREATE TABLE IF NOT EXISTS menus (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    location_id INTEGER NOT NULL REFERENCES locations(id),
+    meal_id INTEGER NOT NULL REFERENCES meals(id),
+    digest TEXT NOT NULL,
+    UNIQUE (location_id, date, meal_id)
+);
+CREATE INDEX IF NOT EXISTS menus_by_date ON menus (date);
+
+CREATE TABLE IF NOT EXISTS servings (
+    menu_id INTEGER NOT NULL REFERENCES menus(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    dish_id INTEGER NOT NULL REFERENCES dishes(id),
+    location_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (menu_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS servings_by_dish ON servings (dish_id, location_id, date);
+CREATE INDEX IF NOT EXISTS servings_by_dish_date ON servings (dish_id, date);
+
+CREATE TABLE IF NOT EXISTS serving_ingredients (
+    menu_id INTEGER NOT NULL REFERENCES menus(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    ingredient_id INTEGER NOT NULL REFERENCES ingredients(id),
+    date TEXT NOT NULL,
+    PRIMARY KEY (menu_id, position, ingredient_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS serving_ingredients_by_ingredient ON serving_ingredients (ingredient_id, date);
+
+CREATE TABLE IF NOT EXISTS serving_allergens (
+    menu_id INTEGER NOT NULL REFERENCES menus(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    allergen_id INTEGER NOT NULL REFERENCES allergens(id),
+    date TEXT NOT NULL,
+    PRIMARY KEY (menu_id, position, allergen_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS serving_allergens_by_allergen ON serving_allergens (allergen_id, date);
+"""
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    # WAL lets queries read the history while the pipeline writes to it
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.execute('PRAGMA foreign_keys = ON')
+    return connection
+
+def get_store_path():
+    # Next to the menu CSV files and the manifest
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, '..', 'data', STORE_FILENAME)
+
+def has_menus(path):
+    """
+    Check whether the history database at path exists and holds any menu
+    """
+    if not os.path.exists(path):
+        return False
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return connection.execute('SELECT 1 FROM menus LIMIT 1').fetchone() is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        connection.close()
+
+def iso_date(menu_date):
+    """
+    Convert a menu date (MM-DD-YYYY) to ISO format, which sorts and compares as text
+    """
+    return datetime.strptime(menu_date, '%m-%d-%Y').date().isoformat()
+
+def menu_digest(dishes):
+    """
+    Hash a menu's normalized dishes, to tell whether a stored copy is out of date
+    """
+    return hashlib.sha256(json.dumps(dishes, sort_keys=True).encode('utf-8')).hexdigest()
+
+def date_range(days, today=None):
+    """
+    The first and last ISO dates of the last `days` days, today included
+    """
+    if today is None:
+        # Menu dates are in the dining halls' time zone. Imported here so that
+        # writing the history, which processing does, doesn't need pytz.
+        from pytz import timezone
+        today = datetime.now(timezone('America/Los_Angeles')).date()
+    return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+
+class MenuStore:
+    """
+    SQLite history of every menu that was processed, kept after the CSV files
+    of past days are deleted. Menus are written in batches with executemany,
+    and a menu whose dishes haven't changed since it was stored is skipped.
+    """
+    def __init__(self, path=None):
+        self.path = path or get_store_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = connect(self.path)
+        self.create_schema()
+        self.name_ids = {table: None for table in NAME_TABLES}
+        self.pending = []
+
+    def create_schema(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            print(f"Menu history in {self.path} has schema version {version}, starting a new one")
+            self.connection.close()
+            os.remove(self.path)
+            self.connection = connect(self.path)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def ids(self, table, names):
+        """
+        Look up the ids of names in one of the name tables, adding the ones it lacks
+        """
+        known = self.name_ids[table]
+        if known is None:
+            rows = self.connection.execute(f'SELECT name, id FROM {table}')
+            known = self.name_ids[table] = dict(rows)
+        missing = sorted({name for name in names if name not in known})
+        if missing:
+            self.connection.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', [(name,) for name in missing])
+            for name in missing:
+                known[name] = self.connection.execute(f'SELECT id FROM {table} WHERE name = ?', (name,)).fetchone()[0]
+        return [known[name] for name in names]
+
+    def add_menu(self, dishes):
+        """
+        Queue one menu's normalized dishes, as returned by process_csv, to be stored
+        """
+        if dishes and dishes[0]['date'] and dishes[0]['location']:
+            self.pending.append(dishes)
+            if len(self.pending) >= BATCH_SIZE:
+                self.flush()
+
+    def flush(self):
+        """
+        Write the queued menus in one transaction
+        """
+        menus, self.pending = self.pending, []
+        if not menus:
+            return
+
+        try:
+            self.write_menus(menus)
+        except BaseException:
+            # Ids added in the rolled back transaction no longer exist
+            self.name_ids = {table: None for table in NAME_TABLES}
+            raise
+
+    def write_menus(self, menus):
+        servings = []
+        serving_ingredients = []
+        serving_allergens = []
+        with self.connection:
+            for dishes in menus:
+                first = dishes[0]
+                menu_date = iso_date(first['date'])
+                location_id, = self.ids('locations', [first['location']])
+                meal_id, = self.ids('meals', [first['meal_time']])
+                digest = menu_digest(dishes)
+
+                row = self.connection.execute(
+                    'SELECT id, digest FROM menus WHERE location_id = ? AND date = ? AND meal_id = ?',
+                    (location_id, menu_date, meal_id),
+                ).fetchone()
+                if row is not None and row[1] == digest:
+                    continue
+                if row is not None:
+                    # The servings go with it
+                    self.connection.execute('DELETE FROM menus WHERE id = ?', (row[0],))
+                menu_id = self.connection.execute(
+                    'INSERT INTO menus (date, location_id, meal_id, digest) VALUES (?, ?, ?, ?)',
+                    (menu_date, location_id, meal_id, digest),
+                ).lastrowid
+                metrics.increment('history_menus_stored')
+
+                # Placeholder dishes stand in for empty menus and aren't servings
+                served = [dish for dish in dishes if dish['name']]
+                dish_ids = self.ids('dishes', [dish['name'] for dish in served])
+                for position, (dish, dish_id) in enumerate(zip(served, dish_ids)):
+                    servings.append((menu_id, position, dish_id, location_id, menu_date))
+                    for ingredient_id in set(self.ids('ingredients', dish['ingredients'])):
+                        serving_ingredients.append((menu_id, position, ingredient_id, menu_date))
+                    for allergen_id in set(self.ids('allergens', dish['allergens'])):
+                        serving_allergens.append((menu_id, position, allergen_id, menu_date))
+
+            self.connection.executemany(
+                'INSERT INTO servings (menu_id, position, dish_id, location_id, date) VALUES (?, ?, ?, ?, ?)', servings
+            )
+            self.connection.executemany(
+                'INSERT INTO serving_ingredients (menu_id, position, ingredient_id, date) VALUES (?, ?, ?, ?)', serving_ingredients
+            )
+            self.connection.executemany(
+                'INSERT INTO serving_allergens (menu_id, position, allergen_id, date) VALUES (?, ?, ?, ?)', serving_allergens
+            )
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.pending = []
+            self.connection.close()
+
+    def name_id(self, table, name):
+        """
+        Id of a name in one of the name tables, ignoring case, so that "vegan"
+        finds "Vegan". A name stored in exactly that case is preferred.
+        """
+        row = self.connection.execute(
+            f'SELECT id FROM {table} WHERE name = ? COLLATE NOCASE ORDER BY name = ? DESC LIMIT 1', (name, name)
+        ).fetchone()
+        return row[0] if row else None
+
+    def dish_frequency(self, dish, location=None, days=90, today=None):
+        """
+        How many times a dish was served in the last `days` days, at one location or anywhere
+        """
+        start, end = date_range(days, today)
+        dish_id = self.name_id('dishes', dish)
+        if dish_id is None:
+            return 0
+        if location is None:
+            query = 'SELECT COUNT(*) FROM servings WHERE dish_id = ? AND date BETWEEN ? AND ?'
+            params = (dish_id, start, end)
+        else:
+            location_id = self.name_id('locations', location)
+            if location_id is None:
+                return 0
+            query = 'SELECT COUNT(*) FROM servings WHERE dish_id = ? AND location_id = ? AND date BETWEEN ? AND ?'
+            params = (dish_id, location_id, start, end)
+        return self.connection.execute(query, params).fetchone()[0]
+
+    def dish_dates(self, dish, location=None, days=90, today=None):
+        """
+        The (date, location, meal) of every time a dish was served in the last `days` days
+        """
+        start, end = date_range(days, today)
+        dish_id = self.name_id('dishes', dish)
+        if dish_id is None:
+            return []
+        query = """
+            SELECT servings.date, locations.name, meals.name
+            FROM servings
+            JOIN menus ON menus.id = servings.menu_id
+            JOIN locations ON locations.id = servings.location_id
+            JOIN meals ON meals.id = menus.meal_id
+            WHERE servings.dish_id = ?
+              AND servings.date BETWEEN ? AND ?
+        """
+        params = [dish_id, start, end]
+        if location is not None:
+            location_id = self.name_id('locations', location)
+            if location_id is None:
+                return []
+            query += ' AND servings.location_id = ?'
+            params.append(location_id)
+        query += ' ORDER BY servings.date, locations.name, meals.name'
+        return self.connection.execute(query, params).fetchall()
+
+    def dishes_containing(self, kind, name, days=90, today=None, limit=20):
+        """
+        The dishes served with an ingredient or allergen in the last `days` days,
+        most frequent first, as (dish, times served) pairs
+        """
+        table, column = {
+            'ingredient': ('serving_ingredients', 'ingredient_id'),
+            'allergen': ('serving_allergens', 'allergen_id'),
+        }[kind]
+        name_id = self.name_id(f'{kind}s', name)
+        if name_id is None:
+            return []
+        start, end = date_range(days, today)
+        query = f"""
+            SELECT dishes.name, COUNT(*) AS served
+            FROM {table} AS tagged
+            JOIN servings ON servings.menu_id = tagged.menu_id AND servings.position = tagged.position
+            JOIN dishes ON dishes.id = servings.dish_id
+            WHERE tagged.{column} = ? AND tagged.date BETWEEN ? AND ?
+            GROUP BY dishes.name
+            ORDER BY served DESC, dishes.name
+            LIMIT ?
+        """
+        return self.connection.execute(query, (name_id, start, end, limit)).fetchall()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the menu history database. Names are matched ignoring case, so --allergen vegan finds Vegan.")
+    parser.add_argument('--db', default=get_store_path(), help="menu history database to query")
+    parser.add_argument('--days', type=int, default=90, help="how many days back to look, today included")
+    parser.add_argument('--location', help="only count menus at this dining hall (with --dish)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--dish', help="how often and when this dish was served")
+    group.add_argument('--ingredient', help="the dishes served with this ingredient")
+    group.add_argument('--allergen', help="the dishes served with this allergen")
+    args = parser.parse_args()
+
+    with MenuStore(args.db) as store:
+        if args.dish:
+            count = store.dish_frequency(args.dish, args.location, args.days)
+            print(f"{args.dish} was served {count} time(s) in the last {args.days} days")
+            for served_date, location, meal in store.dish_dates(args.dish, args.location, args.days):
+                print(f"  {served_date}  {location}  {meal}")
+        else:
+            kind = 'ingredient' if args.ingredient else 'allergen'
+            for dish, served in store.dishes_containing(kind, args.ingredient or args.allergen, args.days):
+                print(f"{served:5d}  {dish}")
@@ -0,0 +1,163 @@
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Default folder for per-run metrics files
+METRICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'metrics')
+
+# Counters are bumped from scraper threads, so guard them with a lock
+_counters_lock = threading.Lock()
+_counters = {}
+
+def increment(name, amount=1, key=None):
+    """
+    Add to a named counter, optionally broken down by key (e.g. date|hall|meal)
+    """
+    with _counters_lock:
+        counter = _counters.setdefault(name, {'total': 0, 'by_key': {}})
+        counter['total'] += amount
+        if key is not None:
+            counter['by_key'][key] = counter['by_key'].get(key, 0) + amount
+
+def set_value(name, value):
+    """
+    Record a single value, such as cache statistics, replacing any earlier one
+    """
+    with _counters_lock:
+        _counters[name] = {'total': value, 'by_key': {}}
+
+def snapshot_counters():
+    with _counters_lock:
+        return json.loads(json.dumps(_counters))
+
+def reset_counters():
+    with _counters_lock:
+        _counters.clear()
+
+def merge_counters(counters):
+    """
+    Fold in counters collected elsewhere, e.g. in a worker process
+    """
+    for name, counter in counters.items():
+        increment(name, counter['total'])
+        for key, amount in counter['by_key'].items():
+            with _counters_lock:
+                by_key = _counters[name]['by_key']
+                by_key[key] = by_key.get(key, 0) + amount
+
+def max_rss_kb():
+    """
+    Peak resident memory of the process so far, over its whole life
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if os.uname().sysname == 'Darwin' else rss
+
+def current_rss_kb():
+    """
+    Resident memory of the process right now, where /proc provides it
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+def children_cpu_seconds():
+    """
+    CPU time of the child processes that have exited and been waited for,
+    such as the workers of a ProcessPoolExecutor once it has shut down
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def difference(end, start):
+    return None if end is None or start is None else end - start
+
+class PipelineMetrics:
+    """
+    Collects wall time, CPU time and memory per pipeline stage, plus the
+    counters bumped while each stage ran, and writes them to a JSON file.
+    One stage can also be run under cProfile.
+
+    The peak RSS of a process only ever goes up, so a stage records how much
+    it raised the peak and how much the RSS grew while it ran, and the
+    process peak is saved once for the whole run. Worker processes' CPU time
+    is counted separately, for the workers that exited during the stage.
+    """
+    def __init__(self, metrics_dir=METRICS_DIR, profile_stage=None, trace_memory=False):
+        self.metrics_dir = metrics_dir
+        self.profile_stage = profile_stage
+        self.trace_memory = trace_memory
+        self.run_id = time.strftime('%Y%m%d-%H%M%S')
+        self.started = time.time()
+        self.stages = {}
+        self.profile_path = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        reset_counters()
+        if self.trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        children_cpu_start = children_cpu_seconds()
+        rss_start = current_rss_kb()
+        peak_rss_start = max_rss_kb()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            result = {
+                'wall_seconds': time.perf_counter() - wall_start,
+                'cpu_seconds': time.process_time() - cpu_start,
+                'children_cpu_seconds': difference(children_cpu_seconds(), children_cpu_start),
+                'rss_growth_kb': difference(current_rss_kb(), rss_start),
+                'peak_rss_growth_kb': difference(max_rss_kb(), peak_rss_start),
+                'counters': snapshot_counters(),
+            }
+            if self.trace_memory:
+                result['python_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if profiler is not None:
+                os.makedirs(self.metrics_dir, exist_ok=True)
+                self.profile_path = os.path.join(self.metrics_dir, f'run-{self.run_id}-{name}.prof')
+                profiler.dump_stats(self.profile_path)
+                result['profile'] = self.profile_path
+            self.stages[name] = result
+            cpu = f"{result['cpu_seconds']:.2f}s CPU"
+            if result['children_cpu_seconds']:
+                cpu += f" + {result['children_cpu_seconds']:.2f}s in workers"
+            print(f"[{name}] {result['wall_seconds']:.2f}s wall, {cpu}")
+
+    def save(self, succeeded=True):
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, f'run-{self.run_id}.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({
+                'run_id': self.run_id,
+                'started': self.started,
+                'succeeded': succeeded,
+                'max_rss_kb': max_rss_kb(),
+                'stages': self.stages,
+            }, file, indent=2)
+        return path
@@ -0,0 +1,224 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+
+# Version of the search index layout, stored in the file
+SEARCH_INDEX_VERSION = 1
+
+SEARCH_INDEX_FILENAME = 'search_index.json'
+
+# Filters that get a search index
+SEARCH_FACETS = ['dishes', 'ingredients']
+
+# Word prefixes are indexed up to this many characters. Longer query words
+# start from the list for their first PREFIX_LENGTH characters and check the rest.
+PREFIX_LENGTH = 3
+
+# Share of trigrams (Dice coefficient) a word needs with a query word to count as a fuzzy match
+TRIGRAM_THRESHOLD = 0.4
+
+def fold(text):
+    """
+    Lowercase words of a name without accents or punctuation, e.g. "Crème Brûlée!" -> ['creme', 'brulee']
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+def trigrams(word):
+    """
+    Trigrams of a word padded as '  word ', so short words and word starts count
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_search_facet(entries):
+    """
+    Build the index of one filter from its (name, count) pairs. Names are
+    ranked by count, most common first, and a name's id is its rank, so every
+    list of name ids is sorted best match first.
+
+    Names share far fewer distinct words than there are names, so both tables
+    point at words: the prefix table maps word prefixes to words, and the
+    trigram posting lists map trigrams to words. Each word then lists the
+    names it appears in.
+    """
+    ranked = sorted(entries, key=lambda entry: (-entry[1], entry[0]))
+    word_ids = {}
+    word_names = []
+    for name_id, (name, count) in enumerate(ranked):
+        for word in dict.fromkeys(fold(name)):
+            if word not in word_ids:
+                word_ids[word] = len(word_names)
+                word_names.append([])
+            word_names[word_ids[word]].append(name_id)
+
+    prefixes = {}
+    postings = {}
+    for word, word_id in word_ids.items():
+        for length in range(1, min(len(word), PREFIX_LENGTH) + 1):
+            prefixes.setdefault(word[:length], []).append(word_id)
+        # Sorted, since set order changes with the hash seed and the file has to be byte-for-byte reproducible
+        for gram in sorted(trigrams(word)):
+            postings.setdefault(gram, []).append(word_id)
+    return {
+        'names': [name for name, count in ranked],
+        'counts': [count for name, count in ranked],
+        'prefixes': prefixes,
+        'words': list(word_ids),
+        'word_names': word_names,
+        'trigrams': postings,
+    }
+
+def build_search_index(facets):
+    """
+    Build the search index from {filter name: [(name, count), ...]}
+    """
+    return {
+        'version': SEARCH_INDEX_VERSION,
+        'facets': {facet: build_search_facet(entries) for facet, entries in facets.items()},
+    }
+
+class SearchFacet:
+    def __init__(self, data):
+        self.names = data['names']
+        self.counts = data['counts']
+        self.prefixes = data['prefixes']
+        self.vocabulary = data['words']
+        self.word_names = data['word_names']
+        self.trigrams = data['trigrams']
+        self.trigram_counts = [len(trigrams(word)) for word in self.vocabulary]
+        # The words of every name, so candidates can be checked against the other
+        # query words without expanding the name lists of those words
+        self.name_words = [[] for name in self.names]
+        for word_id, name_ids in enumerate(self.word_names):
+            for name_id in name_ids:
+                self.name_words[name_id].append(word_id)
+
+    def words_starting(self, word):
+        return {word_id for word_id in self.prefixes.get(word[:PREFIX_LENGTH], ()) if self.vocabulary[word_id].startswith(word)}
+
+    def names_with(self, word_scores):
+        # {name id: best score} over the names containing any of the scored words
+        names = {}
+        for word_id, score in word_scores.items():
+            for name_id in self.word_names[word_id]:
+                if score > names.get(name_id, 0):
+                    names[name_id] = score
+        return names
+
+    def posting_size(self, word_ids):
+        return sum(len(self.word_names[word_id]) for word_id in word_ids)
+
+    def prefix_matches(self, words, limit):
+        # Every query word has to start some word of the name. Names are taken in
+        # rank order from the query word with the fewest, and checked against the
+        # words the other query words start.
+        first, *rest = sorted((self.words_starting(word) for word in words), key=self.posting_size)
+        matches = []
+        previous = None
+        for name_id in heapq.merge(*(self.word_names[word_id] for word_id in first)):
+            if name_id == previous:
+                continue
+            previous = name_id
+            name_words = self.name_words[name_id]
+            if all(not word_ids.isdisjoint(name_words) for word_ids in rest):
+                matches.append(name_id)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def similar_words(self, word):
+        # {word id: similarity} of the words sharing enough trigrams with word
+        query_grams = trigrams(word)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.trigrams.get(gram, ()))
+        similar = {}
+        for word_id, common in shared.items():
+            score = 2 * common / (len(query_grams) + self.trigram_counts[word_id])
+            # A word being typed still matches the words it starts
+            if self.vocabulary[word_id].startswith(word):
+                score = 1.0
+            if score >= TRIGRAM_THRESHOLD:
+                similar[word_id] = score
+        return similar
+
+    def fuzzy_matches(self, words, limit, exclude):
+        # A name scores the total, over the query words, of its closest word's similarity,
+        # and every query word has to match some word of the name. The names of the
+        # most selective word are the candidates, scored against their own words.
+        first, *rest = sorted((self.similar_words(word) for word in words), key=self.posting_size)
+        scores = self.names_with(first)
+        for word_scores in rest:
+            if self.posting_size(word_scores) <= len(scores):
+                # Few enough names to expand and join
+                names = self.names_with(word_scores)
+                scores = {name_id: total + names[name_id] for name_id, total in scores.items() if name_id in names}
+            else:
+                narrowed = {}
+                for name_id, total in scores.items():
+                    best = 0
+                    for word_id in self.name_words[name_id]:
+                        score = word_scores.get(word_id)
+                        if score is not None and score > best:
+                            best = score
+                    if best:
+                        narrowed[name_id] = total + best
+                scores = narrowed
+            if not scores:
+                return []
+        scored = sorted((-total, name_id) for name_id, total in scores.items() if name_id not in exclude)
+        return [name_id for total, name_id in scored[:limit]]
+
+    def search(self, query, limit=10):
+        """
+        Up to limit (name, count) pairs matching query. Names whose words start
+        with the query's words come first, by count; if there are too few, names
+        sharing enough trigrams with the query follow, so typos still match.
+        """
+        words = fold(query)
+        if not words:
+            return []
+        matches = self.prefix_matches(words, limit)
+        if len(matches) < limit and sum(map(len, words)) >= PREFIX_LENGTH:
+            matches += self.fuzzy_matches(words, limit - len(matches), set(matches))
+        return [(self.names[name_id], self.counts[name_id]) for name_id in matches]
+
+class NameSearch:
+    """
+    Typeahead over the dish and ingredient filters, from search_index.json
+    """
+    def __init__(self, data):
+        if data.get('version') != SEARCH_INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version: {data.get('version')}")
+        self.facets = {facet: SearchFacet(facet_data) for facet, facet_data in data['facets'].items()}
+
+    def search(self, facet, query, limit=10):
+        return self.facets[facet].search(query, limit)
+
+def load_search_index(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return NameSearch(json.load(file))
+
+if __name__ == '__main__':
+    from create_filters import get_data_directory
+
+    parser = argparse.ArgumentParser(description="Search the dish or ingredient names in search_index.json")
+    parser.add_argument('query', help="text to search for, e.g. 'chick' or 'chiken'")
+    parser.add_argument('--facet', choices=SEARCH_FACETS, default='dishes', help="names to search")
+    parser.add_argument('--limit', type=int, default=10, help="number of matches to show")
+    args = parser.parse_args()
+
+    index = load_search_index(os.path.join(get_data_directory(), SEARCH_INDEX_FILENAME))
+    start = time.perf_counter()
+    results = index.search(args.facet, args.query, args.limit)
+    elapsed = time.perf_counter() - start
+    for name, count in results:
+        print(f"{count:6d}  {name}")
+    print(f"{len(results)} match(es) in {elapsed * 1000:.3f} ms")
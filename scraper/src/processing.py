@@ -1,10 +1,26 @@
+import argparse
+import contextlib
 import csv
 import json
 import os
 import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
 import unicodedata
 
+import canonicalize
+from canonicalize import SPECIAL_MESSAGE
+from compact_format import compact_file, encode_dishes, save_compact_json
+from dish_store import DishStoreBuilder, save_dish_store, store_file
+from dish_stream import DishArrayWriter
+from manifest import changed_since
+from menu_store import MenuStore, get_store_path, has_menus
+from shards import SHARD_KEYS, SHARD_MANIFEST_FILENAME, ShardWriter, load_shard_manifest
+import metrics
+
 def normalize_text(text):
     # Normalize Unicode characters
     text = unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
@@ -55,56 +71,12 @@ def title_case(text):
     
     return ''.join(result)
 
-def split_joined_words(text):
-    # List of misspelled word pairs
-    word_pairs = [
-        ('Cumin', 'seed'),
-        ('Olive', 'oil'),
-        ('Vegetable', 'oil'),
-        ('Soy', 'sauce'),
-        ('Garlic', 'powder'),
-        ('Onion', 'powder'),
-    ]
-    
-    for first, second in word_pairs:
-        pattern = f'({first}{second})'
-        replacement = f'{first} {second}'
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-    
-    return text
+# Number of distinct raw ingredient strings to keep normalized results for
+NORMALIZATION_CACHE_SIZE = 16384
 
-def replace_ingredient_words(ingredient):
-    replacements = {
-        "Mindful Chick'N" : "Chicken",
-        "Artificial Flavor" : "Artificial Flavors",
-        "Bell Pepper" : "Bell Peppers",
-        "Cumin Seed" : "Cumin Seeds",
-        "Flaxseed" : "Flax Seeds",
-        "Green Onion" : "Green Onions",
-        "Mustard Seed" : "Mustard Seeds",
-        "Natural Flavor" : "Natural Flavors",
-        "Natural Flavorings" : "Natural Flavors",
-        "Olive Canola Oil" : "Canola Olive Oil",
-        "Onion" : "Onions",
-        "Palm Fruit Oil" : "Palm Oil",
-        "Radishes" : "Radish",
-        "Red Pepper Flake" : "Red Pepper Flakes",
-        "Strawberry" : "Strawberries",
-        "Tomato" : "Tomatoes",
-        "Tortilla" : "Tortillas",
-        "Onions Powder" : "Onion Powder",
-        "Pineapple" : "Pineapples",
-        "Caulfilower" : "Cauliflower", 
-    }
-    
-    for old, new in replacements.items():
-        ingredient = re.sub(r'\b' + re.escape(old) + r'\b', new, ingredient, flags=re.IGNORECASE)
-    
-    return ingredient
-
-def normalize_ingredient(ingredient):
-    special_message = "Please refer to dining hall chef or manager for ingredient and allergen information"
-    if ingredient.strip() == special_message:
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def clean_ingredient(ingredient):
+    if ingredient.strip() == SPECIAL_MESSAGE:
         return ingredient
     
     # Account for missing parenthesis
@@ -114,14 +86,62 @@ def normalize_ingredient(ingredient):
     # Normalize text
     ingredient = normalize_text(ingredient)
     
-    # Split incorrectly joined words
-    ingredient = split_joined_words(ingredient)
-    
-    # Replace specific ingredient words
-    ingredient = replace_ingredient_words(ingredient)
-    
     return title_case(ingredient)
 
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_ingredient(ingredient):
+    # Spelling variants, plurals and near-duplicates are all resolved through the canonical table
+    return get_canonical_table().canonical_name(clean_ingredient(ingredient))
+
+_canonical_table = None
+
+def get_canonical_table():
+    global _canonical_table
+    if _canonical_table is None:
+        _canonical_table = canonicalize.CanonicalTable(canonicalize.seed_table())
+    return _canonical_table
+
+def use_canonical_table(data):
+    # Switch normalization over to a table, dropping results cached under the old one
+    global _canonical_table
+    _canonical_table = canonicalize.CanonicalTable(data)
+    normalize_ingredient.cache_clear()
+    normalize_dish.cache_clear()
+
+def collect_ingredient_names(file_paths):
+    # Count the cleaned ingredient names across CSV files, before canonicalization
+    name_counts = Counter()
+    for file_path in file_paths:
+        with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 3:
+                    name_counts.update(
+                        clean_ingredient(i.strip()) for i in split_ingredients(normalize_text(row[1])) if i.strip()
+                    )
+    return name_counts
+
+def load_canonical_table(base_dir, file_paths=None):
+    # Use the canonical table saved with the menus, building it from them the first time
+    table_path = os.path.join(base_dir, canonicalize.TABLE_FILENAME)
+    data = canonicalize.load_table(table_path)
+    if data is None:
+        file_paths = find_csv_files(base_dir) if file_paths is None else file_paths
+        data = canonicalize.build_table(collect_ingredient_names(file_paths))
+        canonicalize.save_table(data, table_path)
+        print(f"Built canonical ingredient table with {len(data['names'])} names: {table_path}")
+    use_canonical_table(data)
+    return data
+
+def normalization_cache_info():
+    # Hit/miss statistics of the normalize_ingredient cache
+    return normalize_ingredient.cache_info()
+
+def dish_cache_info():
+    # Hit/miss statistics of the normalize_dish cache
+    return normalize_dish.cache_info()
+
 def parse_filename(filename):
     # Extract location, date, and meal time from filename
     pattern = r'(.+)_(\d{1,2}-\d{1,2}-\d{4})_(.+)\.csv'
@@ -164,11 +184,67 @@ def split_ingredients(ingredient_list):
 
     return ingredients
 
+# Number of distinct raw dishes to keep normalized results for
+DISH_NORMALIZATION_CACHE_SIZE = 16384
+
+@lru_cache(maxsize=DISH_NORMALIZATION_CACHE_SIZE)
+def normalize_dish(dish_name, ingredient_list, allergen_list):
+    # The same dish is listed at many halls on many days. Its raw (name, ingredients,
+    # allergens) triple is the cache key, so each distinct dish is split and normalized once.
+    ingredients = tuple(normalize_ingredient(i.strip()) for i in split_ingredients(ingredient_list) if i.strip())
+
+    # Allergens keep their spelling so they match the app's allergen list
+    allergens = tuple(clean_ingredient(a.strip()) for a in re.split(r',\s*', allergen_list) if a.strip())
+
+    return dish_name.strip(), ingredients, allergens
+
+def placeholder_dish(location, date, meal_time):
+    # Stands in for a menu without any dishes so its location and meal time are still known
+    return {
+        "name": "",
+        "ingredients": [],
+        "allergens": [],
+        "meal_time": meal_time,
+        "date": date,
+        "location": location
+    }
+
+def process_rows(rows, location, date, meal_time, source):
+    # Normalize the data rows of one menu into dishes
+    dishes = []
+
+    row_count = 0
+    for row in rows:
+        row_count += 1
+        # Ensure at least 3 columns
+        if len(row) < 3:
+            print(f"Warning: Row with insufficient data in {source}: {row}")
+            metrics.increment('csv_warnings')
+            continue
+
+        dish_name, ingredients, allergens = normalize_dish(*map(normalize_text, row[:3]))
+
+        dishes.append({
+            "name": dish_name,
+            "ingredients": list(ingredients),
+            "allergens": list(allergens),
+            "meal_time": meal_time,
+            "date": date,
+            "location": location
+        })
+
+    metrics.increment('csv_rows', row_count)
+    if row_count == 0:
+        print(f"Warning: No data rows found in {source}")
+        metrics.increment('csv_warnings')
+        # Create placeholder dish
+        dishes.append(placeholder_dish(location, date, meal_time))
+
+    return dishes
+
 def process_csv(file_path):
     filename = os.path.basename(file_path)
     location, date, meal_time = parse_filename(filename)
-    
-    dishes = []
 
     try:
         with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
@@ -178,102 +254,339 @@ def process_csv(file_path):
             header = next(reader, None)
             if not header:
                 print(f"Warning: Empty file or missing header in {file_path}")
+                metrics.increment('csv_warnings')
                 # Create a placeholder dish for empty files
-                dishes.append({
-                    "name": "",
-                    "ingredients": [],
-                    "allergens": [],
-                    "meal_time": meal_time,
-                    "date": date,
-                    "location": location
-                })
-                return dishes
-
-            row_count = 0
-            for row in reader:
-                row_count += 1
-                # Ensure at least 3 columns
-                if len(row) < 3:
-                    print(f"Warning: Row with insufficient data in {file_path}: {row}")
-                    continue
-
-                dish_name, ingredient_list, allergen_list = map(normalize_text, row[:3])
-                
-                dish_name = dish_name.strip()
-                
-                # Processing ingredients
-                ingredients = [normalize_ingredient(i.strip()) for i in split_ingredients(ingredient_list) if i.strip()]
-                
-                # Processing allergens
-                allergens = [normalize_ingredient(a.strip()) for a in re.split(r',\s*', allergen_list) if a.strip()]
-                
-                dishes.append({
-                    "name": dish_name,
-                    "ingredients": ingredients,
-                    "allergens": allergens,
-                    "meal_time": meal_time,
-                    "date": date,
-                    "location": location
-                })
-
-            if row_count == 0:
-                print(f"Warning: No data rows found in {file_path}")
-                # Create placeholder dish
-                dishes.append({
-                    "name": "",
-                    "ingredients": [],
-                    "allergens": [],
-                    "meal_time": meal_time,
-                    "date": date,
-                    "location": location
-                })
+                return [placeholder_dish(location, date, meal_time)]
+
+            return process_rows(reader, location, date, meal_time, file_path)
 
     except Exception as e:
         print(f"Error processing file {file_path}: {str(e)}")
+        metrics.increment('csv_errors')
         return None
 
-    return dishes
+def process_menu(csv_path, rows):
+    # Normalize a menu that is already in memory, as if it had been read back from csv_path
+    location, date, meal_time = parse_filename(os.path.basename(csv_path))
+    return process_rows(rows, location, date, meal_time, csv_path)
+
+def csv_sort_key(file_path):
+    # Order files by date, then location, then meal time
+    location, date, meal_time = parse_filename(os.path.basename(file_path))
+    parsed_date = datetime.strptime(date, "%m-%d-%Y") if date else datetime.max
+    return (parsed_date, location or '', meal_time or '', file_path)
+
+def find_csv_files(base_dir):
+    # Collect every CSV file under base_dir in a stable order
+    csv_files = []
+    for root, dirs, files in os.walk(base_dir):
+        for file in files:
+            if file.endswith('.csv'):
+                csv_files.append(os.path.join(root, file))
+    return sorted(csv_files, key=csv_sort_key)
+
+def process_csv_counted(file_path):
+    # Run in a worker process: return the dishes along with the counters they bumped
+    metrics.reset_counters()
+    return process_csv(file_path), metrics.snapshot_counters()
+
+def csv_process_pool(workers):
+    # A process pool for process_csv_files, or a stand-in for processing in this process
+    if workers <= 1:
+        return contextlib.nullcontext()
+    # Workers normalize with the same canonical table as this process
+    table_data = {'version': canonicalize.TABLE_VERSION, 'names': get_canonical_table().names}
+    return ProcessPoolExecutor(max_workers=workers, initializer=use_canonical_table, initargs=(table_data,))
 
-def save_json(data, filename):
-    with open(filename, 'w', encoding='utf-8') as jsonfile:
-        json.dump(data, jsonfile, indent=2)
+def process_csv_files(file_paths, workers=1, executor=None):
+    # Process CSV files, fanned out over a process pool when workers > 1
+    # or an executor from csv_process_pool is given.
+    # Results come back in the same order as file_paths either way.
+    if executor is None and workers > 1 and len(file_paths) > 1:
+        with csv_process_pool(workers) as executor:
+            return process_csv_files(file_paths, workers, executor)
+    if executor is None or len(file_paths) <= 1:
+        return [process_csv(file_path) for file_path in file_paths]
 
-def main():
-    # Get the current script's directory
+    results = []
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    for dishes, counters in executor.map(process_csv_counted, file_paths, chunksize=chunksize):
+        metrics.merge_counters(counters)
+        results.append(dishes)
+    return results
+
+# Each date folder keeps a cache of its normalized dishes, so deleting an
+# old date folder also evicts its cache entries
+DISH_CACHE_FILENAME = '.dishes_cache.json'
+
+# Bump whenever normalization changes so stale caches are discarded.
+# Caches built with a different canonical table are discarded too.
+DISH_CACHE_VERSION = 2
+
+def file_signature(file_path):
+    # Files are considered unchanged while their modification time and size are
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def cache_folder(file_path, base_dir):
+    # The date folder a CSV file belongs to, and its path relative to that folder
+    relative_path = os.path.relpath(file_path, base_dir)
+    parts = relative_path.split(os.sep)
+    if len(parts) == 1:
+        return base_dir, relative_path
+    return os.path.join(base_dir, parts[0]), os.path.join(*parts[1:])
+
+def load_dish_cache(folder):
+    cache_path = os.path.join(folder, DISH_CACHE_FILENAME)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('version') != DISH_CACHE_VERSION or cache.get('canonical') != get_canonical_table().digest:
+        return {}
+    return cache['files']
+
+def save_dish_cache(folder, entries):
+    cache_path = os.path.join(folder, DISH_CACHE_FILENAME)
+    temp_path = f"{cache_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump({'version': DISH_CACHE_VERSION, 'canonical': get_canonical_table().digest, 'files': entries}, cache_file)
+    os.replace(temp_path, cache_path)
+
+def iter_csv_files_cached(file_paths, base_dir, workers=1, known=None):
+    # Process CSV files, reusing the cached dishes of files that haven't changed,
+    # and yield (file_path, dishes) in the same order as file_paths.
+    # known maps file paths to dishes that were already normalized in memory.
+    # Files are handled one date folder at a time, so only one folder's dishes are held at once.
+    known = {os.path.abspath(path): dishes for path, dishes in (known or {}).items()}
+    normalized = 0
+    saved_folders = set()
+
+    with csv_process_pool(workers) as executor:
+        for folder, folder_files in groupby(file_paths, key=lambda file_path: cache_folder(file_path, base_dir)[0]):
+            folder_files = list(folder_files)
+            old_cache = load_dish_cache(folder)
+            # A folder split up by the sort order keeps the entries saved for its earlier files
+            new_cache = dict(old_cache) if folder in saved_folders else {}
+            results = {}
+            stale_files = []
+
+            for file_path in folder_files:
+                key = cache_folder(file_path, base_dir)[1]
+                signature = file_signature(file_path)
+                entry = old_cache.get(key)
+                if os.path.abspath(file_path) in known:
+                    dishes = known[os.path.abspath(file_path)]
+                    results[file_path] = dishes
+                    new_cache[key] = {'signature': signature, 'dishes': dishes}
+                elif entry is not None and entry['signature'] == signature:
+                    results[file_path] = entry['dishes']
+                    new_cache[key] = entry
+                else:
+                    stale_files.append(file_path)
+
+            for file_path, dishes in zip(stale_files, process_csv_files(stale_files, workers, executor)):
+                results[file_path] = dishes
+                if dishes is not None:
+                    new_cache[cache_folder(file_path, base_dir)[1]] = {'signature': file_signature(file_path), 'dishes': dishes}
+            normalized += len(stale_files)
+
+            # Entries of files that no longer exist are dropped along the way
+            if new_cache != old_cache:
+                save_dish_cache(folder, new_cache)
+            saved_folders.add(folder)
+
+            for file_path in folder_files:
+                yield file_path, results[file_path]
+
+    print(f"Normalized {normalized} new or changed file(s), reused {len(file_paths) - normalized} from cache")
+
+def process_csv_files_cached(file_paths, base_dir, workers=1, known=None):
+    # Like iter_csv_files_cached, but return every file's dishes in a list
+    return [dishes for file_path, dishes in iter_csv_files_cached(file_paths, base_dir, workers, known)]
+
+def get_csv_directory():
+    # Base directory for CSV files, next to the script's directory
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    
+    return os.path.join(script_dir, '..', 'data')
+
+def get_output_file():
     # Navigate up to the root of the project (where scraper and stanfood_app are)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(os.path.dirname(script_dir))
-    
-    # Set the base directory for CSV files
-    base_dir = os.path.join(script_dir, '..', 'data')
-    
-    # Set the output file path
-    output_file = os.path.join(project_root, 'stanfood_app', 'assets', 'data', 'combined_dishes.json')
+    return os.path.join(project_root, 'stanfood_app', 'assets', 'data', 'combined_dishes.json')
 
-    all_dishes = []
+# Files processing can write. 'both' stands for json and compact together.
+OUTPUT_FORMATS = ['json', 'compact', 'store']
 
-    for root, dirs, files in os.walk(base_dir):
-        for file in files:
-            if file.endswith('.csv'):
-                file_path = os.path.join(root, file)
-                dishes = process_csv(file_path)
-                
-                if dishes is not None:
-                    all_dishes.extend(dishes)
+def output_formats(output_format):
+    # Split a --format value such as 'json,store' into the formats to write
+    if output_format == 'both':
+        return {'json', 'compact'}
+    formats = set(output_format.split(','))
+    unknown = formats - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {', '.join(sorted(unknown))}")
+    return formats
+
+def output_paths(output_file, output_format='json'):
+    # Paths of the files a --format value writes
+    formats = output_formats(output_format)
+    paths = {'json': output_file, 'compact': compact_file(output_file), 'store': store_file(output_file)}
+    return [path for output, path in paths.items() if output in formats]
+
+def needs_processing(base_dir, output_file, output_format='json', shard_by=None, store_path=None):
+    # Check whether any menu changed since the files of this format were written.
+    # Files written for another format don't count, so switching formats reprocesses.
+    # With shard_by, the shards have to be there too, split the same way, and with
+    # store_path the history database has to hold the menus.
+    if store_path and not has_menus(store_path):
+        return True
+    paths = output_paths(output_file, output_format)
+    if shard_by:
+        shard_manifest = load_shard_manifest(shard_directory(output_file))
+        if shard_manifest is None or shard_manifest['shard_by'] != shard_by:
+            return True
+        paths.append(os.path.join(shard_directory(output_file), SHARD_MANIFEST_FILENAME))
+    if not all(os.path.exists(path) for path in paths):
+        return True
+    manifest_path = os.path.join(base_dir, 'manifest.json')
+    return changed_since(manifest_path, min(os.path.getmtime(path) for path in paths))
+
+def format_argument(value):
+    # argparse type for --format
+    try:
+        output_formats(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+def shard_directory(output_file):
+    # Shards are published in a folder next to the combined file
+    return os.path.join(os.path.dirname(output_file), 'shards')
+
+def save_combined_dishes(dishes, output_file, output_format='json', shard_by=None):
+    # Stream dishes to the JSON file, the compact encoding and/or the dish store, and return how many there were.
+    # With shard_by ('date' or 'hall'), they are also split into shards with a manifest.
+    # Nothing is written if there are no dishes.
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    formats = output_formats(output_format)
+    writer = DishArrayWriter(output_file) if 'json' in formats else None
+    store = DishStoreBuilder() if 'store' in formats else None
+    shard_writer = ShardWriter(shard_directory(output_file), shard_by) if shard_by else None
+    count = 0
+
+    def write_through():
+        nonlocal count
+        for dish in dishes:
+            count += 1
+            if writer is not None:
+                writer.write(dish)
+            if store is not None:
+                store.add(dish)
+            if shard_writer is not None:
+                shard_writer.add(dish)
+            yield dish
+
+    try:
+        if 'compact' in formats:
+            encoded = encode_dishes(write_through())
+        else:
+            for _ in write_through():
+                pass
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
 
-    if not all_dishes:
+    if count == 0:
+        if writer is not None:
+            writer.discard()
+        return 0
+    try:
+        if 'compact' in formats:
+            save_compact_json(encoded, compact_file(output_file))
+        if store is not None:
+            save_dish_store(store.result(), store_file(output_file))
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+    # Closed last, so combined_dishes.json is the newest of the files written together and is the one read back
+    if writer is not None:
+        writer.close()
+    if shard_writer is not None:
+        changed, removed = shard_writer.close()
+        print(f"Shards: {len(shard_writer.shards)} published, {len(changed)} written, {len(removed)} removed")
+    return count
+
+def main(force=False, workers=1, output_format='json', base_dir=None, output_file=None, store_path=None, shard_by=None):
+    # Set the base directory for CSV files and the output file path
+    base_dir = base_dir or get_csv_directory()
+    output_file = output_file or get_output_file()
+
+    # Nothing to do if no menu changed since the combined file was written
+    if not force and not needs_processing(base_dir, output_file, output_format, shard_by, store_path):
+        print(f"No menu changes since {output_file} was generated, skipping processing")
+        return
+
+    failed_files = []
+
+    csv_files = find_csv_files(base_dir)
+    load_canonical_table(base_dir, csv_files)
+
+    # Each menu is also added to the history database, if one is given
+    store = MenuStore(store_path) if store_path else None
+
+    def iter_dishes():
+        # Dishes are written out as each file is processed rather than collected first
+        for file_path, dishes in iter_csv_files_cached(csv_files, base_dir, workers):
+            if dishes is None:
+                failed_files.append(file_path)
+                continue
+            if store is not None:
+                store.add_menu(dishes)
+            yield from dishes
+
+    with store or contextlib.nullcontext():
+        dish_count = save_combined_dishes(iter_dishes(), output_file, output_format, shard_by)
+    if store is not None:
+        print(f"Menu history has been updated in: {store_path}")
+
+    if failed_files:
+        print(f"Warning: {len(failed_files)} file(s) could not be processed:")
+        for file_path in failed_files:
+            print(f"  {file_path}")
+
+    if not dish_count:
         print("Warning: No data was processed. Check your CSV files and their locations.")
     else:
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        # Save the JSON file
-        with open(output_file, 'w', encoding='utf-8') as jsonfile:
-            json.dump(all_dishes, jsonfile, indent=2)
-        
-        print(f"Combined JSON file has been generated at: {output_file}")
-        print(f"Total number of dishes processed: {len(all_dishes)}")
+        formats = output_formats(output_format)
+        if 'json' in formats:
+            print(f"Combined JSON file has been generated at: {output_file}")
+        if 'compact' in formats:
+            print(f"Compact JSON file has been generated at: {compact_file(output_file)}")
+        if 'store' in formats:
+            print(f"Dish store has been generated at: {store_file(output_file)}")
+        print(f"Total number of dishes processed: {dish_count}")
+
+    # Only meaningful when the files were normalized in this process
+    cache_info = normalization_cache_info()
+    if cache_info.hits or cache_info.misses:
+        print(f"Ingredient normalization cache: {cache_info.hits} hits, {cache_info.misses} misses")
+    cache_info = dish_cache_info()
+    if cache_info.hits or cache_info.misses:
+        print(f"Dish normalization cache: {cache_info.hits} hits, {cache_info.misses} misses")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Combine the scraped menu CSV files into a single JSON file")
+    parser.add_argument('--force', action='store_true', help="reprocess even if no menu changed")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes to normalize CSV files with")
+    parser.add_argument('--format', type=format_argument, default='json', help="comma-separated files to write: json (combined_dishes.json), compact and/or store; 'both' means json,compact")
+    parser.add_argument('--sqlite', nargs='?', const=get_store_path(), metavar='PATH', help="also keep every menu in a SQLite history database (default scraper/data/menu_history.sqlite)")
+    parser.add_argument('--shards', choices=SHARD_KEYS, help="also publish the dishes as gzipped shards, one per date or per date and hall, listed in shards/manifest.json")
+    args = parser.parse_args()
+
+    main(force=args.force, workers=args.workers, output_format=args.format, store_path=args.sqlite, shard_by=args.shards)
\ No newline at end of file
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sparse
+
+from create_filters import EXCLUSIONS, clean_and_replace_name, clean_ingredient_name, get_data_directory, iter_combined_dishes
+from dish_query import load_dish_index
+import metrics
+
+# Version of the neighbors layout, stored in the file
+NEIGHBORS_VERSION = 1
+
+NEIGHBORS_FILENAME = 'dish_neighbors.json'
+
+# Neighbors kept per dish
+DEFAULT_TOP_K = 10
+
+# Dishes whose similarities are computed at once. Each block is a dense
+# BLOCK_SIZE x dishes array, so this bounds memory however many dishes there are.
+BLOCK_SIZE = 512
+
+# How much sharing allergens counts compared to sharing ingredients
+ALLERGEN_WEIGHT = 0.5
+
+# Scores are stored as integers out of SCORE_SCALE to keep the file small
+SCORE_SCALE = 1000
+
+def add_dish_features(features, dish):
+    """
+    Add a dish's ingredients and allergens to those seen for its name.
+    A dish's lists can vary from day to day, so each name gets the union.
+    """
+    if not dish['name']:  # Placeholders only mark empty menus
+        return
+    ingredients, allergens = features.setdefault(clean_and_replace_name(dish['name']), (set(), set()))
+    ingredients.update(filter(None, map(clean_ingredient_name, dish['ingredients'])))
+    allergens.update(dish['allergens'])
+
+def collect_dish_features(dishes):
+    features = {}
+    for dish in dishes:
+        add_dish_features(features, dish)
+    return features
+
+def load_ingredient_vocabulary(data_dir=None):
+    """
+    The ingredients shown in the app's filter, without the excluded ones
+    """
+    path = os.path.join(data_dir or get_data_directory(), 'ingredients_filter.json')
+    with open(path, 'r') as file:
+        entries = json.load(file)
+    excluded = set(EXCLUSIONS['ingredients'])
+    return [entry['name'] for entry in entries if entry['name'] not in excluded]
+
+def feature_matrix(rows, vocabulary):
+    """
+    Sparse 0/1 matrix with one row per set in rows and one column per vocabulary entry.
+    Values outside the vocabulary are ignored.
+    """
+    column = {value: i for i, value in enumerate(vocabulary)}
+    indptr = [0]
+    indices = []
+    for row in rows:
+        indices.extend(sorted(column[value] for value in row if value in column))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(vocabulary)))
+
+def idf_weighted(matrix):
+    # Ingredients found in nearly everything say little about which dishes are alike
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    weights = np.log((1 + matrix.shape[0]) / (1 + document_frequency)).astype(np.float32) + 1
+    return matrix @ sparse.diags(weights)
+
+def normalize_rows(matrix):
+    # Scale every row to unit length, so row dot products are cosine similarities
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=np.float32).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).tocsr()
+
+def build_feature_matrix(features, vocabulary):
+    """
+    Stack the ingredient and allergen matrices of every distinct dish into one
+    row-normalized matrix. Returns the dish names in row order and the matrix.
+    """
+    names = sorted(features)
+    ingredients = feature_matrix([features[name][0] for name in names], vocabulary)
+    allergen_vocabulary = sorted(set().union(*(features[name][1] for name in names)))
+    allergens = feature_matrix([features[name][1] for name in names], allergen_vocabulary)
+
+    combined = sparse.hstack([
+        normalize_rows(idf_weighted(ingredients)),
+        ALLERGEN_WEIGHT * normalize_rows(idf_weighted(allergens)),
+    ])
+    return names, normalize_rows(combined)
+
+def top_k_neighbors(matrix, k=DEFAULT_TOP_K, block_size=BLOCK_SIZE):
+    """
+    The k most similar rows to every row, by cosine similarity, computed one
+    block of rows at a time. Returns (neighbors, scores) arrays of shape (rows, k),
+    most similar first. Slots without a neighbor sharing any feature are -1.
+    """
+    count = matrix.shape[0]
+    k = max(0, min(k, count - 1))
+    neighbors = np.full((count, k), -1, dtype=np.int32)
+    scores = np.zeros((count, k), dtype=np.float32)
+    if k == 0:
+        return neighbors, scores
+
+    transposed = matrix.T.tocsc()
+    for start in range(0, count, block_size):
+        stop = min(start + block_size, count)
+        similarity = (matrix[start:stop] @ transposed).toarray()
+        # A dish isn't its own neighbor
+        similarity[np.arange(stop - start), np.arange(start, stop)] = -1
+
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        # Highest score first, ties broken by row so the output is stable
+        order = np.lexsort((top, -top_scores), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        top[top_scores <= 0] = -1
+        neighbors[start:stop] = top
+        scores[start:stop] = np.clip(top_scores, 0, 1)
+        metrics.increment('similarity_blocks')
+
+    return neighbors, scores
+
+def build_neighbors(features, vocabulary, k=DEFAULT_TOP_K, block_size=BLOCK_SIZE):
+    names, matrix = build_feature_matrix(features, vocabulary)
+    neighbors, scores = top_k_neighbors(matrix, k, block_size)
+    metrics.set_value('recommended_dishes', len(names))
+
+    # Rows are trimmed at the first missing neighbor
+    rows = []
+    row_scores = []
+    for dish_neighbors, dish_scores in zip(neighbors.tolist(), np.rint(scores * SCORE_SCALE).astype(int).tolist()):
+        found = dish_neighbors.index(-1) if -1 in dish_neighbors else len(dish_neighbors)
+        rows.append(dish_neighbors[:found])
+        row_scores.append(dish_scores[:found])
+    return {
+        'version': NEIGHBORS_VERSION,
+        'k': k,
+        'score_scale': SCORE_SCALE,
+        'dishes': names,
+        'neighbors': rows,
+        'scores': row_scores,
+    }
+
+def save_neighbors(data, data_dir=None):
+    path = os.path.join(data_dir or get_data_directory(), NEIGHBORS_FILENAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'))
+    os.replace(temp_path, path)
+    return path
+
+def create_neighbors_file(features, data_dir=None, k=DEFAULT_TOP_K):
+    """
+    Build the neighbors artifact from collected dish features and the
+    ingredient filter, and write it next to the filter files
+    """
+    data = build_neighbors(features, load_ingredient_vocabulary(data_dir), k)
+    return save_neighbors(data, data_dir)
+
+class DishNeighbors:
+    """
+    Lookups into dish_neighbors.json. Nothing is recomputed at query time.
+    """
+    def __init__(self, data):
+        if data.get('version') != NEIGHBORS_VERSION:
+            raise ValueError(f"Unsupported neighbors version: {data.get('version')}")
+        self.names = data['dishes']
+        self.ids = {name: dish_id for dish_id, name in enumerate(self.names)}
+        self.neighbors = data['neighbors']
+        self.scores = data['scores']
+        self.score_scale = data['score_scale']
+
+    def similar(self, name):
+        """
+        (name, score) of the dishes most like name, most similar first
+        """
+        dish_id = self.ids.get(clean_and_replace_name(name))
+        if dish_id is None:
+            return []
+        return [
+            (self.names[other], score / self.score_scale)
+            for other, score in zip(self.neighbors[dish_id], self.scores[dish_id])
+        ]
+
+def load_neighbors(data_dir=None):
+    path = os.path.join(data_dir or get_data_directory(), NEIGHBORS_FILENAME)
+    with open(path, 'r', encoding='utf-8') as file:
+        return DishNeighbors(json.load(file))
+
+def today():
+    # Menu dates are in the dining halls' time zone
+    from pytz import timezone
+    return datetime.now(timezone('America/Los_Angeles')).strftime('%m-%d-%Y')
+
+def similar_dishes_served(neighbors, dish_index, name, location, date=None, limit=5):
+    """
+    The dishes most like name on the menu at location on date (today by default),
+    as (name, score) pairs, answered from the neighbors file and the dish index
+    """
+    served = dish_index.query(all_of=[('locations', location), ('dates', date or today())])
+    results = []
+    for other, score in neighbors.similar(name):
+        if dish_index.bits('dishes', other) & served:
+            results.append((other, score))
+            if len(results) == limit:
+                break
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build dish_neighbors.json, or find dishes like one on a hall's menu")
+    parser.add_argument('--k', type=int, default=DEFAULT_TOP_K, help="neighbors to keep per dish")
+    parser.add_argument('--like', help="dish to find similar dishes for instead of rebuilding")
+    parser.add_argument('--location', help="with --like, only dishes served at this dining hall")
+    parser.add_argument('--date', help="with --location, the menu date (MM-DD-YYYY, default today)")
+    args = parser.parse_args()
+
+    if args.like:
+        neighbors = load_neighbors()
+        if args.location:
+            results = similar_dishes_served(neighbors, load_dish_index(), args.like, args.location, args.date)
+        else:
+            results = neighbors.similar(args.like)
+        for name, score in results:
+            print(f"{score:.3f}  {name}")
+    else:
+        path = create_neighbors_file(collect_dish_features(iter_combined_dishes()), k=args.k)
+        print(f"Dish neighbors have been saved to {path}")
@@ -1,38 +1,182 @@
-import subprocess
-import sys
+import argparse
+import contextlib
 import os
+import sys
 
-def run_script(script_name):
+import create_filters
+import metrics
+import processing
+from dining_info import cleanup_old_data, menu_csv_row
+from manifest import DEFAULT_MAX_AGE_HOURS, load_manifest, save_manifest
+from menu_store import MenuStore, get_store_path
+from scrape_menu import iter_menus, open_journal, plan_shards, url
+from shards import SHARD_KEYS
+
+def iter_scraped_dishes(manifest, workers=1, headless=False, retries=2, max_age_hours=DEFAULT_MAX_AGE_HOURS, journal=None, base_url=url):
     """
-    Run a Python script and check for successful execution
+    Scrape the menus that need refreshing and yield (csv_path, dishes) as each one is normalized.
+    The CSV files are still written along the way, and each menu is logged in the journal, if given.
     """
-    print(f"\n=== Running {script_name} ===")
-    
-    script_path = os.path.join(os.path.dirname(__file__), script_name)
-    result = subprocess.run([sys.executable, script_path], capture_output=True, text=True)
-    
-    if result.returncode != 0:
-        print(f"Error running {script_name}:")
-        print(result.stderr)
-        sys.exit(1)
-    
-    print(result.stdout)
-    print(f"=== Successfully completed {script_name} ===\n")
+    shards = plan_shards(manifest, max_age_hours, journal)
+    for menu_info in iter_menus(shards, workers, headless, retries, manifest, journal, base_url):
+        rows = [menu_csv_row(food_info) for food_info in menu_info['foodInfo']]
+        yield menu_info['csvPath'], processing.process_menu(menu_info['csvPath'], rows)
+
+def record_normalization_cache():
+    # Cumulative for this process; worker processes keep caches of their own
+    info = processing.normalization_cache_info()
+    metrics.set_value('normalization_cache', {'hits': info.hits, 'misses': info.misses, 'size': info.currsize})
+    info = processing.dish_cache_info()
+    metrics.set_value('dish_normalization_cache', {'hits': info.hits, 'misses': info.misses, 'size': info.currsize})
+
+def run_pipeline(workers=1, headless=False, retries=2, max_age_hours=DEFAULT_MAX_AGE_HOURS, processing_workers=1, force=False, output_format='json', run_metrics=None, store_path=None, shard_by=None, recommend=False, base_url=url):
+    """
+    Scrape, normalize and count the menus in a single process, writing the CSV,
+    combined JSON and filter files as side outputs. Returns False if scraping failed.
+    Each stage is timed into run_metrics, if given, and every menu is added
+    to the SQLite history at store_path, if given. With shard_by, the dishes
+    are also published as shards. With recommend, the dish neighbors file is
+    built after the filters. Menus are scraped from base_url, e.g. a local replay server.
+    """
+    run_metrics = run_metrics or metrics.PipelineMetrics()
+    if recommend:
+        # numpy and scipy are only needed for recommendations
+        from recommend import add_dish_features, create_neighbors_file
+    base_dir = processing.get_csv_directory()
+    output_file = processing.get_output_file()
+
+    print("\n=== Scraping menus ===")
+    dishes_by_file = {}
+    with run_metrics.stage('scrape'):
+        manifest = load_manifest()
+        cleanup_old_data(manifest)
+        # Menus are normalized as they arrive, so the canonical table has to be in place first
+        processing.load_canonical_table(base_dir)
+
+        filter_state = create_filters.load_filter_state()
+        # Menus saved by a run that died partway aren't scraped again
+        journal = open_journal(manifest)
+        try:
+            for csv_path, dishes in iter_scraped_dishes(manifest, workers, headless, retries, max_age_hours, journal, base_url):
+                dishes_by_file[os.path.abspath(csv_path)] = dishes
+        except RuntimeError as e:
+            print(f"Error scraping menus: {e}")
+            journal.close(finished=False)
+            return False
+        finally:
+            save_manifest(manifest)
+            record_normalization_cache()
+        journal.close(finished=True)
+
+        # Menus are compared by their CSV hashes in the manifest, rather than by hashing their dishes
+        digests = create_filters.menu_digests(manifest)
+        for dishes in dishes_by_file.values():
+            if dishes:
+                key = create_filters.group_key(dishes[0])
+                create_filters.update_filter_group(filter_state, key, dishes, digests.get(key))
+
+    if not force and not processing.needs_processing(base_dir, output_file, output_format, shard_by, store_path):
+        # Keep the counts of the menus scraped above, so they aren't redone next run
+        create_filters.save_filter_state(filter_state)
+        print("No menu changes since the last run, skipping processing and filters")
+        return True
+
+    print("\n=== Processing menus ===")
+    with run_metrics.stage('process'):
+        # Menus that weren't refetched this run come from the dish cache, or are read back from disk
+        csv_files = processing.find_csv_files(base_dir)
+        group_keys = set()
+        dish_index = create_filters.DishIndexBuilder()
+        store = MenuStore(store_path) if store_path else None
+        dish_features = {} if recommend else None
+
+        def iter_dishes():
+            # Each file's dishes are counted, indexed and written out before the next one is read
+            for file_path, dishes in processing.iter_csv_files_cached(csv_files, base_dir, processing_workers, known=dishes_by_file):
+                if dishes is None:
+                    print(f"Warning: {file_path} could not be processed")
+                    continue
+                if dishes:
+                    group_keys.add(create_filters.group_key(dishes[0]))
+                    if os.path.abspath(file_path) not in dishes_by_file:
+                        key = create_filters.group_key(dishes[0])
+                        create_filters.update_filter_group(filter_state, key, dishes, digests.get(key))
+                for dish in dishes:
+                    dish_index.add(dish)
+                    if dish_features is not None:
+                        add_dish_features(dish_features, dish)
+                if store is not None:
+                    store.add_menu(dishes)
+                yield from dishes
+
+        with store or contextlib.nullcontext():
+            dish_count = processing.save_combined_dishes(iter_dishes(), output_file, output_format, shard_by)
+        metrics.set_value('dishes', dish_count)
+        record_normalization_cache()
+
+        if not dish_count:
+            print("Warning: No data was processed. Check your CSV files and their locations.")
+            return True
+
+        print(f"Combined dishes have been generated next to: {output_file}")
+        print(f"Total number of dishes processed: {dish_count}")
+
+    print("\n=== Creating filters ===")
+    with run_metrics.stage('filters'):
+        create_filters.remove_filter_groups(filter_state, group_keys)
+        create_filters.save_filter_files(create_filters.filter_state_counts(filter_state))
+        create_filters.save_filter_state(filter_state)
+        create_filters.write_dish_index(dish_index.result(), combined_file=create_filters.get_combined_file(output_file))
+        print(f"Filter JSON files have been created successfully in {create_filters.get_data_directory()}")
+
+    if recommend:
+        print("\n=== Building recommendations ===")
+        with run_metrics.stage('recommend'):
+            print(f"Dish neighbors have been saved to {create_neighbors_file(dish_features)}")
+
+    return True
 
 def main():
-    # List of scripts to run in order
-    scripts = [
-        "scrape_menu.py",
-        "processing.py",
-        "create_filters.py"
-    ]
-    
+    parser = argparse.ArgumentParser(description="Scrape, process and publish the dining hall menus")
+    parser.add_argument('--workers', type=int, default=1, help="number of browsers to scrape with in parallel")
+    parser.add_argument('--headless', action='store_true', help="run the browsers in headless mode")
+    parser.add_argument('--retries', type=int, default=2, help="number of times to retry failed menus")
+    parser.add_argument('--max-age', type=float, default=DEFAULT_MAX_AGE_HOURS, help="refetch menus after today once they are older than this many hours")
+    parser.add_argument('--processing-workers', type=int, default=1, help="number of processes to normalize unchanged CSV files with")
+    parser.add_argument('--force', action='store_true', help="reprocess even if no menu changed")
+    parser.add_argument('--format', type=processing.format_argument, default='json', help="comma-separated files to write: json (combined_dishes.json), compact and/or store; 'both' means json,compact")
+    parser.add_argument('--metrics-dir', default=metrics.METRICS_DIR, help="folder to write the per-run metrics file to")
+    parser.add_argument('--profile', choices=['scrape', 'process', 'filters', 'recommend'], help="run this stage under cProfile and save the stats next to the metrics")
+    parser.add_argument('--trace-memory', action='store_true', help="also record the peak Python heap of each stage (slower)")
+    parser.add_argument('--sqlite', nargs='?', const=get_store_path(), metavar='PATH', help="also keep every menu in a SQLite history database (default scraper/data/menu_history.sqlite)")
+    parser.add_argument('--shards', choices=SHARD_KEYS, help="also publish the dishes as gzipped shards, one per date or per date and hall, listed in shards/manifest.json")
+    parser.add_argument('--recommend', action='store_true', help="also build dish_neighbors.json for recommendations (needs numpy and scipy)")
+    parser.add_argument('--base-url', default=url, help="menu page to scrape, e.g. a local replay server")
+    args = parser.parse_args()
+
     print("Starting data pipeline...")
-    
-    for script in scripts:
-        run_script(script)
-    
+
+    run_metrics = metrics.PipelineMetrics(args.metrics_dir, args.profile, args.trace_memory)
+
+    succeeded = run_pipeline(
+        workers=args.workers,
+        headless=args.headless,
+        retries=args.retries,
+        max_age_hours=args.max_age,
+        processing_workers=args.processing_workers,
+        force=args.force,
+        output_format=args.format,
+        run_metrics=run_metrics,
+        store_path=args.sqlite,
+        shard_by=args.shards,
+        recommend=args.recommend,
+        base_url=args.base_url,
+    )
+    print(f"Run metrics saved to {run_metrics.save(succeeded)}")
+    if not succeeded:
+        sys.exit(1)
+
     print("Data pipeline completed successfully!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
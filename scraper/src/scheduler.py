@@ -0,0 +1,258 @@
+import argparse
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dining_info import build_shards, cleanup_old_data, dining_hall_alias, generate_date_array, pst_timezone, write_menu_csv
+from http_scraper import HttpMenuClient, url, urllib_transport
+from manifest import load_manifest, manifest_key, save_manifest
+import metrics
+
+# Hour of the day, Pacific time, each meal starts being served
+MEAL_HOURS = {'Breakfast': 7, 'Brunch': 10, 'Lunch': 11, 'Dinner': 17}
+
+# A menu is due again once its age reaches this share of the time it had left
+# until serving when it was fetched, so menus are checked more often as they
+# get close to being served, within these bounds
+REFRESH_SHARE = 0.25
+MIN_REFRESH_SECONDS = 15 * 60
+MAX_REFRESH_SECONDS = 24 * 3600
+
+# How long to wait before trying a menu that failed again, doubled for every
+# failure in a row up to MAX_REFRESH_SECONDS
+RETRY_SECONDS = 5 * 60
+
+# Longest the scheduler sleeps before checking for a new day
+IDLE_SECONDS = 15 * 60
+
+DEFAULT_CONCURRENCY = 2
+DEFAULT_RATE = 2.0
+DEFAULT_BATCH_SIZE = 16
+
+def serving_time(date, meal):
+    """
+    When a meal starts being served on a date (m/d/yyyy), as a Unix timestamp
+    """
+    day = datetime.strptime(date, '%m/%d/%Y').replace(hour=MEAL_HOURS[meal])
+    return pst_timezone.localize(day).timestamp()
+
+def due_time(manifest, date, hall, meal):
+    """
+    When a menu should next be fetched: at once if it never was, otherwise a
+    share of the time it had left until serving after it was last fetched,
+    or a day later if it was already being served
+    """
+    entry = manifest['menus'].get(manifest_key(date, hall, meal))
+    if entry is None or not os.path.exists(entry['path']):
+        return 0
+    until_serving = serving_time(date, meal) - entry['fetched_at']
+    if until_serving <= 0:
+        # Already being served when fetched, so it won't change much any more
+        return entry['fetched_at'] + MAX_REFRESH_SECONDS
+    return entry['fetched_at'] + min(MAX_REFRESH_SECONDS, max(MIN_REFRESH_SECONDS, until_serving * REFRESH_SHARE))
+
+class RateLimiter:
+    """
+    Token bucket allowing rate requests per second on average, and bursts of
+    up to burst. Shared by all the workers, so the total load on the site is
+    bounded however many of them there are.
+    """
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Take the token now and wait for it outside the lock, so callers queue up in order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            metrics.increment('rate_limited_seconds', wait)
+            self.sleep(wait)
+
+def rate_limited(transport, limiter):
+    """
+    Wrap a transport so every request waits for the rate limiter first
+    """
+    def limited(request_url, data=None):
+        limiter.acquire()
+        return transport(request_url, data)
+    return limited
+
+class MenuScheduler:
+    """
+    Keeps the scraped menus fresh by running continuously, instead of
+    scraping every menu once per run.
+
+    Every (date, hall, meal) of the next 7 days is a task in a priority queue
+    ordered by when it is due, see due_time, and then by how soon it is
+    served. Due tasks are taken in batches and fetched by up to concurrency
+    HTTP clients, rate limited together. After a batch that changed any menu,
+    the combined dishes and filter files are regenerated, which only redoes
+    the menus that changed.
+
+    The clock, sleep and transport can be swapped out, so the scheduler can
+    be driven against a local stand-in of the menu site.
+    """
+    def __init__(self, base_url=url, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, batch_size=DEFAULT_BATCH_SIZE,
+                 process=True, processing_workers=1, transport_factory=urllib_transport, clock=time.time, sleep=time.sleep):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.process = process
+        self.processing_workers = processing_workers
+        self.transport_factory = transport_factory
+        self.clock = clock
+        self.sleep = sleep
+        self.limiter = RateLimiter(rate, sleep=sleep)
+        self.manifest = load_manifest()
+        self.queue = []
+        self.order = itertools.count()
+        self.dates = None
+        self.failures = {}
+        self.local = threading.local()
+
+    def push(self, task, due_at):
+        date, hall, meal = task
+        heapq.heappush(self.queue, (due_at, serving_time(date, meal), next(self.order), task))
+
+    def plan(self):
+        """
+        Rebuild the queue when the day changes, dropping the past dates
+        """
+        now = self.clock()
+        dates = generate_date_array(now)
+        if dates == self.dates:
+            return
+        if self.dates is not None:
+            cleanup_old_data(self.manifest, now)
+        self.dates = dates
+        self.queue = []
+        self.failures = {}
+        for task in build_shards(dates):
+            self.push(task, due_time(self.manifest, *task))
+        print(f"Scheduled {len(self.queue)} menus from {dates[0]} to {dates[-1]}")
+
+    def next_batch(self, now):
+        """
+        Take up to batch_size tasks that are due, most overdue first
+        """
+        batch = []
+        while self.queue and self.queue[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self.queue)[3])
+        return batch
+
+    def client(self):
+        # Each worker thread keeps its own client, since a client follows one page at a time
+        if getattr(self.local, 'client', None) is None:
+            self.local.client = HttpMenuClient(self.base_url, rate_limited(self.transport_factory(), self.limiter))
+        return self.local.client
+
+    def fetch(self, task):
+        date, hall, meal = task
+        client = self.client()
+        try:
+            food_info_list = client.scrape(date, hall, meal)
+        except Exception:
+            # Start the next task from a fresh page, whatever state the failure left this one in
+            self.local.client = None
+            raise
+
+        # Record menus the site doesn't offer as empty, so processing still emits their placeholders
+        write_menu_csv(date, hall, meal, food_info_list or [], self.manifest)
+
+    def run_batch(self, batch, executor):
+        """
+        Fetch a batch of tasks, put them back in the queue for their next fetch,
+        and return whether any menu changed
+        """
+        last_changed = self.manifest['last_changed']
+        futures = [(task, executor.submit(self.fetch, task)) for task in batch]
+        failed = 0
+        for task, future in futures:
+            date, hall, meal = task
+            try:
+                future.result()
+                metrics.increment('scheduled_fetches')
+                self.failures.pop(task, None)
+                self.push(task, due_time(self.manifest, *task))
+            except Exception as e:
+                # Any error fails only this task, so the rest of the batch is still recorded and saved
+                print(f"Error scraping {date}, {dining_hall_alias[hall]}, {meal}: {e}")
+                metrics.increment('scheduled_failures', key=manifest_key(*task))
+                failed += 1
+                self.failures[task] = self.failures.get(task, 0) + 1
+                delay = min(RETRY_SECONDS * 2 ** (self.failures[task] - 1), MAX_REFRESH_SECONDS)
+                self.push(task, self.clock() + delay)
+        save_manifest(self.manifest)
+
+        print(f"Fetched {len(batch) - failed} of {len(batch)} due menus")
+        return self.manifest['last_changed'] != last_changed
+
+    def publish(self):
+        """
+        Regenerate the combined dishes and the filter files from the changed menus
+        """
+        # Imported here so scraping alone doesn't load the processing code
+        import create_filters
+        import processing
+
+        processing.main(workers=self.processing_workers)
+        if not create_filters.filters_up_to_date():
+            create_filters.create_filter_files(create_filters.iter_combined_dishes(), digests=create_filters.combined_digests(),
+                                               combined_file=create_filters.get_combined_file())
+            print(f"Filter JSON files have been updated in {create_filters.get_data_directory()}")
+
+    def run(self, once=False):
+        """
+        Fetch menus as they become due until interrupted. With once, stop as
+        soon as nothing is due instead of waiting for the next menu.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                self.plan()
+                now = self.clock()
+                batch = self.next_batch(now)
+                if batch:
+                    if self.run_batch(batch, executor) and self.process:
+                        self.publish()
+                    continue
+                if once:
+                    break
+
+                wait = min(self.queue[0][0] - now, IDLE_SECONDS) if self.queue else IDLE_SECONDS
+                date, hall, meal = self.queue[0][3] if self.queue else (None, None, None)
+                if date:
+                    print(f"Next menu due in {wait / 60:.1f} min: {date}, {dining_hall_alias[hall]}, {meal}")
+                self.sleep(max(wait, 0))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the menus fresh, fetching each one as it becomes due")
+    parser.add_argument('--base-url', default=url, help="menu page to scrape, e.g. a local stand-in of the site")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="number of menus to fetch at once")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="most requests per second to send to the site")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="menus to fetch before regenerating the combined dishes and filters")
+    parser.add_argument('--processing-workers', type=int, default=1, help="number of processes to normalize CSV files with")
+    parser.add_argument('--no-process', action='store_true', help="only scrape, without regenerating the combined dishes and filters")
+    parser.add_argument('--once', action='store_true', help="exit once no menu is due instead of running continuously")
+    args = parser.parse_args()
+
+    scheduler = MenuScheduler(args.base_url, args.concurrency, args.rate, args.batch_size,
+                              process=not args.no_process, processing_workers=args.processing_workers)
+    try:
+        scheduler.run(once=args.once)
+    except KeyboardInterrupt:
+        save_manifest(scheduler.manifest)
+        print("Scheduler stopped")
@@ -1,14 +1,52 @@
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service 
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC 
+from selenium.webdriver.support import expected_conditions as EC
 
+import argparse
 import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pytz import timezone
 from dining_info import *
+from manifest import DEFAULT_MAX_AGE_HOURS, ScrapeJournal, is_fresh, load_manifest, save_manifest
+import metrics
 
-def find_dropdown(id_name):
+# Stanford Dining Menu page
+url = 'https://rdeapps.stanford.edu/dininghallmenu/'
+
+# chromedriver_path = '../chromedriver.exe'  # path for Windows
+chromedriver_path = '../chromedriver'
+
+# Setup timezones for PST
+pst_timezone = timezone('America/Los_Angeles')
+pst_now = datetime.now(pst_timezone)
+
+# Seconds to wait before the first retry of failed menus, doubled for every retry after it
+RETRY_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 120
+
+DROPDOWN_IDS = ['MainContent_lstDay', 'MainContent_lstLocations', 'MainContent_lstMealType']
+
+READ_DROPDOWNS_SCRIPT = """
+var dropdowns = {};
+arguments[0].forEach(function (id) {
+    var dropdown = document.getElementById(id);
+    dropdowns[id] = dropdown ? {
+        selected: dropdown.value,
+        options: Array.from(dropdown.options).map(function (option) { return option.value; })
+    } : null;
+});
+return dropdowns;
+"""
+
+def find_dropdown(driver, id_name):
     """
     Locate and return the dropdown element based on provided id_name
     """
@@ -17,65 +55,251 @@ def find_dropdown(id_name):
         EC.presence_of_element_located((By.ID, dropdown_id))
     )
 
-def select_in_dropdown(id_name):
+def read_dropdowns(driver):
     """
-    Retrieve the currently selected value from the dropdown
+    Read the selected value and available options of every dropdown in one round-trip
     """
-    item_id = f'#MainContent_lst{id_name} option[selected="selected"]'
-    return WebDriverWait(driver, 5, 100).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, item_id))
-    ).get_attribute('value')
+    return driver.execute_script(READ_DROPDOWNS_SCRIPT, DROPDOWN_IDS)
 
-# Setup timezones for PST
-pst_timezone = timezone('America/Los_Angeles')
-pst_now = datetime.now(pst_timezone)
+def select_and_wait(driver, id_name, value, key=None, timeout=15):
+    """
+    Select a dropdown value and wait for the postback it triggers to finish.
+    Returns False without touching the page if the value is already selected.
+    """
+    dropdown = find_dropdown(driver, id_name)
+    if dropdown.get_attribute('value') == value:
+        return False
 
-# Set up Chrome options
-chrome_options = webdriver.ChromeOptions()
-# Uncomment the next line to run in headless mode
-# chrome_options.add_argument('--headless')
-chrome_options.add_argument('--disable-extensions')
+    Select(dropdown).select_by_value(value)
+    # The postback replaces the whole document, so the old dropdown goes stale once it is under way
+    WebDriverWait(driver, timeout, 100).until(EC.staleness_of(dropdown))
+    WebDriverWait(driver, timeout, 100).until(
+        lambda d: d.execute_script('return document.readyState') == 'complete'
+    )
+    metrics.increment('postbacks', key=key)
+    return True
 
-# Set up WebDriver
-# chromedriver_path = '../chromedriver.exe'  # path for Windows
-chromedriver_path = '../chromedriver'
-service = Service(executable_path=chromedriver_path)
-driver = webdriver.Chrome(service=service, options=chrome_options)
+def create_driver(headless=False):
+    """
+    Set up a Chrome WebDriver instance
+    """
+    chrome_options = webdriver.ChromeOptions()
+    if headless:
+        chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--disable-extensions')
 
-# Open Stanford Dining Menu page
-url = 'https://rdeapps.stanford.edu/dininghallmenu/'
-driver.get(url)
+    service = Service(executable_path=chromedriver_path)
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+def open_menu_page(driver, base_url=url):
+    """
+    Open the menu page and initialize it with dummy settings
+    """
+    driver.get(base_url)
+
+    dummy_date = pst_now.strftime('%m/%d/%Y').lstrip("0").replace("/0", "/")
+    dummy_hall = "Arrillaga"
+    dummy_meal = "Breakfast"
+
+    for id_name, value in [('Day', dummy_date), ('Locations', dummy_hall), ('MealType', dummy_meal)]:
+        if value in read_dropdowns(driver)[f'MainContent_lst{id_name}']['options']:
+            select_and_wait(driver, id_name, value)
+
+def scrape_shard(driver, shard, manifest=None):
+    """
+    Select a single (date, hall, meal) combination and save its menu.
+    Only dropdowns whose value differs from the page are changed. If the page
+    doesn't offer the hall or meal, e.g. Brunch on a weekday, an empty menu is
+    recorded without any further postbacks. A missing date fails the shard.
+    """
+    date, hall, meal = shard
+    key = f"{date}|{hall}|{meal}"
+
+    dropdowns = read_dropdowns(driver)
+    for id_name, value in [('Day', date), ('Locations', hall), ('MealType', meal)]:
+        dropdown = dropdowns[f'MainContent_lst{id_name}']
+        if dropdown is None:
+            raise NoSuchElementException(f"Dropdown MainContent_lst{id_name} is missing from the page")
+        if value not in dropdown['options']:
+            # A date missing from the page is a failed load rather than a day without menus, so it is retried
+            if id_name == 'Day':
+                raise NoSuchElementException(f"{date} is not an option in MainContent_lstDay")
+            print(f"No {meal} menu for: {date}, {dining_hall_alias[hall]}")
+            metrics.increment('menus_not_offered', key=key)
+            return write_menu_csv(date, hall, meal, [], manifest)
+        if dropdown['selected'] != value:
+            select_and_wait(driver, id_name, value, key)
+            # The options can change with every postback, so check the rest against the new page
+            dropdowns = read_dropdowns(driver)
+
+    print(f"Fetching data for: {date}, {dining_hall_alias[hall]}, {meal}")
+
+    # Extract and save the menu information to CSV file
+    menu_info = save_info(driver, date, hall, meal, manifest)
+    metrics.increment('menu_items', len(menu_info['foodInfo']), key=key)
+    return menu_info
+
+def split_shards(shards, workers):
+    """
+    Split shards into contiguous chunks, one per worker, so each browser
+    keeps the same date and hall selected for as long as possible
+    """
+    chunk_size = -(-len(shards) // max(1, workers))
+    return [shards[i:i + chunk_size] for i in range(0, len(shards), chunk_size)]
+
+def scrape_worker(shards, headless=False, manifest=None, on_menu=None, journal=None, base_url=url):
+    """
+    Scrape a chunk of shards with a dedicated browser and return the shards that failed.
+    Each scraped menu is logged in the journal and passed to on_menu, if given.
+    """
+    failed = []
+    try:
+        driver = create_driver(headless)
+    except WebDriverException as e:
+        print(f"Error starting browser: {e.msg}")
+        return list(shards)
+
+    try:
+        open_menu_page(driver, base_url)
+        for shard in shards:
+            try:
+                menu_info = scrape_shard(driver, shard, manifest)
+                if journal is not None:
+                    journal.record(manifest, *shard)
+                if on_menu is not None:
+                    on_menu(menu_info)
+            except WebDriverException as e:
+                print(f"Error scraping {shard}: {e.msg}")
+                failed.append(shard)
+    except WebDriverException as e:
+        print(f"Error opening menu page: {e.msg}")
+        failed = list(shards)
+    finally:
+        driver.quit()
+
+    return failed
+
+def run_shards(chunks, workers=1, headless=False, manifest=None, on_menu=None, journal=None, base_url=url):
+    """
+    Scrape every chunk using a pool of worker browsers and return all failed shards
+    """
+    if workers <= 1:
+        results = [scrape_worker(chunk, headless, manifest, on_menu, journal, base_url) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda chunk: scrape_worker(chunk, headless, manifest, on_menu, journal, base_url), chunks))
+
+    return [shard for failed in results for shard in failed]
+
+def retry_delay(attempt, backoff=RETRY_BACKOFF_SECONDS):
+    """
+    Seconds to wait before a retry attempt (1-based), doubling every attempt
+    """
+    return min(backoff * 2 ** (attempt - 1), MAX_BACKOFF_SECONDS)
+
+def scrape_all(shards, workers=1, headless=False, retries=2, manifest=None, on_menu=None, journal=None, backoff=RETRY_BACKOFF_SECONDS, base_url=url):
+    """
+    Scrape the given shards, retrying failures, and return the shards that still failed
+    """
+    print(f"Scraping {len(shards)} menus with {workers} browser(s)")
+    failed = run_shards(split_shards(shards, workers), workers, headless, manifest, on_menu, journal, base_url)
+
+    # Retry each failed shard on its own so a slow page doesn't hold up the rest,
+    # backing off so a struggling site gets time to recover
+    for attempt in range(1, retries + 1):
+        if not failed:
+            break
+        delay = retry_delay(attempt, backoff)
+        print(f"Retrying {len(failed)} failed menu(s) in {delay:g}s (attempt {attempt} of {retries})")
+        time.sleep(delay)
+        metrics.increment('retried_menus', len(failed))
+        failed = run_shards([[shard] for shard in failed], workers, headless, manifest, on_menu, journal, base_url)
+
+    return failed
+
+def open_journal(manifest):
+    """
+    Open today's scrape journal, picking up the menus an unfinished run already saved
+    """
+    journal = ScrapeJournal(dates_list[0])
+    resumed = journal.resume(manifest)
+    if resumed:
+        print(f"Resuming an unfinished scrape, {resumed} menu(s) were already saved")
+    return journal
+
+def plan_shards(manifest, max_age_hours=DEFAULT_MAX_AGE_HOURS, journal=None):
+    """
+    Build the shards to scrape, skipping menus that were fetched recently
+    enough or that an unfinished run already saved
+    """
+    shards = build_shards()
+    stale = [
+        shard for shard in shards
+        if not is_fresh(manifest, *shard, dates_list[0], max_age_hours) and not (journal and journal.is_done(*shard))
+    ]
+    print(f"{len(shards) - len(stale)} of {len(shards)} menus are still fresh or already saved")
+    return stale
+
+def iter_menus(shards, workers=1, headless=False, retries=2, manifest=None, journal=None, base_url=url):
+    """
+    Scrape the given shards in the background and yield each menu as soon as it is saved.
+    Raises RuntimeError at the end if any menu could not be scraped.
+    """
+    menus = queue.Queue()
+    failed = []
+
+    def scrape():
+        try:
+            failed.extend(scrape_all(shards, workers, headless, retries, manifest, menus.put, journal, base_url=base_url))
+        finally:
+            menus.put(None)
+
+    thread = threading.Thread(target=scrape, daemon=True)
+    thread.start()
+
+    while True:
+        menu_info = menus.get()
+        if menu_info is None:
+            break
+        yield menu_info
 
-# Cleanup old data
-cleanup_old_data()
+    thread.join()
+    if failed:
+        raise RuntimeError(f"Failed to scrape {len(failed)} menu(s): {failed}")
 
-# Initialize page with dummy settings
-dummy_date = pst_now.strftime('%m/%d/%Y').lstrip("0").replace("/0", "/")
-dummy_hall = "Arrillaga"
-dummy_meal = "Breakfast"
+def main(workers=1, headless=False, retries=2, max_age_hours=DEFAULT_MAX_AGE_HOURS, backoff=RETRY_BACKOFF_SECONDS, base_url=url):
+    manifest = load_manifest()
 
-Select(driver.find_element(By.ID, 'MainContent_lstDay')).select_by_value(dummy_date)
-Select(driver.find_element(By.ID, 'MainContent_lstLocations')).select_by_value(dummy_hall)
-Select(driver.find_element(By.ID, 'MainContent_lstMealType')).select_by_value(dummy_meal)
+    # Cleanup old data
+    cleanup_old_data(manifest)
 
-# Iterate through dates, halls, and meals
-for date in dates_list:
-    Select(find_dropdown('Day')).select_by_value(date)
-    selected_date = select_in_dropdown('Day')
-    print("Fetching data for:", selected_date)
+    journal = open_journal(manifest)
+    shards = plan_shards(manifest, max_age_hours, journal)
+    start = time.perf_counter()
+    try:
+        failed = scrape_all(shards, workers, headless, retries, manifest, journal=journal, backoff=backoff, base_url=base_url)
+    finally:
+        save_manifest(manifest)
+    # Keep the journal while menus are missing, so the next run only scrapes those
+    journal.close(finished=not failed)
+    print(f"Scraped {len(shards) - len(failed)} of {len(shards)} menus in {time.perf_counter() - start:.1f}s")
 
-    for hall in dining_hall_list:
-        Select(find_dropdown('Locations')).select_by_value(hall)
-        selected_dining_hall = select_in_dropdown('Locations')
-        print("Selected dining hall:", dining_hall_alias[selected_dining_hall])
+    if failed:
+        print("Failed to scrape the following menus:")
+        for date, hall, meal in failed:
+            print(f"  {date}, {dining_hall_alias[hall]}, {meal}")
+        sys.exit(1)
 
-        for meal in meal_type_list:
-            Select(find_dropdown('MealType')).select_by_value(meal)
-            selected_meal_type = select_in_dropdown('MealType')
-            print("Selected meal type:", selected_meal_type)
+    print("Menu scraping completed successfully")
 
-            # Extract and save the menu information to CSV file
-            save_info(driver, selected_date, selected_dining_hall, selected_meal_type)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Stanford dining hall menus")
+    parser.add_argument('--workers', type=int, default=1, help="number of browsers to scrape with in parallel")
+    parser.add_argument('--headless', action='store_true', help="run the browsers in headless mode")
+    parser.add_argument('--retries', type=int, default=2, help="number of times to retry failed menus")
+    parser.add_argument('--max-age', type=float, default=DEFAULT_MAX_AGE_HOURS, help="refetch menus after today once they are older than this many hours")
+    parser.add_argument('--base-url', default=url, help="menu page to scrape, e.g. a local replay server")
+    parser.add_argument('--backoff', type=float, default=RETRY_BACKOFF_SECONDS, help="seconds to wait before the first retry, doubled for every retry after it")
+    args = parser.parse_args()
 
-driver.quit()
-print("Menu scraping completed successfully")
\ No newline at end of file
+    main(workers=args.workers, headless=args.headless, retries=args.retries, max_age_hours=args.max_age, backoff=args.backoff, base_url=args.base_url)
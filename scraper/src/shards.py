@@ -0,0 +1,184 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+
+# Version of the shard manifest layout, stored in the file
+SHARD_MANIFEST_VERSION = 1
+
+SHARD_MANIFEST_FILENAME = 'manifest.json'
+
+# How combined_dishes.json can be split up
+SHARD_KEYS = ['date', 'hall']
+
+def get_shard_directory():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(current_dir, '..', '..', 'stanfood_app', 'assets', 'data', 'shards'))
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+def shard_name(dish, shard_by='date'):
+    """
+    Name of the shard a dish belongs in, e.g. 2025-01-06 or 2025-01-06_wilbur-dining
+    """
+    try:
+        name = datetime.strptime(dish['date'], '%m-%d-%Y').date().isoformat()
+    except (TypeError, ValueError):
+        name = 'undated'
+    if shard_by == 'hall':
+        name = f"{name}_{slugify(dish['location'] or 'unknown')}"
+    return name
+
+def encode_shard(dishes):
+    return json.dumps(dishes, separators=(',', ':')).encode('utf-8')
+
+def compress_shard(content):
+    # mtime=0 keeps the gzip header, and so the compressed bytes, the same between runs
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+def load_shard_manifest(shard_dir):
+    try:
+        with open(os.path.join(shard_dir, SHARD_MANIFEST_FILENAME), 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == SHARD_MANIFEST_VERSION else None
+
+def save_shard_manifest(manifest, shard_dir):
+    path = os.path.join(shard_dir, SHARD_MANIFEST_FILENAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+def write_file(path, content):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+class ShardWriter:
+    """
+    Splits the combined dishes into one shard per date, or per date and hall,
+    as they stream past. Every shard is written as JSON and as a gzip copy, and
+    listed in manifest.json with its SHA-256. A shard whose contents haven't
+    changed is left untouched, and the manifest's generation only goes up when
+    a shard was added, changed or removed, so a client that remembers its
+    generation only fetches the shards changed since.
+
+    Dishes arrive sorted by date, then location, so each shard's dishes are
+    adjacent and only one shard is held in memory at a time.
+    """
+    def __init__(self, shard_dir=None, shard_by='date'):
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key: {shard_by}")
+        self.shard_dir = shard_dir or get_shard_directory()
+        self.shard_by = shard_by
+        old_manifest = load_shard_manifest(self.shard_dir)
+        self.had_manifest = old_manifest is not None
+        self.old_shards = old_manifest['shards'] if old_manifest else {}
+        # Switching between date and hall shards rewrites every shard
+        self.reusable = self.old_shards if old_manifest and old_manifest['shard_by'] == shard_by else {}
+        self.generation = (old_manifest['generation'] if old_manifest else 0) + 1
+        self.shards = {}
+        self.current = None
+        self.dishes = []
+
+    def add(self, dish):
+        name = shard_name(dish, self.shard_by)
+        if name != self.current:
+            self.flush()
+            if name in self.shards:
+                raise ValueError(f"Dishes for shard {name} are not adjacent")
+            self.current = name
+        self.dishes.append(dish)
+
+    def flush(self):
+        if self.current is None:
+            return
+        name, dishes = self.current, self.dishes
+        self.current, self.dishes = None, []
+
+        content = encode_shard(dishes)
+        digest = hashlib.sha256(content).hexdigest()
+        json_path = os.path.join(self.shard_dir, f"{name}.json")
+        gzip_path = f"{json_path}.gz"
+
+        old_entry = self.reusable.get(name)
+        if old_entry is not None and old_entry['sha256'] == digest and os.path.exists(json_path) and os.path.exists(gzip_path):
+            self.shards[name] = old_entry
+            return
+
+        os.makedirs(self.shard_dir, exist_ok=True)
+        compressed = compress_shard(content)
+        write_file(json_path, content)
+        write_file(gzip_path, compressed)
+        self.shards[name] = {
+            'sha256': digest,
+            'bytes': len(content),
+            'gzip_bytes': len(compressed),
+            'dishes': len(dishes),
+            'generation': self.generation,
+        }
+
+    def close(self):
+        """
+        Write the last shard, remove the shards that are gone and save the manifest.
+        Returns the names of the shards that were written and of those removed.
+        """
+        self.flush()
+        changed = sorted(name for name, entry in self.shards.items() if entry['generation'] == self.generation)
+        removed = sorted(set(self.old_shards) - set(self.shards))
+        for name in removed:
+            for path in (f"{name}.json", f"{name}.json.gz"):
+                path = os.path.join(self.shard_dir, path)
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if changed or removed or not self.had_manifest:
+            os.makedirs(self.shard_dir, exist_ok=True)
+            save_shard_manifest({
+                'version': SHARD_MANIFEST_VERSION,
+                'shard_by': self.shard_by,
+                'generation': self.generation,
+                'shards': self.shards,
+            }, self.shard_dir)
+        else:
+            # Nothing changed, so the manifest keeps its generation, but its time
+            # still shows the shards are up to date with the combined file
+            os.utime(os.path.join(self.shard_dir, SHARD_MANIFEST_FILENAME))
+        return changed, removed
+
+def changed_shards(manifest, generation):
+    """
+    The shards a client at an earlier generation has to fetch. It should also
+    drop any shard it has that the manifest no longer lists.
+    """
+    return sorted(name for name, entry in manifest['shards'].items() if entry['generation'] > generation)
+
+if __name__ == '__main__':
+    from dish_stream import iter_dish_array
+
+    parser = argparse.ArgumentParser(description="Split combined_dishes.json into per-date shards")
+    parser.add_argument('combined_file', help="path to combined_dishes.json")
+    parser.add_argument('--shard-dir', default=get_shard_directory(), help="folder to write the shards and their manifest to")
+    parser.add_argument('--by', choices=SHARD_KEYS, default='date', help="one shard per date, or per date and hall")
+    parser.add_argument('--since', type=int, help="only list the shards changed after this manifest generation")
+    args = parser.parse_args()
+
+    if args.since is not None:
+        manifest = load_shard_manifest(args.shard_dir)
+        if manifest is None:
+            raise SystemExit(f"No shard manifest in {args.shard_dir}")
+        for name in changed_shards(manifest, args.since):
+            print(name)
+    else:
+        writer = ShardWriter(args.shard_dir, args.by)
+        for dish in iter_dish_array(args.combined_file):
+            writer.add(dish)
+        changed, removed = writer.close()
+        print(f"{len(writer.shards)} shards, {len(changed)} written, {len(removed)} removed")
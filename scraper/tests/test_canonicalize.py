@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from canonicalize import MERGED_NAMES, SEED_NAMES, SPECIAL_MESSAGE, CanonicalTable, build_table, resolve_seed
+
+# Spellings that have to end up as one ingredient
+MERGES = [
+    ('Tomatoes', 'tomatoes'),
+    ('Jalapeño', 'Jalapeno'),
+    ('Green Onions', 'Green Onion'),
+    ('Black Beans', 'Black Bean'),
+    ('Cilantro', 'Cilnatro'),
+    ('Broccoli', 'Brocoli'),
+    ('Mushrooms', 'Mushroomms'),
+    ('Olive Oil', 'Oliveoil'),
+    ('Soy Sauce', 'Soysauce'),
+    ('Cumin Seeds', 'Cuminseed'),
+    ('Extra Virgin Olive Oil', 'Extra-Virgin Olive Oil'),
+]
+
+# Names one edit apart that are different ingredients
+KEPT_APART = [
+    ('Sodium Nitrite', 'Sodium Nitrate'),
+    ('Goat Milk', 'Oat Milk'),
+    ('Peas', 'Pear'),
+    ('Rice', 'Ricw'),
+    ('Garlic', 'Garlic Powder'),
+    ('Apple', 'Apple Juice'),
+    ('Baking Powder', 'Baking Soda'),
+    ('Cheese', 'Cheddar Cheese'),
+    ('Oats', 'Oat Milk'),
+    ('Brown Rice', 'Brown Rice Flour'),
+]
+
+def table_for(*names):
+    # The first spelling is the most common, so it is the canonical one unless a seed says otherwise
+    counts = {name: len(names) - position for position, name in enumerate(names)}
+    return CanonicalTable(build_table(counts))
+
+@pytest.mark.parametrize('old', sorted(SEED_NAMES))
+def test_seed_names_win(old):
+    new = resolve_seed(old)
+    # Even when the replaced spelling is the most common one on the menus
+    table = table_for(old, new)
+    assert table.canonical_name(old) == new
+    assert table.canonical_name(new) == new
+
+@pytest.mark.parametrize('common, variant', MERGES)
+def test_spellings_merge(common, variant):
+    table = table_for(common, variant)
+    assert table.canonical_name(variant) == table.canonical_name(common)
+
+@pytest.mark.parametrize('a, b', KEPT_APART)
+def test_near_duplicates_stay_apart(a, b):
+    table = table_for(a, b)
+    assert table.canonical_name(a) != table.canonical_name(b)
+
+def test_new_spellings_resolve_without_a_rebuild():
+    table = table_for('Cilantro', 'Broccoli')
+    assert table.canonical_name('Cilnatro') == 'Cilantro'
+    assert table.canonical_name('cilantro') == 'Cilantro'
+    # A name the table has never seen anything like is kept as it is
+    assert table.canonical_name('Dragon Fruit') == 'Dragon Fruit'
+
+def test_sub_ingredients_are_kept():
+    table = table_for('Tomatoes')
+    assert table.canonical_name('Tomato (Tomatoes, Citric Acid)') == 'Tomatoes (Tomatoes, Citric Acid)'
+    assert table.canonical_name(SPECIAL_MESSAGE) == SPECIAL_MESSAGE
+
+@pytest.mark.parametrize('name', sorted(MERGED_NAMES))
+def test_merged_names_only_join_in_the_filters(name):
+    table = table_for(name, MERGED_NAMES[name])
+    assert table.filter_name(name) == MERGED_NAMES[name]
+
+def test_suffix_forms_join_a_known_base_in_the_filters():
+    table = table_for('Garlic', 'Garlic Powder', 'Baking Powder', 'Apple', 'Apple Juice')
+    assert table.canonical_name('Garlic Powder') == 'Garlic Powder'
+    assert table.filter_name('Garlic Powder') == 'Garlic'
+    assert table.filter_name('Apple Juice') == 'Apple'
+    assert table.filter_name('Apple') == 'Apple'
+    # There is no plain Baking on the menus
+    assert table.filter_name('Baking Powder') == 'Baking Powder'
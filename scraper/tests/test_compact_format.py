@@ -0,0 +1,27 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from compact_format import compact_file, decode_dishes, encode_dishes, load_compact_dishes
+from corpus import generate_corpus
+from processing import main
+
+def test_compact_file_decodes_to_combined_dishes(tmp_path):
+    base_dir, output_file = str(tmp_path / 'csv'), str(tmp_path / 'out' / 'combined_dishes.json')
+    generate_corpus(base_dir, days=3, halls=4)
+    main(force=True, output_format='json,compact', base_dir=base_dir, output_file=output_file)
+
+    with open(output_file, 'r', encoding='utf-8') as file:
+        dishes = json.load(file)
+    assert dishes
+    assert load_compact_dishes(compact_file(output_file)) == dishes
+
+def test_round_trip_keeps_empty_and_missing_values():
+    dishes = [
+        {'name': '', 'ingredients': [], 'allergens': [], 'meal_time': 'Brunch', 'date': '03-02-2026', 'location': 'Branner'},
+        {'name': 'Crème Brûlée', 'ingredients': ['Cream', 'Cream'], 'allergens': ['Milk'], 'meal_time': None, 'date': None, 'location': None},
+    ]
+    assert decode_dishes(json.loads(json.dumps(encode_dishes(iter(dishes))))) == dishes
@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from create_filters import FILTER_NAMES, create_filter_files
+
+def dish(name, ingredients, allergens, location, date, meal_time):
+    return {'name': name, 'ingredients': ingredients, 'allergens': allergens, 'location': location, 'date': date, 'meal_time': meal_time}
+
+BREAKFAST = [
+    dish('Oatmeal', ['Oats', 'Milk'], ['Milk', 'Gluten'], 'Wilbur', '03-02-2026', 'Breakfast'),
+    dish('Tofu Scramble', ['Tofu', 'Garlic Powder'], ['Soy', 'vegan'], 'Wilbur', '03-02-2026', 'Breakfast'),
+]
+LUNCH = [
+    dish('Garlic Chicken', ['Chicken', 'Garlic'], ['halal'], 'Wilbur', '03-02-2026', 'Lunch'),
+]
+# A hall with nothing on its menu is still listed, with a count of 0
+EMPTY_DINNER = [dish('', [], [], 'Branner', '03-02-2026', 'Dinner')]
+NEW_BREAKFAST = [
+    dish('Oatmeal', ['Oats', 'Oat Milk'], ['Gluten', 'vegan'], 'Wilbur', '03-02-2026', 'Breakfast'),
+]
+BRUNCH = [
+    dish('Pancakes', ['Flour', 'Eggs', 'Milk'], ['Eggs', 'Milk', 'Wheat'], 'Stern', '03-03-2026', 'Brunch'),
+]
+
+def read_filter_files(data_dir):
+    files = {}
+    for name in [f'{filter_name}_filter.json' for filter_name in FILTER_NAMES] + ['dish_index.json', 'search_index.json']:
+        with open(os.path.join(data_dir, name), 'rb') as file:
+            files[name] = file.read()
+    return files
+
+def test_incremental_updates_match_a_full_recount(tmp_path):
+    data_dir, state_path = str(tmp_path / 'incremental'), str(tmp_path / 'state.json')
+    os.makedirs(data_dir)
+    runs = [
+        BREAKFAST + LUNCH + EMPTY_DINNER,
+        # Breakfast changed, lunch and the empty dinner were removed, brunch was added
+        NEW_BREAKFAST + BRUNCH,
+        # Lunch came back, and a menu is repeated unchanged
+        NEW_BREAKFAST + LUNCH + BRUNCH,
+    ]
+    for number, dishes in enumerate(runs):
+        create_filter_files(iter(dishes), data_dir, state_path)
+
+        full_dir = str(tmp_path / f'full-{number}')
+        os.makedirs(full_dir)
+        create_filter_files(iter(dishes), full_dir, str(tmp_path / f'full-state-{number}.json'))
+        assert read_filter_files(data_dir) == read_filter_files(full_dir)
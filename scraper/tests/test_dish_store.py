@@ -0,0 +1,31 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from corpus import generate_corpus
+from dish_store import encode_dish_store, expand_dishes, iter_stored_dishes, store_file
+from processing import main
+
+def test_store_expands_to_combined_dishes(tmp_path):
+    base_dir, output_file = str(tmp_path / 'csv'), str(tmp_path / 'out' / 'combined_dishes.json')
+    generate_corpus(base_dir, days=3, halls=4)
+    main(force=True, output_format='json,store', base_dir=base_dir, output_file=output_file)
+
+    with open(output_file, 'r', encoding='utf-8') as file:
+        dishes = json.load(file)
+    assert dishes
+    assert list(iter_stored_dishes(store_file(output_file))) == dishes
+
+def test_repeated_dishes_are_stored_once():
+    dish = {'name': 'Oatmeal', 'ingredients': ['Oats'], 'allergens': ['Gluten'], 'meal_time': 'Breakfast', 'date': '03-02-2026', 'location': 'Wilbur'}
+    dishes = [dish, dict(dish, location='Branner'), dict(dish, ingredients=['Oats', 'Milk'])]
+    data = encode_dish_store(dishes)
+    assert len(data['dishes']) == 2
+    expanded = list(expand_dishes(json.loads(json.dumps(data))))
+    assert expanded == dishes
+    # Occurrences of the same dish don't share their lists
+    expanded[0]['ingredients'].append('Salt')
+    assert expanded[1]['ingredients'] == ['Oats']
@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dish_stream import iter_dish_array, write_dish_array
+
+DISHES = [
+    {'name': 'Crème Brûlée', 'ingredients': ['Cream', 'Sugar [Cane]'], 'allergens': ['Milk', 'Eggs'], 'meal_time': 'Dinner', 'date': '03-02-2026', 'location': 'Wilbur'},
+    {'name': '', 'ingredients': [], 'allergens': [], 'meal_time': 'Brunch', 'date': '03-02-2026', 'location': 'Branner'},
+    {'name': 'Chicken, "Tikka" Masala', 'ingredients': ['Chicken', 'Yogurt'], 'allergens': [], 'meal_time': 'Lunch', 'date': None, 'location': None},
+]
+
+def write_file(tmp_path, text):
+    path = tmp_path / 'combined_dishes.json'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def test_written_bytes_match_json_dump(tmp_path):
+    path = str(tmp_path / 'combined_dishes.json')
+    assert write_dish_array(DISHES, path) == len(DISHES)
+    with open(path, 'r', encoding='utf-8') as file:
+        assert file.read() == json.dumps(DISHES, indent=2)
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_round_trip(tmp_path, chunk_size):
+    path = str(tmp_path / 'combined_dishes.json')
+    write_dish_array(DISHES, path)
+    assert list(iter_dish_array(path, chunk_size)) == DISHES
+
+@pytest.mark.parametrize('text', ['[]', ' [ ] ', '[\n]'])
+def test_empty_array(tmp_path, text):
+    assert list(iter_dish_array(write_file(tmp_path, text))) == []
+
+def test_compact_array(tmp_path):
+    assert list(iter_dish_array(write_file(tmp_path, '[{"a":1},{"b":2} , 3]'), chunk_size=2)) == [{'a': 1}, {'b': 2}, 3]
+
+@pytest.mark.parametrize('text', [
+    '[{"a": 1}{"b": 2}]',
+    '[{"a": 1} {"b": 2}]',
+    '[1 2]',
+    '[{"a": 1},,{"b": 2}]',
+    '[, {"a": 1}]',
+    '[{"a": 1},]',
+    '[{"a": 1}',
+    '{"a": 1}',
+])
+def test_malformed_arrays_are_rejected(tmp_path, text):
+    with pytest.raises(ValueError):
+        list(iter_dish_array(write_file(tmp_path, text), chunk_size=4))
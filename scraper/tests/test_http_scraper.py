@@ -0,0 +1,144 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from http_scraper import HttpMenuClient, MenuPageParser, parse_menu_page
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+PAGE_URL = 'https://rdeapps.stanford.edu/dininghallmenu/'
+
+def read_fixture():
+    with open(os.path.join(FIXTURES, 'menu_page.html'), 'r', encoding='utf-8') as file:
+        return file.read()
+
+def load_page():
+    return parse_menu_page(read_fixture(), PAGE_URL)
+
+class FakeMenuSite:
+    """
+    A transport serving the fixture page the way the site answers each
+    postback: the posted dropdown values come back selected, with a new view
+    state. Only Wilbur's lunch on 3/2/2026 lists dishes, and Arrillaga
+    serves no dinner.
+    """
+    CONTROLS = {
+        'ctl00$MainContent$lstDay': 'Day',
+        'ctl00$MainContent$lstLocations': 'Locations',
+        'ctl00$MainContent$lstMealType': 'MealType',
+    }
+
+    def __init__(self):
+        self.template = read_fixture()
+        self.state = {'Day': '3/2/2026', 'Locations': 'Wilbur', 'MealType': 'Breakfast'}
+        self.requests = []
+        self.pages = 0
+
+    def __call__(self, request_url, data=None):
+        self.requests.append((request_url, data))
+        if data is not None:
+            # A postback has to carry the view state of the page it came from
+            assert data['__VIEWSTATE'] == f'state-{self.pages}'
+            assert data['__EVENTVALIDATION'] == 'L2V2ZW50dmFsaWRhdGlvbg=='
+            for name, id_name in self.CONTROLS.items():
+                self.state[id_name] = data[name]
+        self.pages += 1
+        return PAGE_URL, self.render()
+
+    def render(self):
+        html = self.template.replace(' selected="selected"', '').replace('dDwtMTA4NzY1OTQ0Mjs7Pg==', f'state-{self.pages}')
+        for value in self.state.values():
+            html = html.replace(f'<option value="{value}">', f'<option selected="selected" value="{value}">')
+        if self.state['Locations'] == 'Arrillaga':
+            html = html.replace('<option value="Dinner">Dinner</option>', '')
+        if self.state != {'Day': '3/2/2026', 'Locations': 'Wilbur', 'MealType': 'Lunch'}:
+            start, end = html.index('<div id="MainContent_divMenu">'), html.index('</form>')
+            html = html[:start] + '<div id="MainContent_divMenu"></div>\n    ' + html[end:]
+        return html
+
+def test_menu_items():
+    assert load_page()['foodInfo'] == [
+        {
+            'name': 'Chicken\nTikka Masala',
+            'ingredients': 'Chicken, Yogurt, Tomato, Garam Masala',
+            'allergens': ['Milk', 'halal'],
+        },
+        {
+            'name': 'Tofu Scramble',
+            'ingredients': 'Tofu (Soybeans, Water), Turmeric,\nBlack Salt',
+            'allergens': ['Soy', 'vegan', 'gluten-free'],
+        },
+        {
+            'name': 'Crispy Potatoes',
+            # Like WebDriver, trimming keeps non-breaking spaces and only then makes them plain
+            'ingredients': 'Potatoes, Canola Oil, Salt ',
+            'allergens': ['Sesame'],
+        },
+    ]
+
+def test_form_state():
+    page = load_page()
+    assert page['action'] == PAGE_URL
+    assert page['hidden_fields']['__VIEWSTATE'] == 'dDwtMTA4NzY1OTQ0Mjs7Pg=='
+    assert page['dropdowns']['MainContent_lstDay'] == {
+        'name': 'ctl00$MainContent$lstDay',
+        'options': ['3/2/2026', '3/3/2026'],
+        'selected': '3/2/2026',
+    }
+    assert page['dropdowns']['MainContent_lstLocations'] == {
+        'name': 'ctl00$MainContent$lstLocations',
+        # The values are the short hall keys the scraper selects, as in dining_hall_list
+        'options': ['Arrillaga', 'Wilbur'],
+        'selected': 'Wilbur',
+    }
+    # No option is marked selected, so the first one is, as in a browser
+    assert page['dropdowns']['MainContent_lstMealType']['selected'] == 'Breakfast'
+
+def test_self_closing_tags_keep_the_label_open():
+    parser = MenuPageParser()
+    parser.feed(
+        '<div class="clsMenuItem"><span class="clsLabel_Name">Chicken<br/>Tikka <wbr/>Masala</br></span>'
+        '<div class="clsLabel_Ingredients">Ingredients: Chicken</div>'
+        '<div class="clsLabel_Allergens">Allergens: <b/>Milk</div></div>'
+    )
+    assert parser.items == [{'name': 'Chicken\nTikka Masala', 'ingredients': 'Ingredients: Chicken', 'allergens': 'Allergens: Milk', 'icons': []}]
+
+def test_missing_label_fails_the_page():
+    html = (
+        '<div class="clsMenuItem"><span class="clsLabel_Name">Crispy Potatoes</span>'
+        '<div class="clsLabel_Allergens">Allergens: </div></div>'
+    )
+    with pytest.raises(ValueError, match='clsLabel_Ingredients'):
+        parse_menu_page(html, PAGE_URL)
+
+def test_client_posts_back_only_the_dropdowns_that_change():
+    site = FakeMenuSite()
+    client = HttpMenuClient(PAGE_URL, site)
+
+    # The day and hall are already selected, so only the meal is posted back
+    lunch = client.scrape('3/2/2026', 'Wilbur', 'Lunch')
+    assert [item['name'] for item in lunch] == ['Chicken\nTikka Masala', 'Tofu Scramble', 'Crispy Potatoes']
+    assert client.scrape('3/3/2026', 'Wilbur', 'Lunch') == []
+    # Arrillaga doesn't list dinner once it is selected, so there is no meal postback
+    assert client.scrape('3/3/2026', 'Arrillaga', 'Dinner') is None
+    assert client.selected('Locations') == 'Arrillaga'
+    # Selecting what is already selected doesn't post back
+    client.select('Day', '3/3/2026')
+    with pytest.raises(ValueError, match='3/9/2026'):
+        client.scrape('3/9/2026', 'Wilbur', 'Lunch')
+
+    assert client.postbacks == 3
+    assert [(request_url, data and data['__EVENTTARGET']) for request_url, data in site.requests] == [
+        (PAGE_URL, None),
+        (PAGE_URL, 'ctl00$MainContent$lstMealType'),
+        (PAGE_URL, 'ctl00$MainContent$lstDay'),
+        (PAGE_URL, 'ctl00$MainContent$lstLocations'),
+    ]
+    # Each postback sends every dropdown's current value along with the changed one
+    assert {name: site.requests[2][1][name] for name in FakeMenuSite.CONTROLS} == {
+        'ctl00$MainContent$lstDay': '3/3/2026',
+        'ctl00$MainContent$lstLocations': 'Wilbur',
+        'ctl00$MainContent$lstMealType': 'Lunch',
+    }
@@ -0,0 +1,27 @@
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from menu_store import MenuStore
+
+TODAY = date(2026, 3, 3)
+
+def menu(day, meal_time, *names):
+    return [
+        {'name': name, 'ingredients': ['Tofu', 'Garlic'], 'allergens': ['Soy', 'Vegan'], 'location': 'Wilbur', 'date': day, 'meal_time': meal_time}
+        for name in names
+    ]
+
+def test_names_match_ignoring_case(tmp_path):
+    with MenuStore(str(tmp_path / 'menu_history.sqlite')) as store:
+        store.add_menu(menu('03-02-2026', 'Lunch', 'Tofu Scramble', 'Garlic Tofu'))
+        store.add_menu(menu('03-03-2026', 'Dinner', 'Tofu Scramble'))
+        store.flush()
+
+        assert store.dishes_containing('allergen', 'vegan', today=TODAY) == [('Tofu Scramble', 2), ('Garlic Tofu', 1)]
+        assert store.dishes_containing('ingredient', 'GARLIC', today=TODAY) == store.dishes_containing('ingredient', 'Garlic', today=TODAY)
+        assert store.dish_frequency('tofu scramble', 'wilbur', today=TODAY) == 2
+        assert store.dish_dates('garlic tofu', today=TODAY) == [('2026-03-02', 'Wilbur', 'Lunch')]
+        assert store.dishes_containing('allergen', 'peanuts', today=TODAY) == []
@@ -0,0 +1,25 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from metrics import PipelineMetrics
+
+def spin(n):
+    return sum(i * i for i in range(n))
+
+def test_stage_counts_its_own_memory_and_its_workers(tmp_path):
+    run_metrics = PipelineMetrics(str(tmp_path))
+    with run_metrics.stage('allocate'):
+        kept = b'x' * (64 * 1024 * 1024)
+    with run_metrics.stage('workers'):
+        with ProcessPoolExecutor(2) as executor:
+            list(executor.map(spin, [500_000] * 4))
+
+    allocate, workers = run_metrics.stages['allocate'], run_metrics.stages['workers']
+    assert allocate['rss_growth_kb'] >= 60 * 1024
+    # The peak was reached in the earlier stage, not this one
+    assert workers['peak_rss_growth_kb'] < 60 * 1024
+    assert workers['children_cpu_seconds'] > workers['cpu_seconds']
+    del kept
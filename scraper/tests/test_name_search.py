@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, SRC)
+
+from name_search import NameSearch, build_search_index
+
+ENTRIES = {
+    'dishes': [('Chicken Tikka Masala', 12), ('Grilled Chicken', 30), ('Crème Brûlée', 4), ('Chicken Rice Bowl', 7)],
+    'ingredients': [('Garlic', 40), ('Garlic Powder', 9), ('Chicken', 35), ('Rice', 22)],
+}
+
+# Builds the index in a fresh interpreter and prints it the way create_filters saves it
+BUILD_SCRIPT = f"""
+import json, sys
+sys.path.insert(0, {SRC!r})
+from name_search import build_search_index
+print(json.dumps(build_search_index({ENTRIES!r}), separators=(',', ':')))
+"""
+
+def build_with_hash_seed(seed):
+    env = dict(os.environ, PYTHONHASHSEED=str(seed))
+    return subprocess.run([sys.executable, '-c', BUILD_SCRIPT], env=env, capture_output=True, check=True).stdout
+
+def test_index_bytes_do_not_depend_on_the_hash_seed():
+    assert build_with_hash_seed(0) == build_with_hash_seed(1) == build_with_hash_seed(2)
+
+def test_prefix_and_fuzzy_matches():
+    index = NameSearch(build_search_index(ENTRIES))
+    assert index.search('dishes', 'chicken r') == [('Chicken Rice Bowl', 7)]
+    assert index.search('dishes', 'creme') == [('Crème Brûlée', 4)]
+    assert index.search('ingredients', 'garlc')[:2] == [('Garlic', 40), ('Garlic Powder', 9)]
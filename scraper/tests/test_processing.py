@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from corpus import generate_corpus
+from menu_store import MenuStore
+from processing import main, needs_processing, save_combined_dishes, shard_directory
+
+DISHES = [
+    {'name': 'Oatmeal', 'ingredients': ['Oats'], 'allergens': ['Gluten'], 'location': 'Wilbur', 'date': '03-02-2026', 'meal_time': 'Breakfast'},
+    {'name': 'Tofu Scramble', 'ingredients': ['Tofu'], 'allergens': ['Soy'], 'location': 'Wilbur', 'date': '03-03-2026', 'meal_time': 'Breakfast'},
+]
+
+def write_menu_manifest(base_dir, last_changed):
+    with open(os.path.join(base_dir, 'manifest.json'), 'w', encoding='utf-8') as file:
+        json.dump({'last_changed': last_changed, 'menus': {}}, file)
+
+def test_missing_shards_need_processing(tmp_path):
+    base_dir, output_file = str(tmp_path / 'csv'), str(tmp_path / 'out' / 'combined_dishes.json')
+    os.makedirs(base_dir)
+    write_menu_manifest(base_dir, 0)
+    save_combined_dishes(iter(DISHES), output_file)
+    assert not needs_processing(base_dir, output_file)
+
+    # First run with --shards: the combined file is current, but there are no shards yet
+    assert needs_processing(base_dir, output_file, shard_by='date')
+    save_combined_dishes(iter(DISHES), output_file, shard_by='date')
+    assert not needs_processing(base_dir, output_file, shard_by='date')
+    # Shards split another way don't count
+    assert needs_processing(base_dir, output_file, shard_by='hall')
+
+    # Rewriting unchanged shards still marks them as current
+    save_combined_dishes(iter(DISHES), output_file, shard_by='date')
+    assert not needs_processing(base_dir, output_file, shard_by='date')
+
+    shutil.rmtree(shard_directory(output_file))
+    assert needs_processing(base_dir, output_file, shard_by='date')
+
+def test_empty_history_needs_processing(tmp_path):
+    base_dir, output_file = str(tmp_path / 'csv'), str(tmp_path / 'out' / 'combined_dishes.json')
+    store_path = str(tmp_path / 'menu_history.sqlite')
+    os.makedirs(base_dir)
+    write_menu_manifest(base_dir, 0)
+    save_combined_dishes(iter(DISHES), output_file)
+
+    assert needs_processing(base_dir, output_file, store_path=store_path)
+    with MenuStore(store_path):
+        pass
+    assert needs_processing(base_dir, output_file, store_path=store_path)
+    with MenuStore(store_path) as store:
+        store.add_menu(DISHES[:1])
+    assert not needs_processing(base_dir, output_file, store_path=store_path)
+
+def process_corpus(tmp_path, workers):
+    # Each run gets its own copy of the corpus, so no run reuses another's dish cache
+    base_dir = str(tmp_path / f'csv-{workers}')
+    output_file = str(tmp_path / f'out-{workers}' / 'combined_dishes.json')
+    generate_corpus(base_dir, days=3, halls=4)
+    main(force=True, workers=workers, base_dir=base_dir, output_file=output_file)
+    with open(output_file, 'rb') as file:
+        return file.read()
+
+def test_worker_count_does_not_change_the_output(tmp_path):
+    serial = process_corpus(tmp_path, workers=1)
+    assert json.loads(serial)
+    assert process_corpus(tmp_path, workers=4) == serial
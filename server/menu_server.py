@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+# The index builder and query engine live with the scraper
+SCRAPER_SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper', 'src'))
+sys.path.insert(0, SCRAPER_SRC)
+
+from compact_format import compact_file
+from create_filters import FILTER_NAMES, build_dish_index, get_combined_file, iter_combined_dishes
+from dish_store import store_file
+from dish_query import DishIndex, bits_to_ids
+
+DEFAULT_DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'stanfood_app', 'assets', 'data'))
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Query parameters that map straight onto an index filter
+EQUALITY_PARAMS = {
+    'date': 'dates',
+    'location': 'locations',
+    'meal_time': 'meal_times',
+}
+
+# Query parameters that require or exclude allergens and ingredients
+INCLUDE_PARAMS = {
+    'include_allergens': 'allergens',
+    'include_ingredients': 'ingredients',
+}
+EXCLUDE_PARAMS = {
+    'exclude_allergens': 'allergens',
+    'exclude_ingredients': 'ingredients',
+}
+
+STATUS_TEXT = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    503: 'Service Unavailable',
+}
+
+class BadRequest(Exception):
+    pass
+
+def data_signature(data_dir):
+    """
+    Modification time and size of every published file, used to notice new data
+    """
+    signature = []
+    # The dishes can be in any of the combined file formats processing writes
+    json_path = os.path.join(data_dir, 'combined_dishes.json')
+    filenames = [os.path.basename(path) for path in (json_path, compact_file(json_path), store_file(json_path))]
+    for filename in filenames + ['dish_index.json'] + [f'{name}_filter.json' for name in FILTER_NAMES]:
+        path = os.path.join(data_dir, filename)
+        try:
+            stat = os.stat(path)
+            signature.append((filename, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((filename, None, None))
+    return tuple(signature)
+
+class MenuData:
+    """
+    One immutable snapshot of the published menu data and its indexes
+    """
+    def __init__(self, data_dir):
+        self.signature = data_signature(data_dir)
+
+        # The dishes come from whichever combined file processing wrote last, as in create_filters
+        json_path = os.path.join(data_dir, 'combined_dishes.json')
+        combined_file = get_combined_file(json_path)
+        if combined_file is None:
+            raise FileNotFoundError(f"No combined dishes file in {data_dir}")
+        with open(combined_file, 'rb') as file:
+            raw = file.read()
+        self.version = hashlib.sha1(raw).hexdigest()[:16]
+        if combined_file == json_path:
+            self.dishes = json.loads(raw)
+        else:
+            self.dishes = list(iter_combined_dishes(json_path, combined_file))
+
+        self.filters = {}
+        for name in FILTER_NAMES:
+            try:
+                with open(os.path.join(data_dir, f'{name}_filter.json'), 'r') as file:
+                    self.filters[name] = json.load(file)
+            except (OSError, ValueError):
+                self.filters[name] = []
+
+        # Fall back to building the index here if it is missing or was built from
+        # other dishes, which it records as the digest of the file they came from
+        index_data = None
+        try:
+            with open(os.path.join(data_dir, 'dish_index.json'), 'r') as file:
+                index_data = json.load(file)
+        except (OSError, ValueError):
+            pass
+        if index_data is None or index_data.get('source') != self.version:
+            index_data = build_dish_index(self.dishes)
+        self.index = DishIndex(index_data)
+
+class ResponseCache:
+    """
+    Bounded LRU cache of encoded responses
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+def query_values(params, name):
+    """
+    Values of a query parameter, given either repeated or comma separated
+    """
+    values = []
+    for value in params.get(name, []):
+        values.extend(part.strip() for part in value.split(',') if part.strip())
+    return values
+
+def positive_int(params, name, default):
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    if value < 1:
+        raise BadRequest(f"{name} must be at least 1")
+    return value
+
+def query_dishes(data, params):
+    """
+    Filter and paginate the dishes for a /dishes request
+    """
+    all_of = []
+    for param, filter_name in EQUALITY_PARAMS.items():
+        all_of.extend((filter_name, value) for value in query_values(params, param))
+    for param, filter_name in INCLUDE_PARAMS.items():
+        all_of.extend((filter_name, value) for value in query_values(params, param))
+    none_of = []
+    for param, filter_name in EXCLUDE_PARAMS.items():
+        none_of.extend((filter_name, value) for value in query_values(params, param))
+
+    page = positive_int(params, 'page', 1)
+    page_size = min(positive_int(params, 'page_size', DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+
+    dish_ids = bits_to_ids(data.index.query(all_of=all_of, none_of=none_of))
+    start = (page - 1) * page_size
+    return {
+        'version': data.version,
+        'page': page,
+        'page_size': page_size,
+        'total': len(dish_ids),
+        'pages': -(-len(dish_ids) // page_size),
+        'dishes': [dict(data.dishes[dish_id], id=dish_id) for dish_id in dish_ids[start:start + page_size]],
+    }
+
+class MenuServer:
+    """
+    Serves filtered menu queries from in-memory indexes, reloading them when
+    the pipeline publishes new data
+    """
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, cache_size=1024, reload_interval=5.0):
+        self.data_dir = data_dir
+        self.reload_interval = reload_interval
+        self.cache = ResponseCache(cache_size)
+        self.data = None
+
+    def load(self):
+        self.data = MenuData(self.data_dir)
+        self.cache.clear()
+        print(f"Loaded {len(self.data.dishes)} dishes (version {self.data.version})")
+
+    async def watch(self):
+        """
+        Poll the data directory and swap in a fully built snapshot once it changes
+        """
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            if self.data is not None and data_signature(self.data_dir) == self.data.signature:
+                continue
+            try:
+                data = await asyncio.to_thread(MenuData, self.data_dir)
+            except (OSError, ValueError) as e:
+                # Most likely caught the pipeline mid-write; keep serving the old snapshot
+                print(f"Reload failed, keeping the current data: {e}")
+                continue
+            # Requests see either the old or the new snapshot, never a mix
+            self.data = data
+            self.cache.clear()
+            print(f"Reloaded {len(data.dishes)} dishes (version {data.version})")
+
+    def route(self, path, params):
+        """
+        Build the response body for a request, returning (status, payload)
+        """
+        data = self.data
+        if data is None:
+            return 503, {'error': "No menu data has been loaded"}
+
+        if path == '/health':
+            return 200, {'status': 'ok', 'version': data.version, 'dishes': len(data.dishes)}
+        if path == '/dishes':
+            return 200, query_dishes(data, params)
+        if path.startswith('/filters/'):
+            name = path[len('/filters/'):]
+            if name in data.filters:
+                return 200, data.filters[name]
+        return 404, {'error': f"Unknown path: {path}"}
+
+    def respond(self, method, target, headers):
+        """
+        Produce (status, extra headers, body) for a request, using the cache where possible
+        """
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        data = self.data
+        version = data.version if data is not None else None
+
+        # Normalize the query so equivalent requests share a cache entry
+        cache_key = (version, url.path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            try:
+                status, payload = self.route(url.path, params)
+            except BadRequest as e:
+                status, payload = 400, {'error': str(e)}
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            etag = '"' + hashlib.sha1(repr(cache_key).encode('utf-8')).hexdigest()[:20] + '"'
+            cached = (status, etag, body)
+            if status == 200:
+                self.cache.put(cache_key, cached)
+
+        status, etag, body = cached
+        if status == 200 and etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, {'ETag': etag}, b''
+        extra = {'ETag': etag} if status == 200 else {}
+        return status, extra, body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, protocol = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                status, extra, body = self.respond(method, target, headers)
+                keep_alive = protocol == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                response_headers = {
+                    'Content-Type': 'application/json',
+                    'Content-Length': str(len(body)),
+                    'Connection': 'keep-alive' if keep_alive else 'close',
+                }
+                response_headers.update(extra)
+                head = f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                head += ''.join(f"{name}: {value}\r\n" for name, value in response_headers.items())
+                writer.write(head.encode('latin-1') + b'\r\n' + (body if method != 'HEAD' else b''))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        self.load()
+        server = await asyncio.start_server(self.handle, host, port)
+        watcher = asyncio.create_task(self.watch())
+        print(f"Serving menus from {self.data_dir} on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve filtered menu queries from the published menu data")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8000, help="port to listen on")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="directory holding combined_dishes.json and the filter files")
+    parser.add_argument('--cache-size', type=int, default=1024, help="number of responses to keep cached")
+    parser.add_argument('--reload-interval', type=float, default=5.0, help="seconds between checks for new data")
+    args = parser.parse_args()
+
+    menu_server = MenuServer(args.data_dir, args.cache_size, args.reload_interval)
+    try:
+        asyncio.run(menu_server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass